@@ -0,0 +1,276 @@
+import os
+import queue
+import signal
+import threading
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image
+
+import engine
+import frames
+import manifest as batch_manifest
+import profiling
+import streaming
+
+# Peak working set of convert_to_enhanced_grayscale per pixel on top of the decoded
+# image for the slowest kernel; see engine.KERNEL_WORKING_BYTES for the others.
+WORKING_BYTES_PER_PIXEL = engine.KERNEL_WORKING_BYTES["float64"]
+DEFAULT_MEMORY_BUDGET = 2 * 1024 ** 3
+
+def default_workers():
+    return max(1, os.cpu_count() or 1)
+
+def _ignore_interrupts():
+    # Ctrl+C reaches every process in the terminal's group; the parent decides how to stop, not the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def run_job(job_fn, parent_pid, profiled, hash_input, in_path, out_path, settings):
+    """Runs one batch job on a worker and returns (profile events, input hash). The manifest's
+    content hash of the input is taken here, while the file is still in the page cache, rather
+    than on the thread that collects every worker's results."""
+    events = None
+    if profiled: events = profiling.profiled_job(job_fn, parent_pid, in_path, out_path, settings)
+    else: job_fn(in_path, out_path, settings)
+    return events, batch_manifest.file_hash(in_path) if hash_input else None
+
+def estimate_job_bytes(path, settings=None):
+    try: info = engine.probe_image(path)
+    except Exception: return 0
+    (w, h), mode = info['size'], info['mode']
+    pixel_bytes = Image.getmodebands(mode) * (info['bit_depth'] // 8)
+    working_bytes = WORKING_BYTES_PER_PIXEL
+    if settings:
+        kernel = engine.resolve_kernel(settings.get('kernel', engine.DEFAULT_KERNEL), settings.get('conversion_mode'), settings.get('bit_depth') or 16)
+        working_bytes = engine.KERNEL_WORKING_BYTES[kernel]
+    if settings and settings.get('streaming') and Path(path).suffix.lower() in streaming.TIFF_EXTENSIONS:
+        # Streamed TIFFs only hold one band plus one decoded strip/tile row.
+        return 2 * w * min(h, settings.get('band_rows', streaming.DEFAULT_BAND_ROWS)) * (pixel_bytes + working_bytes)
+    return w * h * (pixel_bytes + working_bytes)
+
+class BatchScheduler:
+    """Spreads batch_process jobs over a worker pool while capping the estimated
+    bytes of decoded images in flight. Results are posted to result_queue as
+    ('batch_item_success', in_path) or ('batch_item_failed', (in_path, error_text, exception)).
+    With a manifest, items it reports as up to date are posted as ('batch_item_skipped', in_path)
+    without being converted, and every outcome is recorded in it. While profiling.PROFILER
+    is enabled, each job runs under a batch_process stage and the stage events recorded in
+    worker processes are posted as ('profile_events', events) ahead of the job's result."""
+
+    def __init__(self, result_queue, workers=None, use_processes=True, memory_budget=DEFAULT_MEMORY_BUDGET, job_fn=engine.process_file, manifest=None):
+        self.result_queue = result_queue
+        self.workers = workers or default_workers()
+        self.use_processes = use_processes
+        self.memory_budget = memory_budget
+        self.job_fn = job_fn
+        self.manifest = manifest
+        self.inflight_bytes = 0
+        self.inflight_count = 0
+        self.budget_cond = threading.Condition()
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.pool = None
+
+    def start(self, jobs):
+        # jobs may be any iterable, including an endless one; it is consumed as workers free up.
+        threading.Thread(target=self._dispatch, args=(jobs,), daemon=True).start()
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.budget_cond: self.budget_cond.notify_all()
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def _acquire(self, cost):
+        with self.budget_cond:
+            # A single job larger than the whole budget still runs, just on its own.
+            while self.inflight_count and self.inflight_bytes + cost > self.memory_budget and not self.cancelled.is_set():
+                self.budget_cond.wait()
+            if self.cancelled.is_set(): return False
+            self.inflight_bytes += cost
+            self.inflight_count += 1
+            return True
+
+    def _release(self, cost):
+        with self.budget_cond:
+            self.inflight_bytes -= cost
+            self.inflight_count -= 1
+            self.budget_cond.notify_all()
+
+    def _new_pool(self, use_processes):
+        if use_processes: return ProcessPoolExecutor(max_workers=self.workers, initializer=_ignore_interrupts)
+        return ThreadPoolExecutor(max_workers=self.workers)
+
+    def _submit(self, use_processes, fn, *args):
+        try: return self.pool.submit(fn, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory): the jobs it took down fail through their
+            # futures, and the rest of the batch runs on a fresh pool.
+            self.pool.shutdown(wait=False)
+            self.pool = self._new_pool(use_processes)
+            return self.pool.submit(fn, *args)
+
+    def _dispatch(self, jobs):
+        use_processes = self.use_processes and self.workers > 1
+        self.pool = self._new_pool(use_processes)
+        try:
+            for job in jobs:
+                if self.cancelled.is_set(): break
+                in_path, out_path, settings = job
+                cost = None
+                try:
+                    if self.manifest:
+                        if self.manifest.is_up_to_date(in_path, out_path, settings):
+                            self.result_queue.put(('batch_item_skipped', in_path))
+                            continue
+                        self._record(in_path, out_path, settings, batch_manifest.STATUS_QUEUED)
+                    # Never admit more jobs than there are workers; queued work would only hold budget idle.
+                    with self.budget_cond:
+                        while self.inflight_count >= self.workers and not self.cancelled.is_set(): self.budget_cond.wait()
+                    job_cost = estimate_job_bytes(in_path, settings)
+                    if not self._acquire(job_cost): break
+                    cost = job_cost
+                    future = self._submit(use_processes, run_job, self.job_fn, os.getpid(), profiling.PROFILER.enabled, self.manifest is not None, in_path, out_path, settings)
+                    future.add_done_callback(lambda f, job=job, c=cost: self._on_done(f, job, c))
+                except Exception as e:
+                    # Whatever kept this job from being dispatched fails it alone; every job is reported.
+                    if cost is not None: self._release(cost)
+                    self._report(job, e)
+        finally:
+            self.pool.shutdown(wait=True)
+            self._save_manifest()
+            self.done.set()
+
+    def _record(self, in_path, out_path, settings, status, error=None, input_hash=None):
+        # A manifest that cannot be written must not fail the conversion itself.
+        try: self.manifest.mark(in_path, out_path, settings, status, error, input_hash)
+        except OSError: pass
+
+    def _save_manifest(self):
+        try:
+            if self.manifest: self.manifest.save()
+        except OSError: pass
+
+    def _on_done(self, future, job, cost):
+        self._release(cost)
+        try:
+            events, input_hash = future.result()
+        except Exception as e:
+            self._report(job, e)
+            return
+        if events: self.result_queue.put(('profile_events', events))
+        self._report(job, input_hash=input_hash)
+
+    def _report(self, job, error=None, input_hash=None):
+        in_path = job[0]
+        if error is not None:
+            if self.manifest: self._record(*job, batch_manifest.STATUS_FAILED, error)
+            error_text = getattr(error, 'remote_traceback', None) or ''.join(traceback.format_exception(type(error), error, error.__traceback__))
+            self.result_queue.put(('batch_item_failed', (in_path, error_text, error)))
+            return
+        if self.manifest: self._record(*job, batch_manifest.STATUS_DONE, input_hash=input_hash)
+        self.result_queue.put(('batch_item_success', in_path))
+
+# Marks a job that an earlier pipeline stage already finished (a streamed export).
+_FINISHED = object()
+
+def _decode_stage(job, _):
+    in_path, out_path, settings = job
+    # Multi-frame exports run whole in this stage; they already interleave decoding and encoding frame by frame.
+    if settings.get('all_frames') and frames.convert_file(in_path, out_path, settings): return _FINISHED
+    if settings.get('streaming'):
+        with profiling.stage("stream"):
+            if streaming.stream_convert_file(in_path, out_path, settings): return _FINISHED
+    with profiling.stage("load"): return engine.load_image(in_path)
+
+def _convert_stage(job, decoded):
+    image, info = decoded
+    settings = engine.with_bit_depth(job[2], info)
+    with profiling.stage("convert", mode=settings['conversion_mode']):
+        converted = engine.convert_with_settings(image, settings)
+    return converted, info, settings
+
+def _encode_stage(job, converted):
+    (gray, alpha), info, settings = converted
+    with profiling.stage("save"): engine.save_image(gray, alpha, job[1], settings, info)
+    return _FINISHED
+
+class PipelineScheduler(BatchScheduler):
+    """BatchScheduler that splits every job into decode, convert and encode stages, each with
+    its own worker threads and joined by bounded queues, so that one file is being encoded
+    while the next is converted and the one after that decoded. Decoding, NumPy and the
+    encoders release the GIL for their heavy lifting, so the stages overlap on threads.
+    Same results, manifest handling, memory budget and batch_process stages as BatchScheduler;
+    the stages run in this process, so their events are recorded in place, not posted."""
+
+    STAGES = (_decode_stage, _convert_stage, _encode_stage)
+
+    def __init__(self, result_queue, workers=None, memory_budget=DEFAULT_MEMORY_BUDGET, manifest=None, queue_depth=2):
+        super().__init__(result_queue, workers=workers, use_processes=False, memory_budget=memory_budget, manifest=manifest)
+        self.queue_depth = queue_depth
+
+    def _dispatch(self, jobs):
+        inboxes = [queue.Queue(maxsize=self.queue_depth) for _ in self.STAGES]
+        remaining = [self.workers] * len(self.STAGES)
+        remaining_lock = threading.Lock()
+        for index, stage_fn in enumerate(self.STAGES):
+            outbox = inboxes[index + 1] if index + 1 < len(inboxes) else None
+            for _ in range(self.workers):
+                threading.Thread(target=self._stage_loop, args=(stage_fn, inboxes[index], outbox, index, remaining, remaining_lock), daemon=True).start()
+        # Jobs inside the pipeline: one per stage thread plus whatever the queues hold.
+        capacity = len(self.STAGES) * (self.workers + self.queue_depth)
+        try:
+            for job in jobs:
+                if self.cancelled.is_set(): break
+                in_path, out_path, settings = job
+                try:
+                    if self.manifest:
+                        if self.manifest.is_up_to_date(in_path, out_path, settings):
+                            self.result_queue.put(('batch_item_skipped', in_path))
+                            continue
+                        self._record(in_path, out_path, settings, batch_manifest.STATUS_QUEUED)
+                    with self.budget_cond:
+                        while self.inflight_count >= capacity and not self.cancelled.is_set(): self.budget_cond.wait()
+                    cost = estimate_job_bytes(in_path, settings)
+                except Exception as e:
+                    self._report(job, e)
+                    continue
+                if not self._acquire(cost): break
+                # The job's batch_process stage spans the stage threads it passes through.
+                inboxes[0].put((job, cost, profiling.PROFILER.begin("batch_process", path=os.path.basename(in_path)), None))
+        finally:
+            for _ in range(self.workers): inboxes[0].put(None)
+
+    def _stage_loop(self, stage_fn, inbox, outbox, index, remaining, remaining_lock):
+        while True:
+            item = inbox.get()
+            if item is None: break
+            job, cost, profile_stage, payload = item
+            # After a cancel, queued work is dropped; whatever a thread is already doing finishes.
+            if self.cancelled.is_set():
+                profiling.PROFILER.end(profile_stage)
+                self._release(cost)
+                continue
+            try:
+                with profiling.PROFILER.attach(profile_stage): result = stage_fn(job, payload)
+            except Exception as e:
+                profiling.PROFILER.end(profile_stage, e)
+                self._release(cost)
+                self._report(job, e)
+                continue
+            if result is _FINISHED:
+                profiling.PROFILER.end(profile_stage)
+                self._release(cost)
+                self._report(job)
+            else: outbox.put((job, cost, profile_stage, result))
+        with remaining_lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        if not last: return
+        if outbox is not None:
+            for _ in range(self.workers): outbox.put(None)
+        else:
+            self._save_manifest()
+            self.done.set()
@@ -0,0 +1,210 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import PIL
+from PIL import Image
+
+import engine
+
+LAYOUTS = ("RGB", "RGBA", "LA", "L")
+DEFAULT_SIZES = (1, 4, 16)
+# (format, quality, encoder settings) timed by the save benchmark; quality only applies to the lossy formats.
+SAVE_CASES = ((".png", None, {}), (".png", None, {"png_compress_level": 1}), (".png", None, {"png_strategy": "rle"}), (".tiff", None, {}),
+              (".tiff", None, {"tiff_compression": "deflate"}), (".bmp", None, {}), (".jpeg", 75, {}), (".jpeg", 95, {}), (".webp", 75, {}), (".webp", 95, {}),
+              (".webp", 75, {"webp_method": 0}), (".heic", 75, {}), (".heic", 95, {}))
+HIGH_BIT_DEPTH_FORMATS = (".png", ".tiff")
+ALPHA_FORMATS = (".png", ".tiff", ".webp", ".heic")
+
+def synthetic_planes(megapixels, channels, bit_depth, seed=0, band_rows=1024):
+    """Deterministic 4:3 test image: per-channel gradients in different directions plus mild
+    noise, so that encoders see realistic (not incompressible) content. Built band by band to
+    keep the temporaries small even at 100 MP."""
+    width = max(1, round(math.sqrt(megapixels * 1e6 * 4 / 3)))
+    height = max(1, round(width * 3 / 4))
+    dtype, top = (np.uint16, 65535) if bit_depth == 16 else (np.uint8, 255)
+    out = np.empty((height, width, channels), dtype=dtype)
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0.0, 1.0, width, dtype=np.float32)
+    for y0 in range(0, height, band_rows):
+        y = np.linspace(y0 / height, min(y0 + band_rows, height) / height, min(band_rows, height - y0), dtype=np.float32)[:, None]
+        for c in range(channels):
+            # Alpha (the last of 2 or 4 channels) is mostly opaque with a soft transparent corner.
+            if channels in (2, 4) and c == channels - 1: plane = np.clip(2.0 - 1.5 * (x + y), 0.0, 1.0)
+            else: plane = (0.2 + 0.6 * ((c % 3 + 1) * 0.3 * x + (1 - 0.3 * (c % 3)) * y) % 1.0)
+            plane = plane * top + rng.normal(0.0, top * 0.01, plane.shape).astype(np.float32)
+            out[y0:y0 + plane.shape[0], :, c] = np.clip(plane, 0, top)
+    return out
+
+def make_source(layout, bit_depth, megapixels, workdir):
+    """8-bit sources are PIL images, as decoded from PNG/JPEG; 16-bit ones are uncompressed
+    TIFFs opened through engine.load_image, as scanner output is."""
+    channels = len(layout)
+    planes = synthetic_planes(megapixels, channels, bit_depth)
+    if bit_depth == 8: return Image.fromarray(planes[:, :, 0] if channels == 1 else planes, layout)
+    path = os.path.join(workdir, f"source_{layout}_{bit_depth}_{megapixels}.tif")
+    engine.get_tifffile().imwrite(path, planes[:, :, 0] if channels == 1 else planes, photometric="rgb" if channels >= 3 else "minisblack",
+                                  extrasamples=["unassalpha"] if channels in (2, 4) else None)
+    del planes
+    image, _ = engine.load_image(path)
+    return image
+
+def _read_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"): return int(line.split()[1])
+    except OSError: pass
+    return None
+
+def _reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when "5" is written to clear_refs.
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+        return True
+    except OSError: return False
+
+def _traced_blocks():
+    return sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+
+def _memory_probe(fn, conn):
+    exact = _reset_peak_rss()
+    start_kb = _read_status_kb("VmRSS") or 0
+    tracemalloc.start()
+    start_blocks = _traced_blocks()
+    result = fn()
+    traced_peak = tracemalloc.get_traced_memory()[1]
+    # Counted while the result is still referenced, so its arrays are included.
+    blocks = _traced_blocks() - start_blocks
+    del result
+    tracemalloc.stop()
+    peak_kb = _read_status_kb("VmHWM") if exact else resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    conn.send({"peak_rss_mb": round(peak_kb / 1024, 1), "rss_growth_mb": round((peak_kb - start_kb) / 1024, 1) if exact else None,
+               "traced_peak_mb": round(traced_peak / 2**20, 1), "allocated_blocks": blocks})
+    conn.close()
+
+def measure_memory(fn):
+    """Peak RSS, peak traced allocations and the number of allocated blocks one call of fn
+    leaves behind (its result and anything it cached). Runs in a forked child so every case
+    starts from the same baseline; where fork is unavailable it runs in-process and the RSS
+    figure is the process-wide peak so far. tracemalloc sees every NumPy buffer."""
+    if "fork" not in multiprocessing.get_all_start_methods():
+        parent, child = multiprocessing.Pipe()
+        _memory_probe(fn, child)
+        return parent.recv()
+    parent, child = multiprocessing.get_context("fork").Pipe()
+    process = multiprocessing.get_context("fork").Process(target=_memory_probe, args=(fn, child))
+    process.start()
+    result = parent.recv() if parent.poll(3600) else {}
+    process.join()
+    return result
+
+def time_case(fn, repeats):
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), min(times)
+
+def _record(results, case, seconds, best, pixels, memory):
+    case.update({"seconds": round(seconds, 5), "min_seconds": round(best, 5), "mp_per_s": round(pixels / 1e6 / seconds, 2) if seconds else None})
+    case.update(memory)
+    results.append(case)
+    extra = f" | peak RSS {memory['peak_rss_mb']} MB, traced {memory['traced_peak_mb']} MB, {memory['allocated_blocks']} blocks" if memory else ""
+    label = " ".join(f"{k}={v}" for k, v in case.items() if k in ("layout", "input_bit_depth", "megapixels", "mode", "output_bit_depth", "threads", "format", "quality", "encoder") and v)
+    print(f"{label}: {case['mp_per_s']} MP/s ({seconds * 1000:.1f} ms){extra}", flush=True)
+
+def run(args):
+    results = {"meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "argv": sys.argv[1:], "python": platform.python_version(), "numpy": np.__version__,
+                        "pillow": PIL.__version__, "platform": platform.platform(), "cpu_count": os.cpu_count(), "kernel": args.kernel, "repeat": args.repeat},
+               "convert": [], "save": []}
+    save_cases = [(fmt, q, extra) for fmt, q, extra in SAVE_CASES if fmt in args.formats and (fmt not in engine.HEIF_EXTENSIONS or engine.heif_support())]
+    with tempfile.TemporaryDirectory(prefix="grayscale-bench-") as workdir:
+        for megapixels in args.sizes:
+            for layout in args.layouts:
+                for bit_depth in args.bit_depths:
+                    image = make_source(layout, bit_depth, megapixels, workdir)
+                    pixels = image.size[0] * image.size[1]
+                    base = {"layout": layout, "input_bit_depth": bit_depth, "megapixels": megapixels, "width": image.size[0], "height": image.size[1]}
+                    if not args.skip_convert:
+                        for mode in args.modes:
+                            for out_bd in args.output_bit_depths:
+                                for threads in args.threads:
+                                    fn = lambda image=image, mode=mode, out_bd=out_bd, threads=threads: engine.convert_to_enhanced_grayscale(image, mode, out_bd, args.kernel, threads=threads)
+                                    seconds, best = time_case(fn, args.repeat)
+                                    memory = measure_memory(fn) if args.memory else {}
+                                    _record(results["convert"], dict(base, mode=mode, output_bit_depth=out_bd, kernel=args.kernel, threads=threads), seconds, best, pixels, memory)
+                    if not args.skip_save:
+                        for fmt, quality, extra in save_cases:
+                            out_bd = 16 if fmt in HIGH_BIT_DEPTH_FORMATS and bit_depth == 16 else 8
+                            gray, alpha = engine.convert_to_enhanced_grayscale(image, "Rec. 709", out_bd, args.kernel)
+                            settings = dict(extra, format=fmt, bit_depth=out_bd, preserve_alpha=fmt in ALPHA_FORMATS, strip_metadata=True)
+                            if quality is not None: settings["quality"] = quality
+                            info = {"size": image.size, "icc_profile": None}
+                            out_path = os.path.join(workdir, "out" + fmt)
+                            fn = lambda gray=gray, alpha=alpha, out_path=out_path, settings=settings, info=info: engine.save_image(gray, alpha, out_path, settings, info)
+                            seconds, best = time_case(fn, args.repeat)
+                            memory = measure_memory(fn) if args.memory else {}
+                            encoder = ",".join(f"{k}={v}" for k, v in sorted(extra.items()))
+                            case = dict(base, format=fmt, quality=quality, encoder=encoder, output_bit_depth=out_bd, file_bytes=os.path.getsize(out_path))
+                            _record(results["save"], case, seconds, best, pixels, memory)
+                            os.remove(out_path)
+                    del image
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f: baseline = json.load(f)
+    key_fields = ("layout", "input_bit_depth", "megapixels", "mode", "output_bit_depth", "threads", "format", "quality", "encoder", "kernel")
+    key = lambda case: tuple(case.get(k) for k in key_fields)
+    print(f"\nSpeed relative to {baseline_path} (>1 is faster):")
+    for section in ("convert", "save"):
+        previous = {key(case): case for case in baseline.get(section, [])}
+        for case in results[section]:
+            old = previous.get(key(case))
+            if old and old.get("mp_per_s") and case.get("mp_per_s"):
+                label = " ".join(str(v) for v in key(case) if v)
+                print(f"  {section:7s} {label}: {case['mp_per_s'] / old['mp_per_s']:.2f}x")
+
+def _csv(cast):
+    return lambda text: [cast(v) for v in text.split(",") if v]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmark", description="Headless throughput benchmark for the grayscale conversion engine.")
+    parser.add_argument("-o", "--output", default="benchmark_results.json", help="JSON file the results are written to.")
+    parser.add_argument("--sizes", type=_csv(float), default=list(DEFAULT_SIZES), help="Comma-separated image sizes in megapixels (default: 1,4,16; e.g. 1,10,100).")
+    parser.add_argument("--layouts", type=_csv(str), default=list(LAYOUTS), help="Comma-separated source layouts out of RGB,RGBA,LA,L.")
+    parser.add_argument("--bit-depths", type=_csv(int), default=[8, 16], help="Source bit depths (default: 8,16).")
+    parser.add_argument("--output-bit-depths", type=_csv(int), default=[8, 16], help="Conversion output bit depths (default: 8,16).")
+    parser.add_argument("--modes", type=lambda text: text.split("|"), default=list(engine.GRAYSCALE_MODES), help="'|'-separated conversion modes (default: all).")
+    parser.add_argument("--formats", type=_csv(str), default=sorted({fmt for fmt, _, _ in SAVE_CASES}), help="Comma-separated output formats for the save benchmark.")
+    parser.add_argument("--kernel", choices=engine.KERNELS, default=engine.DEFAULT_KERNEL, help="Conversion kernel.")
+    parser.add_argument("--threads", type=_csv(int), default=[1], help="Comma-separated conversion thread counts to time (default: 1; e.g. 1,2,4,8).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per case after one warm-up run; the median is reported.")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="Skip the peak RSS / allocation measurement run.")
+    parser.add_argument("--skip-convert", action="store_true", help="Only run the save benchmark.")
+    parser.add_argument("--skip-save", action="store_true", help="Only run the conversion benchmark.")
+    parser.add_argument("--compare", help="Earlier results JSON to print speed ratios against.")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = run(args)
+    with open(args.output, "w") as f: json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if args.compare: compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_CACHE_BYTES = 1 << 30
+
+def estimate_nbytes(value):
+    if value is None: return 0
+    if isinstance(value, np.ndarray) or isinstance(getattr(value, 'nbytes', None), int): return value.nbytes
+    if isinstance(value, (tuple, list)): return sum(estimate_nbytes(v) for v in value)
+    if hasattr(value, 'width') and hasattr(value, 'height'):
+        # PIL images expose width/height as attributes, Tk PhotoImages as methods (stored as 32-bit pixels).
+        if callable(value.width): return value.width() * value.height() * 4
+        return value.width * value.height * len(value.getbands())
+    return 0
+
+class LRUCache:
+    """Thread-safe least-recently-used cache bounded by the estimated byte size of its values."""
+
+    def __init__(self, max_bytes=DEFAULT_CACHE_BYTES, sizeof=estimate_nbytes):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self.lock:
+            if key in self.entries: self.current_bytes -= self.entries.pop(key)[1]
+            if size > self.max_bytes: return
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def discard(self, predicate):
+        with self.lock:
+            for key in [k for k in self.entries if predicate(k)]:
+                self.current_bytes -= self.entries.pop(key)[1]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key):
+        with self.lock: return key in self.entries
+
+    def __len__(self):
+        with self.lock: return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries), "bytes": self.current_bytes, "max_bytes": self.max_bytes}
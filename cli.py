@@ -0,0 +1,168 @@
+import argparse
+import glob
+import json
+import os
+import queue
+import sys
+
+import batch
+import engine
+import icc
+import manifest
+import profiling
+import streaming
+import watch
+
+def expand_inputs(patterns):
+    paths, seen = [], set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isfile(path) and path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+def build_settings(args):
+    settings = {}
+    if args.preset:
+        with open(args.preset, 'r') as f: settings.update(json.load(f))
+    # A preset's "size" belongs to whatever image the dialog was opened on; headless jobs keep each source's own size.
+    settings.pop("size", None)
+    # Thread counts depend on the machine, not the preset: by default the cores are shared among the jobs.
+    settings.pop("threads", None)
+    if args.format: settings["format"] = args.format
+    if args.bit_depth: settings["bit_depth"] = args.bit_depth
+    if args.quality is not None: settings["quality"] = args.quality
+    if args.kernel: settings["kernel"] = args.kernel
+    if args.transfer: settings["transfer"] = args.transfer
+    if args.png_compress_level is not None: settings["png_compress_level"] = args.png_compress_level
+    if args.png_strategy: settings["png_strategy"] = args.png_strategy
+    if args.tiff_compression: settings["tiff_compression"] = args.tiff_compression
+    if args.webp_method is not None: settings["webp_method"] = args.webp_method
+    if args.stream: settings["streaming"] = True
+    if args.all_frames: settings["all_frames"] = True
+    if args.band_rows: settings["band_rows"] = args.band_rows
+    if args.dpi: settings["dpi"] = args.dpi
+    if args.icc_dir: icc.REGISTRY.add_dirs(args.icc_dir)
+    if args.icc_profile: settings["icc_profile_path"] = icc.REGISTRY.resolve(args.icc_profile)
+    if args.no_alpha: settings["preserve_alpha"] = False
+    if args.strip_metadata: settings["strip_metadata"] = True
+    if args.mode: settings["conversion_mode"] = args.mode
+    settings = engine.headless_settings(settings, args.jobs)
+    if args.convert_threads: settings["threads"] = args.convert_threads
+    return settings
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="grayscale", description="Headless Enhanced Precision Grayscale Converter.")
+    parser.add_argument("inputs", nargs="+", help="Input files or glob patterns (quote globs, e.g. 'scans/**/*.tif'); folders to watch with --watch.")
+    parser.add_argument("-o", "--output-dir", required=True, help="Folder that receives the converted images.")
+    parser.add_argument("--mode", choices=engine.GRAYSCALE_MODES, help="Conversion mode (default: Rec. 709 or the preset's mode).")
+    parser.add_argument("--bit-depth", type=int, choices=[8, 16, engine.FLOAT_BIT_DEPTH], help="Output bit depth; 32 writes linear float TIFF (default: source bit depth).")
+    parser.add_argument("--format", choices=[".png", ".tiff", ".jpeg", ".webp", ".bmp", ".heic", "png", "tiff", "jpeg", "webp", "bmp", "heic"], help="Output format (default: .png).")
+    parser.add_argument("--kernel", choices=engine.KERNELS, help="Conversion kernel (default: auto, which uses float32 when its error bound is below one output LSB; lut and float64 are bit-exact).")
+    parser.add_argument("--transfer", choices=engine.TRANSFERS, help="How source samples map to light: srgb, linear, or the HDR signals pq and hlg (default: auto, linear for float sources and srgb otherwise).")
+    parser.add_argument("--quality", type=int, help="JPEG/WebP/HEIC quality, 0-100.")
+    parser.add_argument("--png-compress-level", type=int, choices=range(10), metavar="0-9", help=f"PNG deflate level; lower is faster, higher is smaller (default: {engine.DEFAULT_PNG_COMPRESS_LEVEL}).")
+    parser.add_argument("--png-strategy", choices=list(engine.PNG_STRATEGIES), help="PNG zlib strategy; huffman and rle are much faster at some cost in size (default: default).")
+    parser.add_argument("--tiff-compression", choices=engine.TIFF_COMPRESSIONS, help="TIFF compression (default: none).")
+    parser.add_argument("--webp-method", type=int, choices=range(7), metavar="0-6", help=f"WebP encoder effort; lower is faster (default: {engine.DEFAULT_WEBP_METHOD}).")
+    parser.add_argument("--dpi", type=int, help="DPI written to the output metadata.")
+    parser.add_argument("--icc-profile", help=f"ICC profile embedded in the output: a file, or the name of a profile in the profile folders or built in (e.g. \"{icc.DEFAULT_GRAY_PROFILE[len(icc.BUILTIN_PREFIX):]}\").")
+    parser.add_argument("--icc-dir", action="append", help="Extra folder searched for ICC profiles by name (repeatable).")
+    parser.add_argument("--no-alpha", action="store_true", help="Discard the alpha channel.")
+    parser.add_argument("--strip-metadata", action="store_true", help="Do not write ICC/DPI metadata.")
+    parser.add_argument("--stream", action="store_true", help="Convert PNG/TIFF output band by band so memory does not grow with image size.")
+    parser.add_argument("--band-rows", type=int, help=f"Rows per band when streaming (default: {streaming.DEFAULT_BAND_ROWS}).")
+    parser.add_argument("--all-frames", action="store_true", help="Convert every page, animation frame or PSD layer into a multi-page TIFF or animated WebP (.tiff/.webp output only).")
+    parser.add_argument("--preset", help="Export preset JSON saved from the Advanced Export dialog.")
+    parser.add_argument("--suffix", default="_grayscale", help="Suffix appended to output file names (default: _grayscale).")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="Number of parallel workers (default: 1).")
+    parser.add_argument("--threads", action="store_true", help="Use a thread pool instead of worker processes.")
+    parser.add_argument("--convert-threads", type=int, metavar="N", help="Threads each conversion splits its rows across (default: CPU count divided by --jobs). Output does not depend on it.")
+    parser.add_argument("--pipeline", action="store_true", help="Run decode, convert and encode as separate threaded stages, so encoding one file overlaps decoding the next; --jobs threads per stage.")
+    parser.add_argument("--force", action="store_true", help="Convert every input, even those the output folder's manifest lists as up to date.")
+    parser.add_argument("--no-manifest", action="store_true", help=f"Neither read nor write the {manifest.MANIFEST_NAME} job manifest in the output folder.")
+    parser.add_argument("--watch", action="store_true", help="Keep running and convert files as they appear in the input folders (Ctrl+C to stop).")
+    parser.add_argument("--recursive", action="store_true", help="With --watch, also watch subfolders.")
+    parser.add_argument("--settle", type=float, default=watch.DEFAULT_SETTLE_TIME, help="With --watch, seconds a file must stay unchanged before it is converted.")
+    parser.add_argument("--poll-interval", type=float, default=watch.DEFAULT_POLL_INTERVAL, help="With --watch, seconds between folder checks.")
+    parser.add_argument("--profile", metavar="FILE", help="Record wall time, CPU time and peak memory of every pipeline stage, print a summary and save the events to FILE (Chrome trace format if FILE ends in .trace.json, plain JSON otherwise).")
+    parser.add_argument("--max-memory", type=int, default=batch.DEFAULT_MEMORY_BUDGET // 2**20, help="Cap on the estimated memory of images being converted at once, in MiB.")
+    return parser.parse_args(argv)
+
+def watch_folders(args, settings):
+    missing = [d for d in args.inputs if not os.path.isdir(d)]
+    if missing:
+        print(f"Not a folder: {', '.join(missing)}", file=sys.stderr)
+        return 2
+    results = queue.Queue()
+    watcher = watch.FolderWatcher(args.inputs, args.output_dir, settings, results, workers=args.jobs, use_processes=not args.threads, suffix=args.suffix,
+                                  recursive=args.recursive, poll_interval=args.poll_interval, settle_time=args.settle, use_manifest=not args.no_manifest)
+    watcher.start()
+    print(f"Watching {', '.join(args.inputs)} ({'polling' if watcher.polling else 'filesystem events'}); Ctrl+C to stop.")
+    failures = 0
+    try:
+        while True:
+            result_type, data = results.get()
+            if result_type == 'profile_events': profiling.PROFILER.extend(data)
+            elif result_type == 'batch_item_success': print(f"OK    {data}")
+            elif result_type == 'batch_item_skipped': print(f"SKIP  {data} (up to date)")
+            elif result_type == 'batch_item_failed':
+                failures += 1
+                print(f"FAIL  {data[0]}: {data[2]}", file=sys.stderr)
+    except KeyboardInterrupt:
+        print("Stopping; waiting for running conversions...")
+        watcher.stop()
+        watcher.wait()
+        if args.profile: report_profile(args.profile)
+    return 1 if failures else 0
+
+def report_profile(path):
+    print(profiling.format_summary(profiling.PROFILER.snapshot()))
+    profiling.PROFILER.save(path)
+    print(f"Stage profile written to {path}")
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.profile: profiling.PROFILER.enable()
+    try: settings = icc.with_resolved_profile(build_settings(args))
+    except (OSError, ValueError) as e:
+        print(f"ICC profile: {e}", file=sys.stderr)
+        return 2
+    if args.watch:
+        return watch_folders(args, settings)
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("No input files matched.", file=sys.stderr)
+        return 2
+    os.makedirs(args.output_dir, exist_ok=True)
+    jobs = [(path, engine.output_path_for(path, args.output_dir, settings, args.suffix)) for path in inputs]
+    results = queue.Queue()
+    job_manifest = None if args.no_manifest else manifest.BatchManifest(args.output_dir)
+    if job_manifest and args.force: job_manifest.forget(inputs)
+    if args.pipeline: scheduler = batch.PipelineScheduler(results, workers=args.jobs, memory_budget=args.max_memory * 2**20, manifest=job_manifest)
+    else: scheduler = batch.BatchScheduler(results, workers=args.jobs, use_processes=not args.threads, memory_budget=args.max_memory * 2**20, manifest=job_manifest)
+    scheduler.start((in_path, out_path, settings) for in_path, out_path in jobs)
+    out_paths, failures, skipped, finished = dict(jobs), 0, 0, 0
+    while finished < len(jobs):
+        result_type, data = results.get()
+        if result_type == 'profile_events':
+            profiling.PROFILER.extend(data)
+            continue
+        finished += 1
+        if result_type == 'batch_item_success':
+            print(f"OK    {data} -> {out_paths[data]}")
+        elif result_type == 'batch_item_skipped':
+            skipped += 1
+            print(f"SKIP  {data} (up to date)")
+        else:
+            failures += 1
+            print(f"FAIL  {data[0]}: {data[2]}", file=sys.stderr)
+    scheduler.wait()
+    print(f"{len(jobs) - failures - skipped}/{len(jobs)} converted" + (f", {skipped} up to date." if skipped else "."))
+    if args.profile: report_profile(args.profile)
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
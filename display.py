@@ -0,0 +1,133 @@
+import math
+from PIL import Image
+import numpy as np
+
+import engine
+
+# Pyramids stop halving once the longer side is at most this many pixels.
+MIN_LEVEL_SIZE = 256
+MAX_ZOOM = 16.0
+ZOOM_STEP = 1.25
+
+def _linear_to_8bit(values):
+    # Float samples are linear light, shown sRGB-encoded and clipped at reference white.
+    return np.round(engine.to_srgb(np.clip(values, 0, 1)) * 255).astype(np.uint8)
+
+def to_display_image(image):
+    """8-bit PIL image Tk can show: 16-bit gray keeps its top byte instead of clipping at 255."""
+    if isinstance(image, np.ndarray):
+        if image.dtype.kind == 'f': return Image.fromarray(_linear_to_8bit(image))
+        return Image.fromarray(image if image.dtype == np.uint8 else (image >> 8).astype(np.uint8))
+    if image.mode in ('RGB', 'RGBA', 'L', 'LA'): return image
+    if image.mode.startswith('I;16'): return Image.fromarray((np.asarray(image) >> 8).astype(np.uint8))
+    if image.mode == 'F': return Image.fromarray(_linear_to_8bit(np.asarray(image)))
+    return image.convert('RGBA')
+
+def _clamp(value, high):
+    return max(0.0, min(value, high))
+
+class ImagePyramid:
+    """Mipmaps of an image for display, built once: level 0 is the image itself (a MappedImage
+    stays mapped) and every further level is a 2x2 box reduction of the one before. A view is
+    rendered from the smallest level that still has the detail the zoom asks for, cropped to
+    the visible region before resampling, so a repaint costs about one canvas of pixels at any
+    zoom. scale is pyramid pixels per view pixel, for pyramids of a downscaled stand-in."""
+
+    def __init__(self, image, scale=1.0):
+        # image may also be a converted (H, W) array.
+        self.scale = scale
+        if not isinstance(image, engine.MappedImage): image = to_display_image(image)
+        self.size = image.size
+        if max(image.size) <= MIN_LEVEL_SIZE: level = None
+        else: level = image.to_pil(factor=2) if isinstance(image, engine.MappedImage) else image.reduce(2)
+        self.levels = [image]
+        while level is not None:
+            self.levels.append(level)
+            level = level.reduce(2) if max(level.size) > MIN_LEVEL_SIZE else None
+
+    @property
+    def nbytes(self):
+        # A mapped level 0 lives in the page cache, not in this process's allocations.
+        return sum(level.width * level.height * len(level.getbands()) for level in self.levels if isinstance(level, Image.Image))
+
+    def _crop(self, level, box):
+        if not isinstance(level, engine.MappedImage): return level.crop(box)
+        x0, y0, x1, y1 = box
+        alpha = level.alpha[y0:y1, x0:x1] if level.alpha is not None else None
+        return engine.MappedImage(level.filename, level.rgb[y0:y1, x0:x1], alpha, level.info).to_pil()
+
+    def render(self, zoom, center, canvas_size):
+        """The part of the image visible on a canvas of canvas_size at zoom (canvas pixels per view
+        pixel) around center (view pixels), and the canvas position of its top left corner."""
+        cw, ch = canvas_size
+        w, h = self.size
+        z = zoom / self.scale
+        left, top = _clamp(center[0] * self.scale - cw / z / 2, w - cw / z), _clamp(center[1] * self.scale - ch / z / 2, h - ch / z)
+        right, bottom = min(w, left + cw / z), min(h, top + ch / z)
+        out_size = (max(1, round((right - left) * z)), max(1, round((bottom - top) * z)))
+        index = min(len(self.levels) - 1, int(math.log2(1 / z))) if z < 1 else 0
+        level = self.levels[index]
+        sx, sy = level.size[0] / w, level.size[1] / h
+        box = (left * sx, top * sy, right * sx, bottom * sy)
+        crop = (int(box[0]), int(box[1]), min(level.size[0], math.ceil(box[2])), min(level.size[1], math.ceil(box[3])))
+        region = self._crop(level, crop)
+        # Magnified pixels stay sharp squares, which is what inspecting 1:1 detail is for.
+        resample = Image.Resampling.NEAREST if z / sx >= 1 else Image.Resampling.LANCZOS
+        image = region.resize(out_size, resample, box=(box[0] - crop[0], box[1] - crop[1], box[2] - crop[0], box[3] - crop[1]))
+        return image, (max(0, (cw - out_size[0]) // 2), max(0, (ch - out_size[1]) // 2))
+
+def render_converted(pyramid, mode, zoom, center, canvas_size, kernel=engine.DEFAULT_KERNEL):
+    """A grayscale preview of just the visible region, converted from the source pyramid: used
+    when the view is zoomed in beyond the detail of the converted preview proxy."""
+    image, position = pyramid.render(zoom, center, canvas_size)
+    gray, _ = engine.convert_to_enhanced_grayscale(image, mode, 8, kernel)
+    return Image.fromarray(gray), position
+
+class View:
+    """Zoom and centre, in source image pixels, shared by the original and preview canvases.
+    A zoom of None fits the whole image; the centre is kept where the image still fills the
+    canvas, so panning stops at the edges."""
+
+    def __init__(self, image_size):
+        self.image_size = image_size
+        self.reset()
+
+    def reset(self):
+        self.zoom = None
+        self.center = (self.image_size[0] / 2, self.image_size[1] / 2)
+
+    def fit_zoom(self, canvas_size):
+        return min(canvas_size[0] / self.image_size[0], canvas_size[1] / self.image_size[1], 1.0)
+
+    def zoom_for(self, canvas_size):
+        return self.zoom or self.fit_zoom(canvas_size)
+
+    def to_image(self, point, canvas_size):
+        z = self.zoom_for(canvas_size)
+        return self.center[0] + (point[0] - canvas_size[0] / 2) / z, self.center[1] + (point[1] - canvas_size[1] / 2) / z
+
+    def _clamp_center(self, canvas_size):
+        z = self.zoom_for(canvas_size)
+        half_w, half_h = canvas_size[0] / z / 2, canvas_size[1] / z / 2
+        w, h = self.image_size
+        self.center = (min(max(self.center[0], half_w), w - half_w) if 2 * half_w < w else w / 2,
+                       min(max(self.center[1], half_h), h - half_h) if 2 * half_h < h else h / 2)
+
+    def zoom_at(self, factor, point, canvas_size):
+        """Zooms by factor keeping the image pixel under point (canvas coordinates) in place."""
+        fit = self.fit_zoom(canvas_size)
+        new = min(MAX_ZOOM, max(fit, self.zoom_for(canvas_size) * factor))
+        x, y = self.to_image(point, canvas_size)
+        self.zoom = None if new <= fit else new
+        self.center = (x - (point[0] - canvas_size[0] / 2) / new, y - (point[1] - canvas_size[1] / 2) / new)
+        self._clamp_center(canvas_size)
+
+    def pan(self, dx, dy, canvas_size):
+        z = self.zoom_for(canvas_size)
+        self.center = (self.center[0] - dx / z, self.center[1] - dy / z)
+        self._clamp_center(canvas_size)
+
+    def key(self, canvas_size):
+        """Hashable state of what a canvas of canvas_size shows."""
+        if self.zoom is None: return (None, tuple(canvas_size))
+        return (self.zoom, round(self.center[0], 2), round(self.center[1], 2), tuple(canvas_size))
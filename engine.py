@@ -0,0 +1,770 @@
+import math
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image, UnidentifiedImageError
+import numpy as np
+
+import icc
+import profiling
+
+# Heavy codecs (tifffile, pillow_heif) are imported on first use so that
+# headless callers only pay for the formats they actually touch.
+_tifffile = None
+_heif_support = None
+
+GRAYSCALE_MODES = ["L*a*b* (L*)", "Gamma", "Rec. 709", "HSL (Lightness)", "HSV (Value)", "Rec. 601", "Rec. 2100"]
+FORMAT_MAP = {".jpeg": "JPEG", ".jpg": "JPEG", ".png": "PNG", ".tiff": "TIFF", ".tif": "TIFF", ".webp": "WEBP", ".bmp": "BMP", ".heic": "HEIF", ".heif": "HEIF"}
+HEIF_EXTENSIONS = (".heic", ".heif")
+EXR_EXTENSIONS = (".exr",)
+# Encoder speed/size settings. PNG strategies are zlib's, honoured by every PNG writer here.
+PNG_STRATEGIES = {"default": zlib.Z_DEFAULT_STRATEGY, "filtered": zlib.Z_FILTERED, "huffman": zlib.Z_HUFFMAN_ONLY, "rle": zlib.Z_RLE, "fixed": zlib.Z_FIXED}
+DEFAULT_PNG_COMPRESS_LEVEL = 6
+TIFF_COMPRESSIONS = ("none", "lzw", "deflate", "zstd")
+_PIL_TIFF_COMPRESSION = {"lzw": "tiff_lzw", "deflate": "tiff_adobe_deflate", "zstd": "zstd"}
+DEFAULT_WEBP_METHOD = 4
+# Float pipeline: samples are decoded to linear light (1.0 = reference white) with a transfer
+# function, converted in float and written as linear float or quantised. "auto" reads float
+# sources as linear and integer sources as sRGB; PQ and HLG are the BT.2100 HDR signals.
+TRANSFERS = ("auto", "srgb", "linear", "pq", "hlg")
+DEFAULT_TRANSFER = "auto"
+FLOAT_BIT_DEPTH = 32
+SAMPLE_DTYPES = (np.uint8, np.uint16, np.float16, np.float32, np.float64)
+# BT.2408 reference white: 203 cd/m2 on the PQ scale, a 75% HLG signal.
+PQ_REFERENCE_WHITE = 203.0
+HLG_REFERENCE_SIGNAL = 0.75
+_PQ_M1, _PQ_M2 = 2610 / 16384, 2523 / 4096 * 128
+_PQ_C1, _PQ_C2, _PQ_C3 = 3424 / 4096, 2413 / 4096 * 32, 2392 / 4096 * 32
+_HLG_A = 0.17883277
+_HLG_B, _HLG_C = 1 - 4 * _HLG_A, 0.5 - _HLG_A * math.log(4 * _HLG_A)
+
+def get_tifffile():
+    global _tifffile
+    if _tifffile is None:
+        try: import tifffile
+        except ImportError: raise ImportError("The 'tifffile' library is required. Please run: pip install tifffile")
+        _tifffile = tifffile
+    return _tifffile
+
+def tifffile_compression(name):
+    """tifffile's name for a TIFF_COMPRESSIONS entry. Pillow writes all of them through libtiff;
+    tifffile only deflates on its own and needs imagecodecs for LZW and Zstandard."""
+    if name in (None, "none"): return None
+    if name != "deflate":
+        try: import imagecodecs
+        except ImportError: raise ImportError(f"{name.upper()} compression of this TIFF layout requires imagecodecs. Please run: pip install imagecodecs")
+    return {"lzw": "lzw", "deflate": "adobe_deflate", "zstd": "zstd"}[name]
+
+def heif_support():
+    global _heif_support
+    if _heif_support is None:
+        try:
+            import pillow_heif
+            pillow_heif.register_heif_opener()
+            _heif_support = True
+        except ImportError:
+            _heif_support = False
+    return _heif_support
+
+def output_formats():
+    formats = [".png", ".tiff", ".jpeg", ".webp", ".bmp"]
+    if heif_support(): formats.append(".heic")
+    return formats
+
+def to_linear(c):
+    return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
+
+def to_srgb(c):
+    return np.where(c <= 0.0031308, c * 12.92, 1.055 * (c ** (1/2.4)) - 0.055)
+
+def pq_to_linear(signal):
+    """ST 2084 (PQ) EOTF, scaled so that 1.0 is PQ_REFERENCE_WHITE."""
+    p = np.power(np.clip(signal, 0, 1), 1 / _PQ_M2)
+    return np.power(np.maximum(p - _PQ_C1, 0) / (_PQ_C2 - _PQ_C3 * p), 1 / _PQ_M1) * (10000 / PQ_REFERENCE_WHITE)
+
+def linear_to_pq(linear):
+    y = np.power(np.clip(linear * (PQ_REFERENCE_WHITE / 10000), 0, 1), _PQ_M1)
+    return np.power((_PQ_C1 + _PQ_C2 * y) / (1 + _PQ_C3 * y), _PQ_M2)
+
+def _hlg_scene(signal):
+    return np.where(signal <= 0.5, signal * signal / 3, (np.exp((signal - _HLG_C) / _HLG_A) + _HLG_B) / 12)
+
+_HLG_WHITE = float(_hlg_scene(np.float64(HLG_REFERENCE_SIGNAL)))
+
+def hlg_to_linear(signal):
+    """BT.2100 HLG inverse OETF (scene light), scaled so that 1.0 is HLG_REFERENCE_SIGNAL."""
+    return _hlg_scene(np.clip(signal, 0, 1)) / _HLG_WHITE
+
+def linear_to_hlg(linear):
+    e = np.clip(linear * _HLG_WHITE, 0, 1)
+    return np.where(e <= 1 / 12, np.sqrt(3 * e), _HLG_A * np.log(np.maximum(12 * e - _HLG_B, 1e-6)) + _HLG_C)
+
+def image_to_array(image: Image.Image):
+    """Split a PIL image into an RGB (H, W, 3) array and an optional alpha plane."""
+    if isinstance(image, MappedImage): return image.rgb, image.alpha
+    if image.mode in ('RGB', 'RGBA'):
+        arr = np.asarray(image)
+        rgb, alpha = arr[:, :, :3], (arr[:, :, 3] if image.mode == 'RGBA' else None)
+    elif image.mode in ('L', 'LA'):
+        arr = np.asarray(image)
+        gray = arr if image.mode == 'L' else arr[:, :, 0]
+        rgb, alpha = np.repeat(gray[:, :, None], 3, axis=2), (arr[:, :, 1] if image.mode == 'LA' else None)
+    elif image.mode == 'F' or image.mode.startswith('I'):
+        # 16-bit, 32-bit integer and float gray keep their precision (32-bit integers are clipped to 16 bits).
+        arr = np.asarray(image)
+        if image.mode == 'I': arr = np.clip(arr, 0, 65535)
+        if image.mode != 'F': arr = arr.astype(np.uint16)
+        rgb, alpha = np.broadcast_to(arr[:, :, None], arr.shape + (3,)), None
+    else:
+        arr = np.asarray(image.convert("RGBA"))
+        rgb, alpha = arr[:, :, :3], arr[:, :, 3]
+    return rgb, alpha
+
+MODE_KEYS = {"Rec. 601": '601', "Rec. 709": '709', "Rec. 2100": '2100', "Gamma": 'gamma',
+             "L*a*b* (L*)": 'lab', "HSV (Value)": 'value', "HSL (Lightness)": 'lightness'}
+LUMA_WEIGHTS = {'601': (0.299, 0.587, 0.114), '709': (0.2126, 0.7152, 0.0722), '2100': (0.2627, 0.6780, 0.0593)}
+# Y row of the Bradford-adapted sRGB -> XYZ (D50) matrix; D50 is the white point of PIL's LAB conversion.
+LAB_Y_WEIGHTS = (0.2225045, 0.7168786, 0.0606169)
+COLOR_SPACE_MODES = ('lab', 'value', 'lightness')
+# "float64" is the reference implementation; "lut" is bit-exact with it and much faster on large frames;
+# "float32" works in place in single precision and stays within float32_error_bound() of the reference.
+# "auto" picks float32 whenever that bound is below one output LSB, otherwise lut.
+KERNELS = ("auto", "float32", "lut", "float64")
+DEFAULT_KERNEL = "auto"
+# Approximate peak working memory per pixel of each kernel, on top of the decoded input.
+KERNEL_WORKING_BYTES = {"float64": 6 + 3 * 8 + 8, "lut": 3 * 8 + 4 + 2, "float32": 2 * 4 + 1 + 2}
+FLOAT32_UNIT_ROUNDOFF = 2.0 ** -24
+# Where an export's resize happens: on the source before conversion (optionally in linear light,
+# which keeps highlights and dark detail balanced), or on the converted output.
+RESAMPLE_ORDERS = ("before", "linear", "after")
+DEFAULT_RESAMPLE = "before"
+# Buckets per unit of linear luminance used by the Gamma output quantiser.
+GAMMA_QUANT_BUCKETS = 1 << 20
+# Threaded conversion splits the frame into bands of this many rows, which keeps each band's
+# float temporaries small; frames below MIN_THREADED_PIXELS are not worth splitting.
+THREAD_BAND_ROWS = 128
+MIN_THREADED_PIXELS = 1 << 20
+def _output_scale(target_bit_depth):
+    if target_bit_depth == FLOAT_BIT_DEPTH: return (1.0, np.float32)
+    return (65535, np.uint16) if target_bit_depth == 16 else (255, np.uint8)
+
+def _quantize(gray_float, target_bit_depth):
+    multiplier, dtype = _output_scale(target_bit_depth)
+    gray_float = np.clip(gray_float, 0, 1, out=gray_float)
+    np.multiply(gray_float, multiplier, out=gray_float)
+    return np.round(gray_float, out=gray_float).astype(dtype)
+
+def _finish_scaled(values, target_bit_depth, out=None):
+    multiplier, dtype = _output_scale(target_bit_depth)
+    np.clip(values, 0, multiplier, out=values)
+    np.rint(values, out=values)
+    if out is None: return values.astype(dtype)
+    np.copyto(out, values, casting='unsafe')
+    return out
+
+@lru_cache(maxsize=None)
+def _level_codes(levels, target_bit_depth):
+    """Output code of every integer level 0..levels-1, with levels-1 mapping to white."""
+    multiplier, dtype = _output_scale(target_bit_depth)
+    return np.round(np.arange(levels, dtype=np.float64) * (multiplier / (levels - 1))).astype(dtype)
+
+def _convert_color_space(rgb, script_mode, target_bit_depth, float_dtype=np.float64, out=None):
+    """HSV Value, HSL Lightness and CIE L* computed directly on the 8/16-bit planes."""
+    # Table indices below are always in range; mode='clip' merely skips np.take's bounds check.
+    R, G, B = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    in_max = 255 if rgb.dtype == np.uint8 else 65535
+    if script_mode == 'value':
+        # max(R, G, B) and max + min are exact integers, so a table of output codes finishes the job.
+        gray = np.take(_level_codes(in_max + 1, target_bit_depth), np.maximum(np.maximum(R, G), B), mode='clip')
+    elif script_mode == 'lightness':
+        total = np.add(np.maximum(np.maximum(R, G), B), np.minimum(np.minimum(R, G), B), dtype=np.uint32)
+        gray = np.take(_level_codes(2 * in_max + 1, target_bit_depth), total, mode='clip')
+    else:
+        multiplier, _ = _output_scale(target_bit_depth)
+        lut_r, lut_g, lut_b = (lut.astype(float_dtype, copy=False) for lut in _channel_luts('lab', rgb.dtype.name))
+        Y = np.take(lut_r, R, mode='clip')
+        term = np.take(lut_g, G, mode='clip')
+        Y += term
+        Y += np.take(lut_b, B, out=term, mode='clip')
+        # CIE L* / 100 = 1.16 * f(Y) - 0.16, with the linear segment of f below (6/29)**3.
+        np.cbrt(Y, out=term)
+        small = Y <= float_dtype((6 / 29) ** 3)
+        np.multiply(Y, float_dtype(841 / 108), out=term, where=small)
+        np.add(term, float_dtype(4 / 29), out=term, where=small)
+        term *= float_dtype(1.16 * multiplier)
+        term -= float_dtype(0.16 * multiplier)
+        return _finish_scaled(term, target_bit_depth, out)
+    if out is None: return gray
+    out[...] = gray
+    return out
+
+def _convert_float64(rgb, script_mode, target_bit_depth):
+    if rgb.dtype == np.uint8: rgb = rgb.astype(np.uint16) * 257
+    R, G, B = rgb[:, :, 0], rgb[:, :, 1], rgb[:, :, 2]
+    Rf, Gf, Bf = R.astype(np.float64)/65535.0, G.astype(np.float64)/65535.0, B.astype(np.float64)/65535.0
+    if script_mode == 'gamma':
+        Rl, Gl, Bl = to_linear(Rf), to_linear(Gf), to_linear(Bf)
+        Yl = 0.2126 * Rl + 0.7152 * Gl + 0.0722 * Bl
+        return _quantize(to_srgb(Yl), target_bit_depth)
+    wR, wG, wB = LUMA_WEIGHTS[script_mode]
+    return _quantize(wR * Rf + wG * Gf + wB * Bf, target_bit_depth)
+
+@lru_cache(maxsize=None)
+def _channel_luts(script_mode, input_dtype):
+    # Each entry is computed with exactly the float64 operations of _convert_float64, so the
+    # gathered per-channel terms (and therefore their sum) are identical to the reference path.
+    levels = np.arange(256, dtype=np.float64) * 257 if input_dtype == 'uint8' else np.arange(65536, dtype=np.float64)
+    levels /= 65535.0
+    if script_mode == 'gamma':
+        linear = to_linear(levels)
+        return 0.2126 * linear, 0.7152 * linear, 0.0722 * linear
+    if script_mode == 'lab':
+        linear = to_linear(levels)
+        return tuple(w * linear for w in LAB_Y_WEIGHTS)
+    return tuple(w * levels for w in LUMA_WEIGHTS[script_mode])
+
+@lru_cache(maxsize=None)
+def _gamma_quantizer(target_bit_depth):
+    """Exact replacement for _quantize(to_srgb(Y)): a bucket table of output codes plus the
+    luminance thresholds at which the code steps up, found by bisection on the float64 bit
+    pattern. Codes are looked up by bucket and then bumped past any threshold inside it."""
+    multiplier, _ = _output_scale(target_bit_depth)
+    reference = lambda y: _quantize(to_srgb(y), target_bit_depth).astype(np.int32)
+    codes = np.arange(1, multiplier + 1)
+    lo = np.zeros(multiplier, dtype=np.int64)
+    hi = np.full(multiplier, np.float64(1.0).view(np.int64))
+    while np.any(hi - lo > 1):
+        mid = (lo + hi) // 2
+        reached = reference(mid.view(np.float64)) >= codes
+        hi, lo = np.where(reached, mid, hi), np.where(reached, lo, mid)
+    thresholds = np.append(hi.view(np.float64), np.inf)
+    bucket_codes = reference(np.arange(GAMMA_QUANT_BUCKETS + 1, dtype=np.float64) / GAMMA_QUANT_BUCKETS)
+    passes = int(np.diff(bucket_codes).max())
+    return bucket_codes, thresholds, passes
+
+def _convert_lut(rgb, script_mode, target_bit_depth):
+    lut_r, lut_g, lut_b = _channel_luts(script_mode, rgb.dtype.name)
+    Y = np.take(lut_r, rgb[:, :, 0], mode='clip')
+    term = np.take(lut_g, rgb[:, :, 1], mode='clip')
+    Y += term
+    np.take(lut_b, rgb[:, :, 2], out=term, mode='clip')
+    Y += term
+    if script_mode != 'gamma': return _quantize(Y, target_bit_depth)
+    return _quantize_gamma(Y, target_bit_depth, out=term)
+
+def _quantize_gamma(Y, target_bit_depth, out=None):
+    """_quantize(to_srgb(Y)) for float64 luminance Y, through _gamma_quantizer; out is float64 scratch space."""
+    bucket_codes, thresholds, passes = _gamma_quantizer(target_bit_depth)
+    scaled = np.multiply(Y, GAMMA_QUANT_BUCKETS, out=out)
+    np.minimum(scaled, GAMMA_QUANT_BUCKETS, out=scaled)
+    codes = np.take(bucket_codes, scaled.astype(np.int32), mode='clip')
+    for _ in range(passes): codes += Y >= np.take(thresholds, codes, mode='clip')
+    return codes.astype(_output_scale(target_bit_depth)[1])
+
+def float32_error_bound(script_mode, target_bit_depth):
+    """Upper bound, in output LSBs, on |float32 kernel - float64 reference| before rounding, so
+    the rounded outputs differ by at most one code (and only next to a rounding tie).
+
+    Weighted sums round three coefficients, three products and two additions of non-negative
+    terms: at most 5u relative error on a value <= 1, with u = 2**-24. Gamma adds up to 4u on
+    the linear luminance; to_srgb then contributes at most 9.2u through powf and the 1.055/0.055
+    affine step, plus the 6e-6 jump between the two sRGB branches when single precision puts a
+    value on the other side of the 0.0031308 breakpoint."""
+    multiplier, _ = _output_scale(target_bit_depth)
+    if script_mode in ('value', 'lightness'): return 0.0
+    # L* has no branch jump, and cbrt shrinks the relative error of Y, so the Gamma budget covers it.
+    if script_mode == 'lab': return 9.2 * FLOAT32_UNIT_ROUNDOFF * multiplier
+    if script_mode != 'gamma': return 5 * FLOAT32_UNIT_ROUNDOFF * multiplier
+    t = 0.0031308
+    branch_jump = abs(t * 12.92 - (1.055 * t ** (1 / 2.4) - 0.055))
+    return (9.2 * FLOAT32_UNIT_ROUNDOFF + branch_jump) * multiplier
+
+def _convert_float32(rgb, script_mode, target_bit_depth, out=None):
+    multiplier, _ = _output_scale(target_bit_depth)
+    Y = np.empty(rgb.shape[:2], dtype=np.float32)
+    term = np.empty_like(Y)
+    if script_mode == 'gamma':
+        lut_r, lut_g, lut_b = (lut.astype(np.float32) for lut in _channel_luts(script_mode, rgb.dtype.name))
+        np.take(lut_r, rgb[:, :, 0], out=Y, mode='clip')
+        Y += np.take(lut_g, rgb[:, :, 1], out=term, mode='clip')
+        Y += np.take(lut_b, rgb[:, :, 2], out=term, mode='clip')
+        # to_srgb without np.where: the power branch is evaluated once and the linear branch patched in.
+        np.power(Y, np.float32(1 / 2.4), out=term)
+        term *= np.float32(1.055)
+        term -= np.float32(0.055)
+        np.multiply(Y, np.float32(12.92), out=term, where=Y <= np.float32(0.0031308))
+        term *= np.float32(multiplier)
+        return _finish_scaled(term, target_bit_depth, out)
+    scale = multiplier / (255.0 if rgb.dtype == np.uint8 else 65535.0)
+    wR, wG, wB = (np.float32(w * scale) for w in LUMA_WEIGHTS[script_mode])
+    np.multiply(rgb[:, :, 0], wR, out=Y)
+    Y += np.multiply(rgb[:, :, 1], wG, out=term)
+    Y += np.multiply(rgb[:, :, 2], wB, out=term)
+    return _finish_scaled(Y, target_bit_depth, out)
+
+def resolve_transfer(transfer, dtype):
+    if transfer not in TRANSFERS: raise ValueError(f"Unknown transfer function '{transfer}'")
+    if transfer != "auto": return transfer
+    return "linear" if np.dtype(dtype).kind == 'f' else "srgb"
+
+def uses_float_pipeline(dtype, transfer, target_bit_depth):
+    """Float sources, linear float output and non-sRGB transfers can't use the integer kernels."""
+    return np.dtype(dtype).kind == 'f' or transfer != "srgb" or target_bit_depth == FLOAT_BIT_DEPTH
+
+def decode_transfer(samples, transfer, float_dtype=np.float32):
+    """Linear light (1.0 = reference white) from float or 8/16-bit samples of a resolved transfer."""
+    x = samples.astype(float_dtype)
+    if samples.dtype.kind == 'u': x *= float_dtype(1 / np.iinfo(samples.dtype).max)
+    # Negative (out of gamut) and NaN samples become black.
+    np.fmax(x, 0, out=x)
+    if transfer == "srgb": return to_linear(x)
+    if transfer == "pq": return pq_to_linear(x)
+    if transfer == "hlg": return hlg_to_linear(x)
+    return x
+
+def _convert_hdr_band(rgb, script_mode, target_bit_depth, transfer, float_dtype):
+    linear = decode_transfer(rgb, transfer, float_dtype)
+    R, G, B = linear[:, :, 0], linear[:, :, 1], linear[:, :, 2]
+    # Rec. 2100 of sRGB-encoded samples is a weighted sum of the encoded values, as on the integer path.
+    if script_mode in ('gamma', 'lab') or (script_mode == '2100' and transfer != "srgb"):
+        # Luminance from linear light; Rec. 2100 uses the BT.2020 primaries' weights.
+        wR, wG, wB = LAB_Y_WEIGHTS if script_mode == 'lab' else LUMA_WEIGHTS['2100' if script_mode == '2100' else '709']
+        Y = wR * R + wG * G + wB * B
+        if target_bit_depth == FLOAT_BIT_DEPTH: return Y
+        if script_mode == 'lab': gray = np.where(Y <= (6 / 29) ** 3, Y * (841 / 108) + 4 / 29, np.cbrt(Y)) * 1.16 - 0.16
+        # An HDR source's Rec. 2100 gray is re-encoded with its own transfer function.
+        elif script_mode == '2100' and transfer == "pq": gray = linear_to_pq(Y)
+        elif script_mode == '2100' and transfer == "hlg": gray = linear_to_hlg(Y)
+        else: gray = to_srgb(Y)
+    else:
+        # The other modes are defined on encoded values: sRGB-encode, extended above white.
+        E = to_srgb(linear)
+        R, G, B = E[:, :, 0], E[:, :, 1], E[:, :, 2]
+        if script_mode == 'value': gray = np.maximum(np.maximum(R, G), B)
+        elif script_mode == 'lightness': gray = (np.maximum(np.maximum(R, G), B) + np.minimum(np.minimum(R, G), B)) * 0.5
+        else:
+            wR, wG, wB = LUMA_WEIGHTS[script_mode]
+            gray = wR * R + wG * G + wB * B
+        if target_bit_depth == FLOAT_BIT_DEPTH: return to_linear(np.fmax(gray, 0))
+    return _quantize(gray.astype(float_dtype, copy=False), target_bit_depth)
+
+def _convert_hdr(rgb, script_mode, target_bit_depth, transfer, kernel, out=None):
+    """The float pipeline. Bands of THREAD_BAND_ROWS keep its float temporaries to a few rows,
+    so a float16/float32 frame needs no more working memory than a 16-bit one. 32-bit output
+    is linear light: luminance for Gamma, L* and (unless the transfer is sRGB) Rec. 2100, otherwise the mode's sRGB-encoded
+    gray decoded back to linear. The float64 kernel computes in double precision."""
+    if out is None: out = np.empty(rgb.shape[:2], dtype=_output_scale(target_bit_depth)[1])
+    float_dtype = np.float64 if kernel == "float64" else np.float32
+    for y0 in range(0, rgb.shape[0], THREAD_BAND_ROWS):
+        out[y0:y0 + THREAD_BAND_ROWS] = _convert_hdr_band(rgb[y0:y0 + THREAD_BAND_ROWS], script_mode, target_bit_depth, transfer, float_dtype)
+    return out
+
+_KERNEL_FUNCS = {"float32": _convert_float32, "lut": _convert_lut, "float64": _convert_float64}
+
+def resolve_kernel(kernel, mode, target_bit_depth):
+    if kernel not in KERNELS: raise ValueError(f"Unknown conversion kernel '{kernel}'")
+    if kernel != "auto": return kernel
+    return "float32" if float32_error_bound(MODE_KEYS.get(mode, '709'), target_bit_depth) < 1 else "lut"
+
+def default_conversion_threads(workers=1):
+    """Threads per conversion that keep every core busy when workers convert at once."""
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+def _convert_bands(rgb, mode, target_bit_depth, kernel, out, threads, transfer="srgb"):
+    # Every kernel maps each pixel on its own, so bands converted independently (NumPy releases
+    # the GIL inside the ufuncs and gathers) assemble into exactly the single-threaded result.
+    starts = range(0, rgb.shape[0], THREAD_BAND_ROWS)
+    # The first row fills the cached tables (LUTs, Gamma quantiser) before the bands race to build them.
+    _convert_rgb(rgb[:1], mode, target_bit_depth, kernel, out[:1], transfer)
+    def run(first):
+        for y0 in starts[first::threads]:
+            y1 = y0 + THREAD_BAND_ROWS
+            _convert_rgb(rgb[y0:y1], mode, target_bit_depth, kernel, out[y0:y1], transfer)
+    # Each conversion brings its own helper threads and runs one share of the bands itself, so
+    # conversions running side by side (batch workers, the service) never queue behind each other.
+    with ThreadPoolExecutor(max_workers=threads - 1, thread_name_prefix="convert-band") as pool:
+        futures = [pool.submit(run, first) for first in range(1, threads)]
+        run(0)
+        for future in futures: future.result()
+    return out
+
+def convert_rgb_array(rgb, mode: str, target_bit_depth: int, kernel: str = DEFAULT_KERNEL, out=None, threads=1, transfer=DEFAULT_TRANSFER):
+    """Converts an (H, W, 3) uint8/uint16/float RGB array to 8/16-bit or (target_bit_depth 32)
+    float32 gray; writes into out when given. With threads > 1 large frames are converted in
+    row bands on that many threads, with identical output."""
+    if rgb.dtype not in SAMPLE_DTYPES: raise ValueError(f"Unsupported image dtype {rgb.dtype}")
+    kernel = resolve_kernel(kernel, mode, target_bit_depth)
+    transfer = resolve_transfer(transfer, rgb.dtype)
+    threads = min(threads, -(-rgb.shape[0] // THREAD_BAND_ROWS))
+    if threads > 1 and rgb.shape[0] * rgb.shape[1] >= MIN_THREADED_PIXELS:
+        if out is None: out = np.empty(rgb.shape[:2], dtype=_output_scale(target_bit_depth)[1])
+        return _convert_bands(rgb, mode, target_bit_depth, kernel, out, threads, transfer)
+    return _convert_rgb(rgb, mode, target_bit_depth, kernel, out, transfer)
+
+def _convert_rgb(rgb, mode, target_bit_depth, kernel, out=None, transfer="srgb"):
+    script_mode = MODE_KEYS.get(mode, '709')
+    if uses_float_pipeline(rgb.dtype, transfer, target_bit_depth): return _convert_hdr(rgb, script_mode, target_bit_depth, transfer, kernel, out)
+    if script_mode in COLOR_SPACE_MODES: return _convert_color_space(rgb, script_mode, target_bit_depth, np.float32 if kernel == "float32" else np.float64, out)
+    if kernel == "float32": return _convert_float32(rgb, script_mode, target_bit_depth, out)
+    gray = _KERNEL_FUNCS[kernel](rgb, script_mode, target_bit_depth)
+    if out is None: return gray
+    out[...] = gray
+    return out
+
+def convert_to_enhanced_grayscale(image: Image.Image, mode: str, target_bit_depth: int, kernel: str = DEFAULT_KERNEL, cancel_token=None, size=None, resample=DEFAULT_RESAMPLE, threads=1, transfer=DEFAULT_TRANSFER):
+    # cancel_token is any object with a check() method that raises when the caller has given up on the result.
+    # With a size and a "before"/"linear" resample order the source is resized first, so only the smaller frame is converted.
+    resize_first = size and resample != "after" and tuple(size) != image.size
+    if resize_first and resample == "before" and isinstance(image, Image.Image) and image.mode in ('RGB', 'RGBA', 'L', 'LA'):
+        # PIL filters 8-bit images in one pass over all channels and weights colour by alpha itself.
+        with profiling.stage("resize"): image, resize_first = image.resize(tuple(size), Image.Resampling.LANCZOS), False
+    rgb, alpha = image_to_array(image)
+    if cancel_token: cancel_token.check()
+    # Float sources are resized after conversion, by save_image; resample_planes works on 8/16-bit planes.
+    if resize_first and rgb.dtype.kind != 'f':
+        with profiling.stage("resize", linear=resample == "linear"): rgb, alpha = resample_planes(rgb, alpha, size, linear=resample == "linear")
+        if cancel_token: cancel_token.check()
+    gray = convert_rgb_array(rgb, mode, target_bit_depth, kernel, threads=threads, transfer=transfer)
+    if cancel_token: cancel_token.check()
+    # Alpha is returned as an (H, W) array in the output's sample type, so 16-bit alpha stays 16-bit.
+    if alpha is not None: alpha = np.ascontiguousarray(alpha_samples(alpha, target_bit_depth))
+    return gray, alpha
+
+def convert_with_settings(image, settings, cancel_token=None):
+    """convert_to_enhanced_grayscale with the conversion options of export settings (which must
+    have a bit_depth; see with_bit_depth)."""
+    return convert_to_enhanced_grayscale(image, settings['conversion_mode'], settings['bit_depth'], settings.get('kernel', DEFAULT_KERNEL), cancel_token,
+                                         size=settings.get('size'), resample=settings.get('resample', DEFAULT_RESAMPLE), threads=settings.get('threads', 1),
+                                         transfer=settings.get('transfer', DEFAULT_TRANSFER))
+
+def alpha_samples(alpha, target_bit_depth):
+    """Alpha plane in the output's sample type: uint8, uint16, or float32 from 0 to 1."""
+    multiplier, dtype = _output_scale(target_bit_depth)
+    if alpha.dtype == dtype: return alpha
+    if alpha.dtype == np.uint8 and dtype == np.uint16: return alpha.astype(np.uint16) * 257
+    scale = multiplier / (1.0 if alpha.dtype.kind == 'f' else np.iinfo(alpha.dtype).max)
+    values = np.clip(alpha * np.float64(scale), 0, multiplier)
+    return values.astype(np.float32) if dtype == np.float32 else np.round(values).astype(dtype)
+
+def make_preview_proxy(image: Image.Image, max_size):
+    """Downscaled copy of image that fits max_size, used for previews; the full-resolution
+    image is only converted at export time."""
+    w, h = image.size
+    scale = min(max_size[0] / w, max_size[1] / h, 1.0) if w and h else 1.0
+    if isinstance(image, MappedImage): image = image.to_pil(max_size if scale < 1.0 else None)
+    if scale >= 1.0: return image
+    if image.mode not in ('RGB', 'RGBA', 'L', 'LA'): image = image.convert('RGBA')
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+def bit_depth_for_mode(mode):
+    if mode.startswith('I;16'): return 16
+    if mode in ('I', 'F'): return 32
+    return 8
+
+def _display_text(info):
+    (w, h), icc = info['size'], 'ICC' if info['icc_profile'] else 'No ICC'
+    return f"Size: {w}×{h} | Mode: {info['mode']} | Bit Depth: {info['bit_depth']}-bit{' float' if info.get('float') else ''} | {icc}"
+
+@lru_cache(maxsize=None)
+def _linear_table(input_dtype):
+    levels = np.arange(256 if input_dtype == 'uint8' else 65536, dtype=np.float64)
+    return to_linear(levels / levels[-1]).astype(np.float32)
+
+def _resize_plane(plane, size):
+    return np.asarray(Image.fromarray(plane).resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0))
+
+def resample_planes(rgb, alpha, size, linear=False):
+    """LANCZOS-resizes source planes to size (w, h) before conversion, one channel at a time.
+    Colour is weighted by alpha while filtering so transparent pixels don't bleed into edges.
+    RGB comes back as uint16 to keep the filter's extra precision; alpha keeps its dtype."""
+    size = tuple(size)
+    in_max = 255.0 if rgb.dtype == np.uint8 else 65535.0
+    weight = None
+    if alpha is not None:
+        alpha_max = 255.0 if alpha.dtype == np.uint8 else 65535.0
+        weight = alpha.astype(np.float32) / np.float32(alpha_max)
+        resized_weight = _resize_plane(weight, size).clip(0, 1)
+        resized_alpha = np.round(resized_weight * alpha_max).astype(alpha.dtype)
+        resized_weight = np.maximum(resized_weight, np.float32(1 / alpha_max))
+    out = np.empty((size[1], size[0], 3), dtype=np.uint16)
+    for c in range(3):
+        if linear: plane = np.take(_linear_table(rgb.dtype.name), rgb[:, :, c], mode='clip')
+        else: plane = rgb[:, :, c].astype(np.float32) / np.float32(in_max)
+        if weight is not None: plane *= weight
+        plane = _resize_plane(plane, size)
+        if weight is not None: plane = plane / resized_weight
+        plane = plane.clip(0, 1)
+        if linear: plane = to_srgb(plane)
+        out[:, :, c] = np.round(plane * 65535.0)
+    return out, (resized_alpha if alpha is not None else None)
+
+def resize_output(gray_array, alpha, size):
+    """Resizes converted output (the "after" resample order) together with its alpha plane."""
+    size = tuple(size)
+    gray_array = np.asarray(Image.fromarray(gray_array).resize(size, Image.Resampling.LANCZOS))
+    if alpha is not None: alpha = np.asarray(Image.fromarray(alpha).resize(size, Image.Resampling.LANCZOS))
+    return gray_array, alpha
+
+def analyze_image_properties(image):
+    info = {'filepath': getattr(image, 'filename', 'clipboard'), 'size': image.size, 'mode': image.mode}
+    info['exif'] = image.info.get('exif')
+    info['icc_profile'] = image.info.get('icc_profile')
+    info['dpi'] = image.info.get('dpi')
+    # The mode alone determines the sample type; no need to copy the pixels into an array to ask.
+    info['bit_depth'] = bit_depth_for_mode(image.mode)
+    info['float'] = image.mode == 'F'
+    info['display_text'] = _display_text(info)
+    return info
+
+@lru_cache(maxsize=4096)
+def _probe_file(path, mtime_ns, file_size):
+    # EXR headers are not exposed by imageio, so probing one decodes it.
+    if Path(path).suffix.lower() in EXR_EXTENSIONS: return load_exr(path).info
+    if Path(path).suffix.lower() in HEIF_EXTENSIONS: heif_support()
+    # Image.open only parses the header; pixels are decoded on load(), which is never called here.
+    try:
+        with Image.open(path) as image: info = analyze_image_properties(image)
+    except UnidentifiedImageError:
+        # Pillow has no decoder for float RGB TIFFs; tifffile maps (or decodes) them.
+        mapped = MappedImage.open(path) if Path(path).suffix.lower() in (".tif", ".tiff") else None
+        if mapped is None: raise
+        return mapped.info
+    info['filepath'] = path
+    if Path(path).suffix.lower() in (".tif", ".tiff"):
+        # PIL reports some 16-bit TIFF layouts (e.g. RGB) as 8-bit modes; the tags know better.
+        try:
+            with get_tifffile().TiffFile(path) as tif:
+                page = tif.pages[0]
+                if page.bitspersample in (8, 16, 32): info['bit_depth'] = page.bitspersample
+                info['float'] = int(page.sampleformat) == 3
+                tag = page.tags.get('InterColorProfile')
+                if tag is not None and not info['icc_profile']: info['icc_profile'] = bytes(tag.value)
+        except Exception: pass
+        info['display_text'] = _display_text(info)
+    return info
+
+def probe_image(path):
+    """Header-only image info (size, mode, bit depth, ICC, DPI) in the same shape as
+    analyze_image_properties, cached per path and modification time."""
+    path = os.fspath(path)
+    st = os.stat(path)
+    return dict(_probe_file(path, st.st_mtime_ns, st.st_size))
+
+class MappedImage:
+    """Pixels of an uncompressed TIFF mapped straight from the file. Stands in for a PIL image
+    wherever the converter only needs arrays: rgb is an (H, W, 3) view, alpha an (H, W) view
+    or None, and nothing is read until conversion touches the pages. Float sources PIL can't
+    hold (compressed float TIFF pages, EXR) are carried the same way, already decoded."""
+
+    def __init__(self, path, rgb, alpha, info):
+        self.filename, self.rgb, self.alpha, self.info = path, rgb, alpha, info
+        self.size = (rgb.shape[1], rgb.shape[0])
+        self.mode = info['mode']
+
+    @classmethod
+    def open(cls, path, page=0):
+        """MappedImage for a page of path, or None when its layout has to be decoded by PIL
+        (compressed, tiled, big-endian, palette, CMYK...). Float pages are decoded by tifffile
+        when they can't be mapped."""
+        try: tifffile = get_tifffile()
+        except ImportError: return None
+        try:
+            with tifffile.TiffFile(path) as tif:
+                index, page = page, tif.pages[page]
+                is_float = page.dtype.kind == 'f'
+                if page.dtype not in SAMPLE_DTYPES or page.shaped[1] != 1 or not (page.is_memmappable or is_float): return None
+                photometric, channels = int(page.photometric), page.shaped[0] * page.shaped[4]
+                if not (photometric == 2 and channels in (3, 4) or photometric == 1 and channels in (1, 2)): return None
+                separate = page.planarconfig == 2 and channels > 1
+                tag = page.tags.get('InterColorProfile')
+                icc_profile = bytes(tag.value) if tag is not None else None
+                dpi = None
+                x_res, unit = page.tags.get('XResolution'), page.tags.get('ResolutionUnit')
+                if x_res is not None and x_res.value[1] and (unit is None or int(unit.value) == 2):
+                    dpi = (x_res.value[0] / x_res.value[1],) * 2
+                data = None if page.is_memmappable else page.asarray()
+            if data is None: data = tifffile.memmap(path, page=index, mode='r')
+        except (ValueError, OSError): return None
+        if not data.dtype.isnative:
+            if not is_float: return None
+            data = data.astype(data.dtype.newbyteorder('='))
+        if separate: data = np.moveaxis(data, 0, -1)
+        return cls.from_array(path, data, icc_profile, dpi)
+
+    @classmethod
+    def from_array(cls, path, data, icc_profile=None, dpi=None):
+        """MappedImage over decoded (H, W) or (H, W, channels) samples."""
+        if data.ndim == 2: data = data[:, :, None]
+        channels = data.shape[2]
+        # Gray sources are broadcast to three channels without copying.
+        rgb = data[:, :, :3] if channels >= 3 else np.broadcast_to(data[:, :, :1], data.shape[:2] + (3,))
+        alpha = data[:, :, channels - 1] if channels in (2, 4) else None
+        mode = ('RGB' if channels >= 3 else 'L') + ('A' if alpha is not None else '')
+        info = {'filepath': str(path), 'size': (rgb.shape[1], rgb.shape[0]), 'mode': mode, 'exif': None, 'icc_profile': icc_profile,
+                'dpi': dpi, 'bit_depth': data.dtype.itemsize * 8, 'float': data.dtype.kind == 'f'}
+        info['display_text'] = _display_text(info)
+        return cls(str(path), rgb, alpha, info)
+
+    def to_pil(self, max_size=None, factor=None):
+        """8-bit PIL copy for display, box-reduced band by band by factor, or when max_size is far smaller.
+        Float samples are taken as linear light and shown sRGB-encoded, clipped at reference white."""
+        if factor is None: factor = max(1, int(min(self.size[0] / max_size[0], self.size[1] / max_size[1]) // 3)) if max_size else 1
+        is_float = self.rgb.dtype.kind == 'f'
+        scale = 255.0 if is_float else 255.0 / (65535.0 if self.rgb.dtype == np.uint16 else 255.0)
+        def to8(plane, linear=False):
+            if factor == 1 and plane.dtype == np.uint8: return np.ascontiguousarray(plane)
+            plane = _box_reduce(plane, factor)
+            if is_float: plane = np.clip(np.nan_to_num(plane, copy=False), 0, 1, out=plane)
+            if linear: plane = to_srgb(plane)
+            return np.round(plane * scale).astype(np.uint8)
+        image = Image.fromarray(to8(self.rgb[:, :, 0] if self.mode.startswith('L') else self.rgb, is_float))
+        if self.alpha is None: return image
+        if image.mode == 'L': return Image.merge('LA', (image, Image.fromarray(to8(self.alpha))))
+        image.putalpha(Image.fromarray(to8(self.alpha)))
+        return image
+
+def load_exr(path):
+    """OpenEXR through imageio, which needs an EXR-capable plugin (e.g. freeimage or OpenImageIO);
+    the decoded float samples are wrapped in a MappedImage."""
+    try: import imageio.v3 as iio
+    except ImportError: raise ImportError("The 'imageio' library is required for EXR files. Please run: pip install imageio")
+    return MappedImage.from_array(path, np.asarray(iio.imread(path)))
+
+def _box_reduce(plane, factor, band_rows=256):
+    """Mean of factor x factor blocks as float32, reading plane a band of rows at a time."""
+    if factor == 1: return plane.astype(np.float32)
+    h, w = plane.shape[0] // factor, plane.shape[1] // factor
+    out = np.empty((h, w) + plane.shape[2:], dtype=np.float32)
+    step = max(1, band_rows // factor) * factor
+    for y in range(0, h * factor, step):
+        block = plane[y:min(y + step, h * factor), :w * factor].astype(np.float32)
+        out[y // factor:(y + block.shape[0]) // factor] = block.reshape((block.shape[0] // factor, factor, w, factor) + plane.shape[2:]).mean(axis=(1, 3))
+    return out
+
+def load_image(source):
+    pil_image = None
+    if isinstance(source, MappedImage): return source, source.info
+    if isinstance(source, (str, os.PathLike)):
+        if Path(source).suffix.lower() in (".tif", ".tiff"):
+            # Uncompressed TIFFs are converted straight from the page cache; anything else is decoded by PIL.
+            mapped = MappedImage.open(source)
+            if mapped: return mapped, mapped.info
+        if Path(source).suffix.lower() in EXR_EXTENSIONS:
+            image = load_exr(source)
+            return image, image.info
+        if Path(source).suffix.lower() in HEIF_EXTENSIONS: heif_support()
+        pil_image = Image.open(source)
+    elif isinstance(source, Image.Image): pil_image = source
+    else: raise TypeError(f"Cannot load image from {type(source).__name__}")
+    pil_image.load()
+    info = analyze_image_properties(pil_image)
+    return pil_image, info
+
+def _tiff_kwargs(settings, has_alpha, icc_profile, dpi):
+    # tifffile arguments for gray output, with alpha as an unassociated extra sample.
+    return dict(photometric="minisblack", extrasamples=["unassalpha"] if has_alpha else None, compression=tifffile_compression(settings.get("tiff_compression")),
+                iccprofile=icc_profile, metadata=None, resolution=(dpi, dpi) if dpi else None, resolutionunit="INCH" if dpi else None)
+
+def save_image(gray_array, alpha, filepath, settings, original_info):
+    """Encodes converted output. alpha is an (H, W) array or None; 16-bit and float gray+alpha are
+    written as two-channel PNG/TIFF straight from the arrays, without widening to RGBA."""
+    file_ext = Path(filepath).suffix.lower()
+    bit_depth = settings["bit_depth"]
+    is_high_bit_depth = bit_depth > 8
+    if not settings["preserve_alpha"] or file_ext in (".jpg", ".jpeg", ".bmp"): alpha = None
+    # Output converted at full size still needs resizing; sources resampled before conversion already match.
+    size = settings.get("size")
+    if size and tuple(size) != (gray_array.shape[1], gray_array.shape[0]):
+        with profiling.stage("resize"): gray_array, alpha = resize_output(gray_array, alpha, size)
+    if alpha is not None: alpha = alpha_samples(alpha, bit_depth)
+    if bit_depth == FLOAT_BIT_DEPTH:
+        if file_ext not in (".tiff", ".tif"): raise ValueError(f"32-bit float output is only available for TIFF, not {file_ext}")
+        save_float_tiff(gray_array, alpha, filepath, settings, original_info)
+        return
+    with profiling.stage("icc"): icc_profile = icc.output_profile(settings, original_info)
+    dpi = None if settings.get("strip_metadata", False) else settings.get("dpi")
+    if file_ext in (".tiff", ".tif") and is_high_bit_depth and alpha is not None:
+        with profiling.stage("encode", format=file_ext): get_tifffile().imwrite(filepath, np.stack([gray_array, alpha], axis=-1), **_tiff_kwargs(settings, True, icc_profile, dpi))
+        return
+    if file_ext == ".png" and is_high_bit_depth and alpha is not None:
+        import streaming
+        h, w = gray_array.shape
+        rows = streaming.DEFAULT_BAND_ROWS
+        # Written in bands so the big-endian, filtered copy of the samples is never made for the whole image.
+        bands = ((gray_array[y:y + rows], alpha[y:y + rows]) for y in range(0, h, rows))
+        with profiling.stage("encode", format=file_ext):
+            streaming.write_png_bands(filepath, bands, w, h, 16, True, icc_profile, dpi, settings.get("png_compress_level", DEFAULT_PNG_COMPRESS_LEVEL), settings.get("png_strategy", "default"))
+        return
+    if alpha is None: final_image = Image.fromarray(gray_array, mode="I;16" if is_high_bit_depth else "L")
+    else: final_image = Image.fromarray(np.stack([gray_array, alpha], axis=-1), mode="LA")
+    save_kwargs = {}
+    if icc_profile: save_kwargs['icc_profile'] = icc_profile
+    if dpi: save_kwargs['dpi'] = (dpi, dpi)
+    file_format = FORMAT_MAP.get(file_ext, "PNG")
+    if file_ext in [".jpg", ".jpeg"]:
+        final_image = final_image.convert("L")
+        save_kwargs.update({"quality": settings.get("quality", 95), "subsampling": settings.get("subsampling", 0)})
+    elif file_ext in HEIF_EXTENSIONS:
+        if not heif_support(): raise ImportError("HEIF/HEIC output requires pillow-heif. Please run: pip install pillow-heif")
+        save_kwargs.update({"quality": settings.get("quality", 95), "chroma": settings.get("subsampling", 0)})
+    elif file_ext == ".webp":
+        if "quality" in settings: save_kwargs["quality"] = settings["quality"]
+        save_kwargs["method"] = settings.get("webp_method", DEFAULT_WEBP_METHOD)
+    elif file_ext == ".png":
+        save_kwargs.update({"compress_level": settings.get("png_compress_level", DEFAULT_PNG_COMPRESS_LEVEL), "compress_type": PNG_STRATEGIES[settings.get("png_strategy", "default")]})
+    elif file_ext in (".tiff", ".tif") and settings.get("tiff_compression", "none") != "none":
+        save_kwargs["compression"] = _PIL_TIFF_COMPRESSION[settings["tiff_compression"]]
+    with profiling.stage("encode", format=file_ext): final_image.save(filepath, format=file_format, **save_kwargs)
+
+def save_float_tiff(gray_array, alpha, filepath, settings, original_info):
+    """Linear float32 gray TIFF; alpha, when given, is stored as float from 0 to 1."""
+    samples = gray_array.astype(np.float32, copy=False)
+    if alpha is not None: samples = np.stack([samples, alpha_samples(alpha, FLOAT_BIT_DEPTH)], axis=-1)
+    with profiling.stage("icc"): icc_profile = icc.output_profile(settings, original_info)
+    dpi = None if settings.get("strip_metadata", False) else settings.get("dpi")
+    with profiling.stage("encode", format=Path(filepath).suffix.lower()): get_tifffile().imwrite(filepath, samples, **_tiff_kwargs(settings, alpha is not None, icc_profile, dpi))
+
+def output_path_for(in_path, output_folder, settings, suffix="_grayscale"):
+    return os.path.join(output_folder, Path(in_path).stem + suffix + settings['format'])
+
+def default_bit_depth(info, file_format):
+    if info.get('float') and file_format == ".tiff": return FLOAT_BIT_DEPTH
+    return 16 if info.get('bit_depth', 8) > 8 and file_format in (".png", ".tiff") else 8
+
+def with_bit_depth(settings, info):
+    return settings if 'bit_depth' in settings else dict(settings, bit_depth=default_bit_depth(info, settings['format']))
+
+def headless_settings(settings, workers=1):
+    """Export settings of a job with no dialog behind it (command line, conversion service): the
+    dialog's defaults filled in, the bit depth clamped to what the format can hold, and threads
+    capped so that `workers` conversions running at once share the cores."""
+    settings = dict(settings)
+    settings.setdefault("format", ".png")
+    settings.setdefault("preserve_alpha", True)
+    settings.setdefault("strip_metadata", False)
+    settings.setdefault("icc_profile_path", None)
+    settings.setdefault("conversion_mode", "Rec. 709")
+    if not settings["format"].startswith("."): settings["format"] = "." + settings["format"]
+    if settings["format"] not in (".png", ".tiff") and settings.get("bit_depth", 8) > 8: settings["bit_depth"] = 8
+    if settings["format"] == ".png" and settings.get("bit_depth", 8) > 16: settings["bit_depth"] = 16
+    if settings.get("size") is not None: settings["size"] = tuple(settings["size"])
+    settings["threads"] = min(settings.get("threads") or default_conversion_threads(workers), default_conversion_threads(workers))
+    return settings
+
+def process_file(in_path, out_path, settings):
+    if settings.get('all_frames'):
+        import frames
+        if frames.convert_file(in_path, out_path, settings): return out_path
+    if settings.get('streaming'):
+        import streaming
+        with profiling.stage("stream"):
+            if streaming.stream_convert_file(in_path, out_path, settings): return out_path
+    with profiling.stage("load"): img_obj, info = load_image(in_path)
+    settings = with_bit_depth(settings, info)
+    with profiling.stage("convert", mode=settings['conversion_mode']):
+        gray_array, alpha = convert_with_settings(img_obj, settings)
+    with profiling.stage("save"): save_image(gray_array, alpha, out_path, settings, info)
+    return out_path
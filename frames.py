@@ -0,0 +1,170 @@
+import itertools
+import os
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+import engine
+import icc
+import profiling
+
+_psd_tools = None
+
+# Outputs that can hold every frame: multi-page TIFF and animated WebP.
+MULTI_FRAME_FORMATS = (".tif", ".tiff", ".webp")
+PSD_EXTENSIONS = (".psd", ".psb")
+TIFF_EXTENSIONS = (".tif", ".tiff")
+# Display time of frames whose source has none (TIFF pages, PSD layers), in milliseconds.
+DEFAULT_FRAME_DURATION = 100
+
+def get_psd_tools():
+    global _psd_tools
+    if _psd_tools is None:
+        try: import psd_tools
+        except ImportError: raise ImportError("The 'psd-tools' library is required for PSD layers. Please run: pip install psd-tools")
+        _psd_tools = psd_tools
+    return _psd_tools
+
+def _psd_layers(psd):
+    return [layer for layer in psd.descendants() if not layer.is_group() and layer.is_visible() and layer.has_pixels()]
+
+def _tiff_pages(path):
+    # Reduced-resolution pages (thumbnails, pyramid levels) are previews of another page, not frames.
+    with engine.get_tifffile().TiffFile(path) as tif: return [i for i, page in enumerate(tif.pages) if not page.is_reduced]
+
+def frame_count(path):
+    """Number of pages, animation frames or visible PSD layers in path, read from headers."""
+    ext = Path(path).suffix.lower()
+    if ext in PSD_EXTENSIONS: return len(_psd_layers(get_psd_tools().PSDImage.open(path)))
+    if ext in TIFF_EXTENSIONS:
+        try: return len(_tiff_pages(path))
+        except ImportError: pass
+    if ext in engine.HEIF_EXTENSIONS: engine.heif_support()
+    with Image.open(path) as image: return getattr(image, 'n_frames', 1)
+
+def iter_frames(path):
+    """Yields (image, duration_ms) for each page, frame or visible PSD layer of path, decoding
+    one at a time. An image is only valid until the next one is requested. Uncompressed TIFF
+    pages are memory-mapped; PSD layers are placed on a transparent canvas of the document size."""
+    ext = Path(path).suffix.lower()
+    if ext in PSD_EXTENSIONS:
+        psd = get_psd_tools().PSDImage.open(path)
+        # Pillow reads the document's embedded profile from the header alone.
+        with Image.open(path) as composite: icc_profile = composite.info.get('icc_profile')
+        for layer in _psd_layers(psd):
+            canvas = Image.new("RGBA", psd.size, (0, 0, 0, 0))
+            pixels = layer.topil()
+            if pixels is not None: canvas.paste(pixels.convert("RGBA"), layer.offset)
+            if icc_profile: canvas.info['icc_profile'] = icc_profile
+            yield canvas, DEFAULT_FRAME_DURATION
+        return
+    if ext in TIFF_EXTENSIONS:
+        try: pages = _tiff_pages(path)
+        except ImportError: pages = None
+        if pages is not None:
+            # Pillow is only needed for pages that can't be mapped (and can't read float RGB pages at all).
+            image = None
+            try:
+                for page in pages:
+                    mapped = engine.MappedImage.open(path, page)
+                    if mapped is None:
+                        image = image or Image.open(path)
+                        image.seek(page)
+                        image.load()
+                    yield mapped or image, DEFAULT_FRAME_DURATION
+            finally:
+                if image is not None: image.close()
+            return
+    if ext in engine.HEIF_EXTENSIONS: engine.heif_support()
+    with Image.open(path) as image:
+        for index in range(getattr(image, 'n_frames', 1)):
+            image.seek(index)
+            image.load()
+            yield image, image.info.get('duration') or DEFAULT_FRAME_DURATION
+
+def _convert_frames(first, sources, settings, cancel_token=None):
+    """Converts frames as the writer asks for them, yielding (gray, alpha or None, duration).
+    Alpha has the output's sample type."""
+    size = settings.get('size')
+    for index, (image, duration) in enumerate(itertools.chain([first], sources)):
+        if cancel_token: cancel_token.check()
+        with profiling.stage("convert", mode=settings['conversion_mode'], frame=index):
+            gray, alpha = engine.convert_with_settings(image, settings, cancel_token)
+            alpha = alpha if settings.get('preserve_alpha') else None
+            if size and tuple(size) != (gray.shape[1], gray.shape[0]):
+                with profiling.stage("resize"): gray, alpha = engine.resize_output(gray, alpha, size)
+        yield gray, alpha, duration
+
+def write_tiff_frames(filepath, frames, count, settings, icc_profile=None, dpi=None):
+    """Appends one page per frame; only the frame being written is held in memory."""
+    tifffile = engine.get_tifffile()
+    compression = engine.tifffile_compression(settings.get("tiff_compression"))
+    gray, alpha, _ = first = next(frames)
+    page_bytes = gray.nbytes * (1 if alpha is None else 2)
+    with tifffile.TiffWriter(filepath, bigtiff=page_bytes * count > 2**32 - 2**25) as tif:
+        for index, (gray, alpha, _) in enumerate(itertools.chain([first], frames)):
+            with profiling.stage("encode", format=".tiff", frame=index):
+                tif.write(gray if alpha is None else np.stack([gray, alpha], axis=-1), photometric="minisblack", compression=compression, metadata=None,
+                          extrasamples=["unassalpha"] if alpha is not None else None, iccprofile=icc_profile if index == 0 else None,
+                          resolution=(dpi, dpi) if dpi else None, resolutionunit="INCH" if dpi else None)
+
+def _frame_image(gray, alpha):
+    return Image.fromarray(gray) if alpha is None else Image.fromarray(np.stack([gray, alpha], axis=-1), mode="LA")
+
+class _FrameFeed:
+    """Stands in for a multi-frame image in Pillow's animated WebP writer, which steps through
+    append_images with seek(): each frame is converted only when the writer asks for it. The
+    frame's duration is appended to durations (the list passed as duration=) before the
+    writer reads it."""
+
+    def __init__(self, frames, n_frames, durations):
+        self.frames, self.n_frames, self.durations, self.frame = frames, n_frames, durations, None
+
+    def seek(self, index):
+        gray, alpha, duration = next(self.frames)
+        self.frame = _frame_image(gray, alpha)
+        self.durations.append(duration)
+
+    def __getattr__(self, name):
+        return getattr(self.frame, name)
+
+def write_webp_frames(filepath, frames, count, settings, icc_profile=None):
+    gray, alpha, duration = next(frames)
+    durations = [duration]
+    save_kwargs = {"save_all": True, "duration": durations, "loop": 0, "method": settings.get("webp_method", engine.DEFAULT_WEBP_METHOD)}
+    if "quality" in settings: save_kwargs["quality"] = settings["quality"]
+    if icc_profile: save_kwargs["icc_profile"] = icc_profile
+    if count > 1: save_kwargs["append_images"] = [_FrameFeed(frames, count - 1, durations)]
+    # Pillow converts (and so pulls) the remaining frames while it encodes.
+    with profiling.stage("encode", format=".webp"): _frame_image(gray, alpha).save(filepath, format="WEBP", **save_kwargs)
+
+def convert_frames(in_path, out_path, settings, cancel_token=None):
+    """Converts every frame of in_path into a multi-page TIFF or animated WebP, streaming one
+    frame at a time from decoder to encoder."""
+    file_ext = Path(out_path).suffix.lower()
+    count = frame_count(in_path)
+    sources = iter_frames(in_path)
+    try:
+        with profiling.stage("load", frame=0): first, duration = next(sources)
+        info = first.info if isinstance(first, engine.MappedImage) else dict(engine.analyze_image_properties(first), filepath=str(in_path))
+        settings = engine.with_bit_depth(settings, info)
+        # An animation has one canvas size and 8-bit samples; TIFF pages may differ.
+        if file_ext == ".webp": settings = dict(settings, bit_depth=8, size=settings.get('size') or first.size)
+        icc_profile = icc.output_profile(settings, info)
+        dpi = None if settings.get("strip_metadata", False) else settings.get("dpi")
+        frames = _convert_frames((first, duration), sources, settings, cancel_token)
+        if file_ext == ".webp": write_webp_frames(out_path, frames, count, settings, icc_profile)
+        else: write_tiff_frames(out_path, frames, count, settings, icc_profile, dpi)
+    except BaseException:
+        if os.path.exists(out_path): os.remove(out_path)
+        raise
+    finally:
+        sources.close()
+    return out_path
+
+def convert_file(in_path, out_path, settings, cancel_token=None):
+    """Converts all frames when settings ask for them and both ends can hold several.
+    Returns None for single-frame inputs and other formats, which take the regular path."""
+    if not settings.get('all_frames') or Path(out_path).suffix.lower() not in MULTI_FRAME_FORMATS: return None
+    if frame_count(in_path) < 2: return None
+    return convert_frames(in_path, out_path, settings, cancel_token)
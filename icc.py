@@ -0,0 +1,137 @@
+import os
+import struct
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+ICC_EXTENSIONS = (".icc", ".icm")
+# Extra folders to scan, separated like PATH; scanned before the system folders.
+ICC_DIRS_ENV = "GRAYSCALE_ICC_DIRS"
+BUILTIN_PREFIX = "builtin:"
+D50 = (0.9642, 1.0, 0.8249)
+
+def system_profile_dirs():
+    home = Path.home()
+    if sys.platform == "win32":
+        return [Path(os.environ.get("SystemRoot", "C:/Windows")) / "System32" / "spool" / "drivers" / "color"]
+    if sys.platform == "darwin":
+        return [home / "Library/ColorSync/Profiles", Path("/Library/ColorSync/Profiles"), Path("/System/Library/ColorSync/Profiles")]
+    data_home = Path(os.environ.get("XDG_DATA_HOME") or home / ".local/share")
+    data_dirs = [Path(d) for d in os.environ.get("XDG_DATA_DIRS", "/usr/local/share:/usr/share").split(":") if d]
+    return [data_home / "icc", home / ".color/icc"] + [d / "color/icc" for d in data_dirs]
+
+def _s15f16(value):
+    return struct.pack(">i", round(value * 65536))
+
+def _gray_profile(description, trc):
+    """Minimal ICC v2 grayscale display profile: a tone curve (gamma, or a table) and the
+    D50 white point, which is all a gray output profile needs."""
+    desc = description.encode("ascii") + b"\x00"
+    tags = [(b"desc", b"desc\x00\x00\x00\x00" + struct.pack(">I", len(desc)) + desc + b"\x00" * 8 + b"\x00" * 3 + b"\x00" * 67),
+            (b"cprt", b"text\x00\x00\x00\x00" + b"No copyright, use freely.\x00"),
+            (b"wtpt", b"XYZ \x00\x00\x00\x00" + b"".join(_s15f16(v) for v in D50)),
+            (b"kTRC", b"curv\x00\x00\x00\x00" + struct.pack(">I", len(trc)) + struct.pack(f">{len(trc)}H", *trc))]
+    offset = 128 + 4 + 12 * len(tags)
+    table, data = [], b""
+    for signature, body in tags:
+        body += b"\x00" * (-len(body) % 4)
+        table.append(struct.pack(">4sII", signature, offset + len(data), len(body)))
+        data += body
+    size = offset + len(data)
+    header = (struct.pack(">I4sI4s4s4s", size, b"\x00" * 4, 0x02100000, b"mntr", b"GRAY", b"XYZ ") + struct.pack(">6H", 2024, 1, 1, 0, 0, 0) +
+              b"acsp" + b"\x00" * 24 + struct.pack(">I", 0) + b"".join(_s15f16(v) for v in D50) + b"\x00" * 48)
+    return header + struct.pack(">I", len(tags)) + b"".join(table) + data
+
+def _srgb_trc(entries=1024):
+    curve = []
+    for i in range(entries):
+        v = i / (entries - 1)
+        curve.append(round((v / 12.92 if v <= 0.04045 else ((v + 0.055) / 1.055) ** 2.4) * 65535))
+    return curve
+
+# Built-in gray output profiles. A single curv entry is a gamma in u8Fixed8 (2.2 -> 0x0233).
+BUILTIN_PROFILES = {"Gray Gamma 2.2": lambda: _gray_profile("Gray Gamma 2.2", [0x0233]),
+                    "Gray Gamma 1.8": lambda: _gray_profile("Gray Gamma 1.8", [0x01CD]),
+                    "Gray sRGB TRC": lambda: _gray_profile("Gray sRGB TRC", _srgb_trc()),
+                    "Gray Linear": lambda: _gray_profile("Gray Linear", [0x0100])}
+DEFAULT_GRAY_PROFILE = BUILTIN_PREFIX + "Gray Gamma 2.2"
+
+@lru_cache(maxsize=64)
+def _read_profile(path, mtime_ns, size):
+    with open(path, 'rb') as f: data = f.read()
+    if len(data) < 132 or data[36:40] != b"acsp": raise ValueError(f"Not an ICC profile: {path}")
+    return data
+
+def load_profile(ref):
+    """Bytes of a profile path or builtin: reference. File contents are cached until the
+    file changes, so a batch reads each profile from disk once."""
+    if ref.startswith(BUILTIN_PREFIX):
+        name = ref[len(BUILTIN_PREFIX):]
+        if name not in BUILTIN_PROFILES: raise ValueError(f"Unknown built-in ICC profile: {name}")
+        return _builtin_profile(name)
+    st = os.stat(ref)
+    return _read_profile(os.path.abspath(ref), st.st_mtime_ns, st.st_size)
+
+@lru_cache(maxsize=None)
+def _builtin_profile(name):
+    return BUILTIN_PROFILES[name]()
+
+class ProfileRegistry:
+    """Profiles available for embedding: the built-in gray profiles plus every .icc/.icm file
+    in the configured folders (extra_dirs, then $GRAYSCALE_ICC_DIRS, then the platform's
+    colour folders, e.g. /usr/share/color/icc). Folders are scanned once, on first use; the
+    first file with a given name wins. Maps display names to references for load_profile."""
+
+    def __init__(self, extra_dirs=()):
+        self.extra_dirs = [Path(d) for d in extra_dirs]
+        self.lock = threading.Lock()
+        self._profiles = None
+
+    def dirs(self):
+        env_dirs = [Path(d) for d in os.environ.get(ICC_DIRS_ENV, "").split(os.pathsep) if d]
+        return self.extra_dirs + env_dirs + system_profile_dirs()
+
+    def add_dirs(self, dirs):
+        with self.lock:
+            self.extra_dirs = [Path(d) for d in dirs] + self.extra_dirs
+            self._profiles = None
+
+    def profiles(self):
+        with self.lock:
+            if self._profiles is None:
+                found = {name: BUILTIN_PREFIX + name for name in BUILTIN_PROFILES}
+                for folder in self.dirs():
+                    try: entries = sorted(folder.rglob("*"))
+                    except OSError: continue
+                    for path in entries:
+                        if path.suffix.lower() in ICC_EXTENSIONS and path.is_file(): found.setdefault(path.stem, str(path))
+                self._profiles = found
+            return dict(self._profiles)
+
+    def rescan(self):
+        with self.lock: self._profiles = None
+        return self.profiles()
+
+    def resolve(self, name_or_path):
+        """Reference for a profile given by display name, builtin: reference or file path."""
+        if name_or_path.startswith(BUILTIN_PREFIX) or os.path.isfile(name_or_path): return name_or_path
+        ref = self.profiles().get(name_or_path)
+        if ref is None: raise ValueError(f"No ICC profile named {name_or_path!r}; available: {', '.join(sorted(self.profiles()))}")
+        return ref
+
+REGISTRY = ProfileRegistry()
+
+def output_profile(settings, source_info):
+    """The profile an export embeds: none with strip_metadata, else the batch's resolved
+    profile (see with_resolved_profile), the chosen profile, or the source's own."""
+    if settings.get("strip_metadata", False): return None
+    if "icc_profile" in settings: return settings["icc_profile"]
+    if settings.get("icc_profile_path"): return load_profile(settings["icc_profile_path"])
+    return source_info.get("icc_profile")
+
+def with_resolved_profile(settings):
+    """Loads the chosen profile once for a whole batch; jobs then carry its bytes instead of
+    each reading the file. Raises before any job starts if the profile is missing or bad."""
+    if settings.get("strip_metadata", False) or not settings.get("icc_profile_path"): return settings
+    return dict(settings, icc_profile=load_profile(settings["icc_profile_path"]))
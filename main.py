@@ -1,34 +1,42 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox, Toplevel, _tkinter
 from PIL import Image, ImageTk, ImageGrab, PngImagePlugin, ExifTags, TiffImagePlugin
-import numpy as np
 import os
 import threading
+import time
 import queue
 from pathlib import Path
 from tkinterdnd2 import DND_FILES, TkinterDnD
 import json
 import traceback
-import io
+import importlib.util
+import multiprocessing
+import engine
+import frames
+import icc
+import batch
+import manifest
+import streaming
+import cache
+import display
+import profiling
+import tasks
+import watch
 
-try:
-    import tifffile
-except ImportError:
+if importlib.util.find_spec("tifffile") is None:
     messagebox.showerror("Dependency Missing", "The 'tifffile' library is required. Please run: pip install tifffile")
     exit()
 
-try:
-    import cv2
-except ImportError:
-    messagebox.showerror("Dependency Missing", "The 'opencv-python' library is required. Please run: pip install opencv-python-headless")
-    exit()
+HEIF_SUPPORT = engine.heif_support()
 
-try:
-    import pillow_heif
-    pillow_heif.register_heif_opener()
-    HEIF_SUPPORT = True
-except ImportError:
-    HEIF_SUPPORT = False
+WORKER_THREADS = 2
+EXPORT_TASKS = ('export', 'stream_export')
+# Results handled per UI tick; anything beyond that waits for the next tick so the window stays responsive.
+MAX_RESULTS_PER_TICK = 500
+# <Configure> fires continuously while a window is dragged; the canvases repaint once it settles.
+RESIZE_DEBOUNCE_MS = 120
+RESAMPLE_LABELS = {"before": "Before conversion", "linear": "Before conversion (linear light)", "after": "After conversion"}
+BIT_DEPTH_LABELS = {8: "8-bit", 16: "16-bit", engine.FLOAT_BIT_DEPTH: "32-bit float"}
 
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("green")
@@ -58,12 +66,134 @@ class Tooltip:
         if self.tooltip_window: self.tooltip_window.destroy()
         self.tooltip_window = None
 
+class VirtualBatchList(ctk.CTkFrame):
+    """Batch file list that only creates widgets for the rows that fit on screen. Items live in a
+    dict keyed by path, so adding, looking up and updating an item is O(1); changes are applied
+    to the visible rows by refresh(), once per UI tick. on_row_shown(path) is called the first
+    time an item becomes visible."""
+    ROW_HEIGHT = 32
+
+    def __init__(self, master, on_row_shown=None, **kwargs):
+        super().__init__(master, **kwargs)
+        self.on_row_shown = on_row_shown
+        self.items = {}
+        self.order = []
+        self.first = 0
+        self.rows = []
+        self.dirty = False
+        self.default_color = ctk.ThemeManager.theme["CTkLabel"]["text_color"]
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        ctk.CTkLabel(self, text="Drag & Drop Files Here").grid(row=0, column=0, columnspan=2, sticky="ew")
+        self.body = ctk.CTkFrame(self, fg_color="transparent")
+        self.body.grid(row=1, column=0, sticky="nsew")
+        self.body.grid_columnconfigure(0, weight=1)
+        # The list's height comes from the window, never from the rows inside it.
+        self.body.grid_propagate(False)
+        self.scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, sticky="ns")
+        self.body.bind("<Configure>", self._on_resize)
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self._scroll_to(self.first - (1 if e.delta > 0 else -1) * 3))
+        widget.bind("<Button-4>", lambda e: self._scroll_to(self.first - 3))
+        widget.bind("<Button-5>", lambda e: self._scroll_to(self.first + 3))
+
+    def _make_row(self):
+        frame = ctk.CTkFrame(self.body, fg_color=("gray85", "gray28"), height=self.ROW_HEIGHT - 4)
+        name_label = ctk.CTkLabel(frame, text="", anchor="w")
+        name_label.pack(side="left", expand=True, fill="x", padx=5)
+        status_label = ctk.CTkLabel(frame, text="", width=120, anchor="e")
+        status_label.pack(side="right", padx=5)
+        details_label = ctk.CTkLabel(frame, text="", text_color="gray60", anchor="e")
+        details_label.pack(side="right", padx=5)
+        for widget in (frame, name_label, status_label, details_label): self._bind_wheel(widget)
+        return {"frame": frame, "name": name_label, "status": status_label, "details": details_label, "shown": None}
+
+    def _on_resize(self, event):
+        visible = max(1, event.height // self.ROW_HEIGHT)
+        while len(self.rows) < visible: self.rows.append(self._make_row())
+        while len(self.rows) > visible: self.rows.pop()["frame"].destroy()
+        self._scroll_to(self.first)
+
+    def _on_scrollbar(self, *args):
+        if args[0] == "moveto": self._scroll_to(int(float(args[1]) * len(self.order)))
+        elif args[0] == "scroll": self._scroll_to(self.first + int(args[1]) * (len(self.rows) if args[2] == "pages" else 1))
+
+    def _scroll_to(self, first):
+        self.first = max(0, min(first, len(self.order) - len(self.rows)))
+        self.render()
+
+    def render(self):
+        self.dirty = False
+        for i, row in enumerate(self.rows):
+            index = self.first + i
+            if index >= len(self.order):
+                if row["shown"] is not None: row["frame"].grid_remove()
+                row["shown"] = None
+                continue
+            path = self.order[index]
+            item = self.items[path]
+            state = (path, item["status"], item["color"], item["details"])
+            if row["shown"] == state: continue
+            if row["shown"] is None: row["frame"].grid(row=i, column=0, sticky="ew", pady=2, padx=2)
+            row["name"].configure(text=item["name"])
+            row["status"].configure(text=item["status"], text_color=item["color"])
+            row["details"].configure(text=item["details"])
+            row["shown"] = state
+            if not item["seen"]:
+                item["seen"] = True
+                if self.on_row_shown: self.on_row_shown(path)
+        total = len(self.order)
+        self.scrollbar.set(self.first / total if total else 0.0, min(1.0, (self.first + len(self.rows)) / total) if total else 1.0)
+
+    def refresh(self):
+        if self.dirty: self.render()
+
+    def add(self, paths, status="⏳ Pending", color=None):
+        added = []
+        for path in paths:
+            if path in self.items: continue
+            self.items[path] = {"name": os.path.basename(path), "status": status, "color": color or self.default_color, "details": "", "seen": False}
+            self.order.append(path)
+            added.append(path)
+        if added: self.dirty = True
+        return added
+
+    def set_status(self, path, text, color=None):
+        item = self.items.get(path)
+        if item:
+            item["status"], item["color"] = text, color or self.default_color
+            self.dirty = True
+
+    def set_details(self, path, text):
+        item = self.items.get(path)
+        if item:
+            item["details"] = text
+            self.dirty = True
+
+    def clear(self):
+        self.items.clear()
+        self.order.clear()
+        self.first = 0
+        self.render()
+
+    def paths(self):
+        return list(self.order)
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, path):
+        return path in self.items
+
 class AdvancedExportDialog(ctk.CTkToplevel):
     def __init__(self, master, original_info):
         super().__init__(master)
         self.transient(master)
         self.title("Advanced Export")
-        self.geometry("550x720")
+        self.geometry("550x1030")
         self.resizable(False, False)
         self.result = None
         self.original_info = original_info
@@ -76,15 +206,8 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         self.master.wait_window(self)
 
     def scan_for_icc_profiles(self):
-        profile_paths = {}
-        system_folder = Path(os.environ.get("SystemRoot", "C:/Windows")) / "System32" / "spool" / "drivers" / "color"
-        if system_folder.is_dir():
-            for ext in ("*.icc", "*.icm"):
-                for profile_file in system_folder.glob(ext):
-                    profile_paths[profile_file.stem] = str(profile_file)
-        if not profile_paths:
-            profile_paths["sRGB (fallback)"] = None
-        return profile_paths
+        # The registry scans the profile folders once per session; the dialog only reads it.
+        return icc.REGISTRY.profiles()
 
     def setup_ui(self):
         self.grid_columnconfigure(0, weight=1)
@@ -93,15 +216,29 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         basic_format_frame.grid_columnconfigure(1, weight=1)
         ctk.CTkLabel(basic_format_frame, text="Format Options", font=ctk.CTkFont(weight="bold")).grid(row=0, column=0, columnspan=2, pady=(0, 10), sticky="w")
         ctk.CTkLabel(basic_format_frame, text="File Format:", anchor="w").grid(row=1, column=0, padx=10, pady=5, sticky="w")
-        file_formats = [".png", ".tiff", ".jpeg", ".webp", ".bmp"]
-        if HEIF_SUPPORT: file_formats.append(".heic")
+        file_formats = engine.output_formats()
         self.format_var = ctk.StringVar(value=".png")
         self.format_menu = ctk.CTkOptionMenu(basic_format_frame, variable=self.format_var, values=file_formats, command=self.update_ui_for_format)
         self.format_menu.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
         ctk.CTkLabel(basic_format_frame, text="Bit Depth:", anchor="w").grid(row=2, column=0, padx=10, pady=5, sticky="w")
-        self.bit_depth_var = ctk.StringVar(value=f"{self.original_info.get('bit_depth', 8)}-bit")
+        self.bit_depth_var = ctk.StringVar(value=BIT_DEPTH_LABELS[16 if self.original_info.get('bit_depth', 8) > 8 else 8])
         self.bit_depth_menu = ctk.CTkOptionMenu(basic_format_frame, variable=self.bit_depth_var, values=["8-bit", "16-bit"])
         self.bit_depth_menu.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
+        ctk.CTkLabel(basic_format_frame, text="Kernel:", anchor="w").grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        self.kernel_var = ctk.StringVar(value=engine.DEFAULT_KERNEL)
+        self.kernel_menu = ctk.CTkOptionMenu(basic_format_frame, variable=self.kernel_var, values=list(engine.KERNELS))
+        self.kernel_menu.grid(row=3, column=1, padx=10, pady=5, sticky="ew")
+        Tooltip(self.kernel_menu, "auto: fast float32 math whenever its error bound is below one output level (at most 1 level off the reference). lut / float64: bit-exact reference output.")
+        ctk.CTkLabel(basic_format_frame, text="Threads:", anchor="w").grid(row=4, column=0, padx=10, pady=5, sticky="w")
+        self.threads_var = ctk.StringVar(value=str(engine.default_conversion_threads()))
+        self.threads_menu = ctk.CTkOptionMenu(basic_format_frame, variable=self.threads_var, values=[str(n) for n in range(1, engine.default_conversion_threads() + 1)])
+        self.threads_menu.grid(row=4, column=1, padx=10, pady=5, sticky="ew")
+        Tooltip(self.threads_menu, "Threads a large image is converted on, a band of rows each. The result is the same for any number; batches share the cores among their workers.")
+        ctk.CTkLabel(basic_format_frame, text="Transfer:", anchor="w").grid(row=5, column=0, padx=10, pady=5, sticky="w")
+        self.transfer_var = ctk.StringVar(value=engine.DEFAULT_TRANSFER)
+        self.transfer_menu = ctk.CTkOptionMenu(basic_format_frame, variable=self.transfer_var, values=list(engine.TRANSFERS))
+        self.transfer_menu.grid(row=5, column=1, padx=10, pady=5, sticky="ew")
+        Tooltip(self.transfer_menu, "How source samples map to light. auto: linear for float sources (EXR, float TIFF), sRGB otherwise. pq / hlg: HDR video signals; Rec. 2100 output keeps the same signal.")
         self.specific_options_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.specific_options_frame.grid(row=1, column=0, padx=15, pady=0, sticky="new")
         self.specific_options_frame.grid_columnconfigure(0, weight=1)
@@ -111,6 +248,22 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         self.subsampling_label = ctk.CTkLabel(self.specific_options_frame, text="Chroma Subsampling:", anchor="w")
         self.subsampling_var = ctk.StringVar(value="4:4:4 (Best)")
         self.subsampling_menu = ctk.CTkOptionMenu(self.specific_options_frame, variable=self.subsampling_var, values=["4:4:4 (Best)", "4:2:2 (High)", "4:2:0 (Standard)"])
+        self.png_level_label = ctk.CTkLabel(self.specific_options_frame, text=f"Compression Level ({engine.DEFAULT_PNG_COMPRESS_LEVEL}):", anchor="w")
+        self.png_level_slider = ctk.CTkSlider(self.specific_options_frame, from_=0, to=9, number_of_steps=9, command=lambda v: self.png_level_label.configure(text=f"Compression Level ({int(v)}):"))
+        self.png_level_slider.set(engine.DEFAULT_PNG_COMPRESS_LEVEL)
+        Tooltip(self.png_level_slider, "Lower levels encode much faster and give somewhat larger files. Pixels are identical at every level.")
+        self.png_strategy_label = ctk.CTkLabel(self.specific_options_frame, text="Compression Strategy:", anchor="w")
+        self.png_strategy_var = ctk.StringVar(value="default")
+        self.png_strategy_menu = ctk.CTkOptionMenu(self.specific_options_frame, variable=self.png_strategy_var, values=list(engine.PNG_STRATEGIES))
+        Tooltip(self.png_strategy_menu, "zlib strategy. huffman and rle skip most of the match search: far faster, larger files. filtered suits smooth gradients.")
+        self.tiff_compression_label = ctk.CTkLabel(self.specific_options_frame, text="TIFF Compression:", anchor="w")
+        self.tiff_compression_var = ctk.StringVar(value="none")
+        self.tiff_compression_menu = ctk.CTkOptionMenu(self.specific_options_frame, variable=self.tiff_compression_var, values=list(engine.TIFF_COMPRESSIONS))
+        Tooltip(self.tiff_compression_menu, "none is fastest to write and read. deflate and zstd give the smallest files. 16-bit output with transparency, and streamed output, need imagecodecs for lzw and zstd.")
+        self.webp_method_label = ctk.CTkLabel(self.specific_options_frame, text=f"Encoder Effort ({engine.DEFAULT_WEBP_METHOD}):", anchor="w")
+        self.webp_method_slider = ctk.CTkSlider(self.specific_options_frame, from_=0, to=6, number_of_steps=6, command=lambda v: self.webp_method_label.configure(text=f"Encoder Effort ({int(v)}):"))
+        self.webp_method_slider.set(engine.DEFAULT_WEBP_METHOD)
+        Tooltip(self.webp_method_slider, "WebP method: 0 is fastest, 6 gives the smallest files but is very slow, especially with transparency.")
         dims_frame = ctk.CTkFrame(self)
         dims_frame.grid(row=2, column=0, padx=15, pady=10, sticky="ew")
         dims_frame.grid_columnconfigure(1, weight=1)
@@ -137,6 +290,11 @@ class AdvancedExportDialog(ctk.CTkToplevel):
             dpi_to_set = dpi_val[0] if isinstance(dpi_val, (tuple, list)) else dpi_val
             self.dpi_entry.insert(0, str(int(dpi_to_set)))
         self.dpi_entry.grid(row=2, column=1, padx=10, pady=5, sticky="ew")
+        ctk.CTkLabel(dims_frame, text="Resample:", anchor="w").grid(row=3, column=0, padx=10, pady=5, sticky="w")
+        self.resample_var = ctk.StringVar(value=RESAMPLE_LABELS[engine.DEFAULT_RESAMPLE])
+        self.resample_menu = ctk.CTkOptionMenu(dims_frame, variable=self.resample_var, values=list(RESAMPLE_LABELS.values()))
+        self.resample_menu.grid(row=3, column=1, columnspan=2, padx=10, pady=5, sticky="ew")
+        Tooltip(self.resample_menu, "When the export size differs from the source: resize before conversion (less work), before conversion in linear light (truer highlights and fine detail), or after conversion.")
         meta_frame = ctk.CTkFrame(self)
         meta_frame.grid(row=3, column=0, padx=15, pady=10, sticky="ew")
         meta_frame.grid_columnconfigure(1, weight=1)
@@ -145,12 +303,21 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         self.color_space_var = ctk.StringVar(value="sRGB Color Space Profile")
         self.color_space_menu = ctk.CTkComboBox(meta_frame, variable=self.color_space_var, values=list(self.icc_profiles.keys()))
         self.color_space_menu.grid(row=1, column=1, padx=10, pady=5, sticky="ew")
+        Tooltip(self.color_space_menu, f"Profile embedded in the output. The Gray profiles are built in and describe grayscale output properly; files from the system colour folders (and ${icc.ICC_DIRS_ENV}) are listed by name. Any other entry keeps the source's profile.")
         self.alpha_var = ctk.BooleanVar(value=True)
         self.alpha_check = ctk.CTkCheckBox(meta_frame, text="Preserve Transparency (Alpha Channel)", variable=self.alpha_var)
         self.alpha_check.grid(row=2, column=0, columnspan=2, padx=10, pady=10, sticky="w")
         self.strip_metadata_var = ctk.BooleanVar(value=False)
         self.strip_metadata_check = ctk.CTkCheckBox(meta_frame, text="Strip all metadata (EXIF, etc.)", variable=self.strip_metadata_var)
         self.strip_metadata_check.grid(row=3, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        self.streaming_var = ctk.BooleanVar(value=False)
+        self.streaming_check = ctk.CTkCheckBox(meta_frame, text="Stream in bands (large images; PNG/TIFF at original size)", variable=self.streaming_var)
+        self.streaming_check.grid(row=4, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        Tooltip(self.streaming_check, "Converts and writes the image a band of rows at a time, so memory use no longer grows with image size. TIFF sources are read strip by strip or tile by tile.")
+        self.all_frames_var = ctk.BooleanVar(value=False)
+        self.all_frames_check = ctk.CTkCheckBox(meta_frame, text="All pages / frames / layers (multi-page TIFF, animated WebP)", variable=self.all_frames_var)
+        self.all_frames_check.grid(row=5, column=0, columnspan=2, padx=10, pady=10, sticky="w")
+        Tooltip(self.all_frames_check, "Converts every page of a multi-page TIFF, every frame of an animated GIF/WebP or every visible PSD layer, one at a time, into a multi-page TIFF or animated WebP. Single-frame sources export as usual.")
         preset_frame = ctk.CTkFrame(self)
         preset_frame.grid(row=4, column=0, padx=15, pady=10, sticky="ew")
         ctk.CTkButton(preset_frame, text="Save Preset", command=self.save_preset).pack(side="left", expand=True, padx=5)
@@ -158,7 +325,8 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         ctk.CTkButton(self, text="Export", command=self.on_export, height=40, font=ctk.CTkFont(weight="bold")).grid(row=5, column=0, padx=15, pady=(10, 15), sticky="ew")
         
     def update_ui_for_format(self, selected_format=None):
-        widgets_to_forget = [self.quality_label, self.quality_slider, self.subsampling_label, self.subsampling_menu]
+        widgets_to_forget = [self.quality_label, self.quality_slider, self.subsampling_label, self.subsampling_menu, self.png_level_label, self.png_level_slider,
+                             self.png_strategy_label, self.png_strategy_menu, self.tiff_compression_label, self.tiff_compression_menu, self.webp_method_label, self.webp_method_slider]
         for widget in widgets_to_forget:
             try: widget.grid_forget()
             except _tkinter.TclError: pass 
@@ -173,15 +341,24 @@ class AdvancedExportDialog(ctk.CTkToplevel):
             self.subsampling_label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
             self.subsampling_menu.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
             row += 1
+        encoder_rows = {".png": [(self.png_level_label, self.png_level_slider), (self.png_strategy_label, self.png_strategy_menu)],
+                        ".tiff": [(self.tiff_compression_label, self.tiff_compression_menu)], ".webp": [(self.webp_method_label, self.webp_method_slider)]}
+        for label, widget in encoder_rows.get(fmt, []):
+            label.grid(row=row, column=0, padx=10, pady=5, sticky="w")
+            widget.grid(row=row, column=1, padx=10, pady=5, sticky="ew")
+            row += 1
         if row > 0:
             self.specific_options_frame.configure(fg_color=("gray92", "gray14"), corner_radius=5)
             self.specific_options_frame.grid_columnconfigure(1, weight=1)
-        is_16bit_supported = fmt in [".png", ".tiff"]
-        if not is_16bit_supported and self.bit_depth_var.get() == "16-bit": self.bit_depth_var.set("8-bit")
-        self.bit_depth_menu.configure(values=["8-bit", "16-bit"] if is_16bit_supported else ["8-bit"])
+        # PNG and TIFF hold 16-bit samples; only TIFF holds float ones.
+        labels = [BIT_DEPTH_LABELS[d] for d in ([8, 16, engine.FLOAT_BIT_DEPTH] if fmt == ".tiff" else [8, 16] if fmt == ".png" else [8])]
+        if self.bit_depth_var.get() not in labels: self.bit_depth_var.set(labels[-1])
+        self.bit_depth_menu.configure(values=labels)
         has_alpha_support = fmt in [".png", ".tiff", ".webp", ".heic"]
         self.alpha_check.configure(state="normal" if has_alpha_support else "disabled")
         if not has_alpha_support: self.alpha_var.set(False)
+        self.streaming_check.configure(state="normal" if fmt in streaming.STREAM_FORMATS else "disabled")
+        self.all_frames_check.configure(state="normal" if fmt in frames.MULTI_FRAME_FORMATS else "disabled")
 
     def on_width_change(self, *args):
         if self.aspect_lock_var.get() and self.width_entry.focus_get() == self.width_entry:
@@ -205,8 +382,11 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         dpi = int(self.dpi_entry.get()) if self.dpi_entry.get().isdigit() else None
         profile_path = self.icc_profiles.get(self.color_space_var.get())
         fmt = self.format_var.get()
-        settings = {"format": fmt, "bit_depth": int(self.bit_depth_var.get().replace('-bit', '')), "size": (w, h), "dpi": dpi, "icc_profile_path": profile_path, "preserve_alpha": self.alpha_var.get(), "strip_metadata": self.strip_metadata_var.get()}
+        settings = {"format": fmt, "bit_depth": next(d for d, label in BIT_DEPTH_LABELS.items() if label == self.bit_depth_var.get()), "size": (w, h), "dpi": dpi, "icc_profile_path": profile_path, "preserve_alpha": self.alpha_var.get(), "strip_metadata": self.strip_metadata_var.get(), "streaming": self.streaming_var.get() and fmt in streaming.STREAM_FORMATS, "all_frames": self.all_frames_var.get() and fmt in frames.MULTI_FRAME_FORMATS, "kernel": self.kernel_var.get(), "transfer": self.transfer_var.get(), "threads": int(self.threads_var.get()), "resample": next(key for key, label in RESAMPLE_LABELS.items() if label == self.resample_var.get())}
         if fmt in [".jpeg", ".webp", ".heic"]: settings['quality'] = int(self.quality_slider.get())
+        if fmt == ".png": settings.update({"png_compress_level": int(self.png_level_slider.get()), "png_strategy": self.png_strategy_var.get()})
+        elif fmt == ".tiff": settings["tiff_compression"] = self.tiff_compression_var.get()
+        elif fmt == ".webp": settings["webp_method"] = int(self.webp_method_slider.get())
         if fmt in [".jpeg", ".heic"]:
             subsampling_map = {"4:4:4 (Best)": 0, "4:2:2 (High)": 1, "4:2:0 (Standard)": 2}
             settings['subsampling'] = subsampling_map.get(self.subsampling_var.get(), 0)
@@ -214,10 +394,16 @@ class AdvancedExportDialog(ctk.CTkToplevel):
 
     def set_settings(self, settings):
         self.format_var.set(settings.get("format", ".png"))
-        self.bit_depth_var.set(f'{settings.get("bit_depth", 8)}-bit')
+        self.bit_depth_var.set(BIT_DEPTH_LABELS.get(settings.get("bit_depth", 8), "8-bit"))
         self.quality_slider.set(settings.get("quality", 95))
         subsampling_rev_map = {0: "4:4:4 (Best)", 1: "4:2:2 (High)", 2: "4:2:0 (Standard)"}
         self.subsampling_var.set(subsampling_rev_map.get(settings.get("subsampling", 0)))
+        self.png_level_slider.set(settings.get("png_compress_level", engine.DEFAULT_PNG_COMPRESS_LEVEL))
+        self.png_level_label.configure(text=f"Compression Level ({int(self.png_level_slider.get())}):")
+        self.png_strategy_var.set(settings.get("png_strategy", "default"))
+        self.tiff_compression_var.set(settings.get("tiff_compression", "none"))
+        self.webp_method_slider.set(settings.get("webp_method", engine.DEFAULT_WEBP_METHOD))
+        self.webp_method_label.configure(text=f"Encoder Effort ({int(self.webp_method_slider.get())}):")
         w, h = settings.get("size", self.original_info['size'])
         self.width_var.set(str(w))
         self.height_var.set(str(h))
@@ -231,6 +417,12 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         self.color_space_var.set(profile_name_to_set)
         self.alpha_var.set(settings.get("preserve_alpha", True))
         self.strip_metadata_var.set(settings.get("strip_metadata", False))
+        self.streaming_var.set(settings.get("streaming", False))
+        self.all_frames_var.set(settings.get("all_frames", False))
+        self.kernel_var.set(settings.get("kernel", engine.DEFAULT_KERNEL))
+        self.transfer_var.set(settings.get("transfer", engine.DEFAULT_TRANSFER))
+        self.threads_var.set(str(min(settings.get("threads", engine.default_conversion_threads()), engine.default_conversion_threads())))
+        self.resample_var.set(RESAMPLE_LABELS[settings.get("resample", engine.DEFAULT_RESAMPLE)])
         self.update_ui_for_format()
 
     def save_preset(self):
@@ -254,18 +446,84 @@ class AdvancedExportDialog(ctk.CTkToplevel):
         self.result = None
         self.destroy()
 
+class DiagnosticsDialog(ctk.CTkToplevel):
+    """Per-stage timing summary of everything recorded by profiling.PROFILER, refreshed
+    while the window is open. Profiling is off until switched on here."""
+
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Diagnostics")
+        self.geometry("640x420")
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+        controls = ctk.CTkFrame(self, fg_color="transparent")
+        controls.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+        self.enabled_var = ctk.BooleanVar(value=profiling.PROFILER.enabled)
+        enabled_check = ctk.CTkCheckBox(controls, text="Record stage timings", variable=self.enabled_var, command=self.on_toggle)
+        enabled_check.pack(side="left", padx=5)
+        Tooltip(enabled_check, "Records wall time, CPU time and peak memory of every load, convert, display, save and batch stage. Costs nothing while off.")
+        ctk.CTkButton(controls, text="Export Trace...", width=110, command=self.export_trace).pack(side="right", padx=5)
+        ctk.CTkButton(controls, text="Export JSON...", width=110, command=self.export_json).pack(side="right", padx=5)
+        ctk.CTkButton(controls, text="Clear", width=70, command=self.clear).pack(side="right", padx=5)
+        self.summary_box = ctk.CTkTextbox(self, font=ctk.CTkFont(family="Courier", size=12), wrap="none")
+        self.summary_box.grid(row=1, column=0, padx=10, pady=(0, 10), sticky="nsew")
+        self.shown_count = None
+        self.refresh()
+
+    def on_toggle(self):
+        if self.enabled_var.get(): profiling.PROFILER.enable()
+        else: profiling.PROFILER.disable()
+
+    def refresh(self):
+        if not self.winfo_exists(): return
+        events = profiling.PROFILER.snapshot()
+        if len(events) != self.shown_count:
+            self.shown_count = len(events)
+            self.summary_box.configure(state="normal")
+            self.summary_box.delete("1.0", "end")
+            self.summary_box.insert("1.0", profiling.format_summary(events) if events else "No stages recorded yet.")
+            self.summary_box.configure(state="disabled")
+        self.after(1000, self.refresh)
+
+    def clear(self):
+        profiling.PROFILER.clear()
+        self.refresh()
+
+    def export_json(self):
+        filepath = filedialog.asksaveasfilename(parent=self, defaultextension=".json", filetypes=[("JSON", "*.json")])
+        if filepath: profiling.PROFILER.save(filepath)
+
+    def export_trace(self):
+        filepath = filedialog.asksaveasfilename(parent=self, initialfile="profile.trace.json", defaultextension=".trace.json", filetypes=[("Chrome Trace", "*.trace.json")])
+        if filepath: profiling.PROFILER.save(filepath if filepath.endswith(".trace.json") else filepath + ".trace.json")
+
 class MainApplication(ctk.CTkFrame):
     def __init__(self, master, **kwargs):
         super().__init__(master, **kwargs)
         self.master = master
         self.original_image = None
+        self.preview_proxy = None
         self.preview_data = None
+        self.preview_key = None
+        self.original_pyramid = None
+        self.view = None
+        self.display_keys = {}
+        self.resize_jobs = {}
+        self.pan_anchor = None
+        self.image_token = 0
+        self.result_cache = cache.LRUCache()
         self.original_info = {}
-        self.batch_files = []
-        self.task_queue = queue.Queue()
+        self.batch_stats = {"total": 0, "finished": 0, "failed": 0, "skipped": 0, "started": None}
+        self.batch_scheduler = None
+        self.folder_watcher = None
+        self.task_scheduler = tasks.TaskScheduler()
         self.result_queue = queue.Queue()
-        threading.Thread(target=self.worker_loop, daemon=True).start()
+        self.export_token = None
+        # Two workers, so a long export never blocks preview and display updates.
+        for _ in range(WORKER_THREADS): threading.Thread(target=self.worker_loop, daemon=True).start()
         self.pack(fill="both", expand=True)
+        # A canvas can never be larger than the screen, so a proxy of this size is built once per load.
+        self.proxy_size = (self.winfo_screenwidth(), self.winfo_screenheight())
         self.setup_ui()
         self.process_results()
         self.master.drop_target_register(DND_FILES)
@@ -296,13 +554,16 @@ class MainApplication(ctk.CTkFrame):
         mode_frame.pack(side="left")
         ctk.CTkLabel(mode_frame, text="Conversion Mode:").pack(side="left", padx=(0, 10))
         self.conversion_mode_var = ctk.StringVar(value="Rec. 709")
-        modes = ["L*a*b* (L*)", "Gamma", "Rec. 709", "HSL (Lightness)", "HSV (Value)", "Rec. 601", "Rec. 2100"]
-        self.mode_menu = ctk.CTkSegmentedButton(mode_frame, values=modes, variable=self.conversion_mode_var, command=self.update_preview)
+        self.mode_menu = ctk.CTkSegmentedButton(mode_frame, values=engine.GRAYSCALE_MODES, variable=self.conversion_mode_var, command=self.update_preview)
         self.mode_menu.pack(side="left")
         info_frame = ctk.CTkFrame(tab, fg_color="transparent")
         info_frame.grid(row=1, column=0, pady=(0, 10), sticky="ew")
         self.info_var = ctk.StringVar(value="Image Info: No image loaded.")
         ctk.CTkLabel(info_frame, textvariable=self.info_var, font=ctk.CTkFont(size=12), text_color="#FFD700").pack(side="left")
+        self.zoom_var = ctk.StringVar(value="")
+        zoom_label = ctk.CTkLabel(info_frame, textvariable=self.zoom_var, font=ctk.CTkFont(size=12))
+        zoom_label.pack(side="right")
+        Tooltip(zoom_label, "Scroll over an image to zoom, drag to pan, double-click to switch between 100% and fit. Both views follow.")
         display_frame = ctk.CTkFrame(tab, fg_color="transparent")
         display_frame.grid(row=2, column=0, sticky="nsew")
         display_frame.grid_columnconfigure((0, 1), weight=1)
@@ -319,8 +580,17 @@ class MainApplication(ctk.CTkFrame):
         self.status_var = ctk.StringVar(value="Ready")
         ctk.CTkLabel(status_frame, textvariable=self.status_var).grid(row=0, column=0, sticky="w")
         self.progress_bar = ctk.CTkProgressBar(status_frame, mode='indeterminate')
-        self.original_canvas.bind("<Configure>", lambda e: self.request_display_update('original'))
-        self.preview_canvas.bind("<Configure>", lambda e: self.request_display_update('preview'))
+        self.cancel_button = ctk.CTkButton(status_frame, text="Cancel", width=80, command=self.cancel_export)
+        ctk.CTkButton(status_frame, text="Diagnostics", width=100, command=self.show_diagnostics).grid(row=0, column=3, sticky="e", padx=(10, 0), pady=(5, 0))
+        self.diagnostics_dialog = None
+        for canvas_name, canvas in (('original', self.original_canvas), ('preview', self.preview_canvas)):
+            canvas.bind("<Configure>", lambda e, name=canvas_name: self._schedule_display_update(name))
+            canvas.bind("<MouseWheel>", lambda e: self._on_zoom(e, e.delta > 0))
+            canvas.bind("<Button-4>", lambda e: self._on_zoom(e, True))
+            canvas.bind("<Button-5>", lambda e: self._on_zoom(e, False))
+            canvas.bind("<Double-Button-1>", self._on_zoom_toggle)
+            canvas.bind("<ButtonPress-1>", lambda e: setattr(self, 'pan_anchor', (e.x, e.y)))
+            canvas.bind("<B1-Motion>", self._on_pan)
     
     def setup_batch_processing_tab(self, tab):
         tab.grid_columnconfigure(0, weight=1)
@@ -329,8 +599,11 @@ class MainApplication(ctk.CTkFrame):
         batch_control_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
         ctk.CTkButton(batch_control_frame, text="Add Files...", command=self.add_batch_files).pack(side="left", padx=5)
         ctk.CTkButton(batch_control_frame, text="Clear List", command=self.clear_batch_list).pack(side="left", padx=5)
-        self.batch_list_frame = ctk.CTkScrollableFrame(tab, label_text="Drag & Drop Files Here")
-        self.batch_list_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
+        self.watch_button = ctk.CTkButton(batch_control_frame, text="Watch Folder...", command=self.toggle_watch_folder)
+        self.watch_button.pack(side="right", padx=5)
+        Tooltip(self.watch_button, "Converts new files dropped into a folder into the output folder, once they have finished being written.")
+        self.batch_list = VirtualBatchList(tab, on_row_shown=lambda path: self.task_scheduler.submit('probe', path, priority=tasks.PRIORITY_BACKGROUND))
+        self.batch_list.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
         batch_action_frame = ctk.CTkFrame(tab)
         batch_action_frame.grid(row=2, column=0, padx=10, pady=10, sticky="ew")
         batch_action_frame.grid_columnconfigure(1, weight=1)
@@ -338,148 +611,136 @@ class MainApplication(ctk.CTkFrame):
         self.output_folder_var = ctk.StringVar(value="")
         ctk.CTkEntry(batch_action_frame, textvariable=self.output_folder_var, state="readonly").pack(side="left", expand=True, fill="x", padx=5)
         ctk.CTkButton(batch_action_frame, text="Browse...", command=self.select_output_folder).pack(side="left", padx=5)
+        ctk.CTkLabel(batch_action_frame, text="Workers:").pack(side="left", padx=(15, 5))
+        self.batch_workers_var = ctk.StringVar(value=str(batch.default_workers()))
+        ctk.CTkOptionMenu(batch_action_frame, variable=self.batch_workers_var, values=[str(n) for n in range(1, batch.default_workers() + 1)], width=70).pack(side="left", padx=5)
+        self.skip_unchanged_var = ctk.BooleanVar(value=True)
+        skip_unchanged_check = ctk.CTkCheckBox(batch_action_frame, text="Skip unchanged", variable=self.skip_unchanged_var)
+        skip_unchanged_check.pack(side="left", padx=5)
+        Tooltip(skip_unchanged_check, f"Files already converted into this folder with the same settings, and unchanged since, are skipped. Progress is kept in {manifest.MANIFEST_NAME} in the output folder, so an interrupted batch can be resumed.")
+        self.pipeline_var = ctk.BooleanVar(value=False)
+        pipeline_check = ctk.CTkCheckBox(batch_action_frame, text="Pipelined", variable=self.pipeline_var)
+        pipeline_check.pack(side="left", padx=5)
+        Tooltip(pipeline_check, "Decodes, converts and encodes in separate stages running side by side, so one file is written while the next is being read. Uses the worker count per stage, on threads.")
         self.batch_export_button = ctk.CTkButton(tab, text="Start Batch Processing", command=self.start_batch_processing, height=40, state="disabled")
         self.batch_export_button.grid(row=3, column=0, padx=10, pady=10, sticky="ew")
         self.batch_progress = ctk.CTkProgressBar(tab)
         self.batch_progress.set(0)
+        self.batch_stats_var = ctk.StringVar(value="")
+        self.batch_stats_label = ctk.CTkLabel(tab, textvariable=self.batch_stats_var, anchor="w")
 
     def worker_loop(self):
         while True:
-            task_type, data = self.task_queue.get()
+            task_type, data, token = self.task_scheduler.get()
             try:
-                if task_type == 'load': self.result_queue.put(('load_success', self._perform_load(data)))
-                elif task_type == 'convert': self.result_queue.put(('convert_success', self.convert_to_enhanced_grayscale(*data)))
-                elif task_type == 'resize_display': self.result_queue.put(('display_ready', (data[0], self._perform_resize_for_display(*data))))
-                elif task_type == 'save':
-                    self._perform_save(*data)
-                    self.result_queue.put(('save_success', data[2]))
-                elif task_type == 'batch_process':
-                    in_path, out_path, settings = data
-                    img_obj, info = self._perform_load(in_path)
-                    gray_array, alpha_img = self.convert_to_enhanced_grayscale(img_obj, settings['conversion_mode'], settings.get('bit_depth', info['bit_depth']))
-                    self._perform_save(gray_array, alpha_img, out_path, settings, info)
-                    self.result_queue.put(('batch_item_success', in_path))
+                with profiling.stage(task_type):
+                    if task_type == 'load':
+                        with profiling.stage("decode"): image, info = engine.load_image(data)
+                        token.check()
+                        with profiling.stage("preview_proxy"): proxy = engine.make_preview_proxy(image, self.proxy_size)
+                        token.check()
+                        with profiling.stage("pyramid"): pyramid = display.ImagePyramid(image)
+                        result = ('load_success', (image, info, proxy, pyramid))
+                    elif task_type == 'convert':
+                        key, args = data[0], data[1:]
+                        converted = engine.convert_to_enhanced_grayscale(*args, cancel_token=token)
+                        self.result_cache.put(key, converted)
+                        result = ('convert_success', (key, converted))
+                    elif task_type == 'render_view':
+                        key, canvas_name, (pyramid, mode, stand_in), zoom, center, canvas_size = data
+                        if stand_in:
+                            # The converted preview gets its own small pyramid, built once per conversion.
+                            pyramid_key, gray, scale = stand_in
+                            pyramid = self.result_cache.get(pyramid_key)
+                            if pyramid is None:
+                                with profiling.stage("pyramid"): pyramid = display.ImagePyramid(gray, scale)
+                                self.result_cache.put(pyramid_key, pyramid)
+                        if mode: image, position = display.render_converted(pyramid, mode, zoom, center, canvas_size)
+                        else: image, position = pyramid.render(zoom, center, canvas_size)
+                        result = ('display_ready', (key, canvas_name, image, position))
+                    elif task_type == 'export':
+                        image, key, mode, filepath, settings, info = data
+                        # Other frames are read from the source file; single-frame sources export the loaded image as usual.
+                        source = info.get('filepath')
+                        if not (settings.get('all_frames') and os.path.isfile(str(source)) and frames.convert_file(source, filepath, dict(settings, conversion_mode=mode), token)):
+                            converted = self.result_cache.get(key)
+                            if converted is None:
+                                with profiling.stage("convert", mode=mode):
+                                    converted = engine.convert_with_settings(image, dict(settings, conversion_mode=mode), token)
+                                self.result_cache.put(key, converted)
+                            token.check()
+                            with profiling.stage("save"): engine.save_image(*converted, filepath, settings, info)
+                        result = ('save_success', filepath)
+                    elif task_type == 'probe':
+                        # Unreadable files are reported by the batch run itself; the list just shows no details.
+                        try: info = engine.probe_image(data)
+                        except Exception: info = None
+                        result = ('probe_ready', (data, info))
+                    elif task_type == 'stream_export':
+                        reader, filepath, settings = data
+                        streaming.stream_convert(reader, filepath, settings, cancel_token=token)
+                        result = ('save_success', filepath)
+                # A superseded task's result is stale; the task that replaced it will report instead.
+                if not token.cancelled: self.result_queue.put(result)
+            except tasks.TaskCancelled:
+                if task_type in EXPORT_TASKS: self.result_queue.put(('export_cancelled', data))
             except Exception as e:
-                self.result_queue.put(('task_failed', (data, traceback.format_exc(), e)))
+                self.result_queue.put(('task_failed', (task_type, data, traceback.format_exc(), e)))
 
     def process_results(self):
+        handled = 0
         try:
-            while not self.result_queue.empty():
+            while handled < MAX_RESULTS_PER_TICK and not self.result_queue.empty():
                 result_type, data = self.result_queue.get_nowait()
+                handled += 1
                 if result_type == 'load_success': 
-                    self.original_image, self.original_info = data
+                    self.original_image, self.original_info, self.preview_proxy, self.original_pyramid = data
+                    self.view = display.View(self.original_image.size)
+                    self.image_token += 1
+                    self.result_cache.discard(lambda key: key[1] != self.image_token)
                     self._handle_load_success()
                 elif result_type == 'convert_success':
-                    self.preview_data, _ = data
+                    self.preview_key, (self.preview_data, _) = data
                     self._handle_convert_success()
-                elif result_type == 'display_ready': 
-                    self._update_canvas_image(*data)
+                elif result_type == 'display_ready':
+                    self._show_rendered_view(*data)
                 elif result_type == 'save_success':
-                    self.stop_processing_indicator(f"Successfully exported: {os.path.basename(data)}")
+                    self.export_token = None
+                    self.stop_processing_indicator(self._with_stage_timings(f"Successfully exported: {os.path.basename(data)}", *EXPORT_TASKS))
                     messagebox.showinfo("Success", f"Image saved successfully to:\n{data}")
                 elif result_type == 'batch_item_success':
                     self._update_batch_item_status(data, "✅ Done", "green")
-                    self.batch_progress.set(self.batch_progress.get() + (1/len(self.batch_files)))
+                    self._count_batch_result("finished")
+                elif result_type == 'watch_item_queued':
+                    self.add_batch_files([data])
+                    self._update_batch_item_status(data, "Queued", "#cccccc")
+                    self.batch_stats["total"] += 1
+                elif result_type == 'batch_item_skipped':
+                    self._update_batch_item_status(data, "⏭ Up to date", "gray60")
+                    self._count_batch_result("skipped")
+                elif result_type == 'batch_item_failed':
+                    in_path, error_msg, exception = data
+                    print(f"Batch item failed: {in_path}\nError: {error_msg}")
+                    self._update_batch_item_status(in_path, "❌ Failed", "red")
+                    self._count_batch_result("failed")
+                elif result_type == 'profile_events':
+                    profiling.PROFILER.extend(data)
+                elif result_type == 'probe_ready':
+                    self._update_batch_item_details(*data)
+                elif result_type == 'export_cancelled':
+                    self.export_token = None
+                    self.stop_processing_indicator("Export cancelled.")
                 elif result_type == 'task_failed':
-                    task_data, error_msg, exception = data
+                    task_type, task_data, error_msg, exception = data
+                    if task_type in EXPORT_TASKS: self.export_token = None
                     print(f"Task failed.\nData: {task_data}\nError: {error_msg}")
                     self.stop_processing_indicator("An error occurred.", "red")
                     messagebox.showerror("Processing Error", f"Task failed:\n{exception}")
         finally: 
-            self.after(100, self.process_results)
-
-    def to_linear(self, c):
-        return np.where(c <= 0.04045, c / 12.92, ((c + 0.055) / 1.055) ** 2.4)
-
-    def to_srgb(self, c):
-        return np.where(c <= 0.0031308, c * 12.92, 1.055 * (c ** (1/2.4)) - 0.055)
-
-    def convert_to_enhanced_grayscale(self, image: Image.Image, mode: str, target_bit_depth: int):
-        if image.mode == 'RGBA': cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGBA2BGRA)
-        elif image.mode == 'RGB': cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        elif image.mode == 'LA':
-            L, A_pil = image.split()
-            cv_image = cv2.cvtColor(np.array(L), cv2.COLOR_GRAY2BGRA)
-            cv_image[:, :, 3] = np.array(A_pil)
-        elif image.mode == 'L': cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_GRAY2BGR)
-        else:
-            rgba_image = image.convert("RGBA")
-            cv_image = cv2.cvtColor(np.array(rgba_image), cv2.COLOR_RGBA2BGRA)
-        has_alpha = cv_image.shape[2] == 4
-        alpha_channel_pil = Image.fromarray(cv_image[:, :, 3]) if has_alpha else None
-        if cv_image.dtype == np.uint8: cv_image = cv_image.astype(np.uint16) * 257
-        elif cv_image.dtype != np.uint16: raise ValueError(f"Unsupported image dtype {cv_image.dtype}")
-        B, G, R = cv2.split(cv_image)[:3]
-        Rf, Gf, Bf = R.astype(np.float64)/65535.0, G.astype(np.float64)/65535.0, B.astype(np.float64)/65535.0
-        mode_map = {"Rec. 601": '601', "Rec. 709": '709', "Rec. 2100": '2100', "Gamma": 'gamma'}
-        script_mode = mode_map.get(mode, '709')
-        if mode in ["L*a*b* (L*)", "HSV (Value)", "HSL (Lightness)"]:
-            rgb_image_pil = image.convert('RGB')
-            if mode == "L*a*b* (L*)":
-                l, _, _ = rgb_image_pil.convert('LAB').split()
-                gray_float = np.array(l, dtype=np.float64) / 255.0
-            elif mode == "HSV (Value)":
-                _, _, v = rgb_image_pil.convert('HSV').split()
-                gray_float = np.array(v, dtype=np.float64) / 255.0
-            else:
-                rgb_array_float = np.array(rgb_image_pil, dtype=np.float64) / 255.0
-                cmax, cmin = np.maximum.reduce(rgb_array_float, axis=-1), np.minimum.reduce(rgb_array_float, axis=-1)
-                gray_float = (cmax + cmin) / 2.0
-        elif script_mode == 'gamma':
-            Rl, Gl, Bl = self.to_linear(Rf), self.to_linear(Gf), self.to_linear(Bf)
-            Yl = 0.2126 * Rl + 0.7152 * Gl + 0.0722 * Bl
-            gray_float = self.to_srgb(Yl)
-        else:
-            weights = {'601':(0.299,0.587,0.114),'709':(0.2126,0.7152,0.0722),'2100':(0.2627,0.6780,0.0593)}
-            wR, wG, wB = weights[script_mode]
-            gray_float = wR * Rf + wG * Gf + wB * Bf
-        gray_float = np.clip(gray_float, 0, 1)
-        if target_bit_depth == 16: multiplier, dtype = 65535, np.uint16
-        else: multiplier, dtype = 255, np.uint8
-        final_array = np.round(gray_float * multiplier).astype(dtype)
-        return final_array, alpha_channel_pil
-
-    def _perform_save(self, gray_array, alpha_image, filepath, settings, original_info):
-        file_ext = Path(filepath).suffix.lower()
-        is_high_bit_depth = settings["bit_depth"] > 8
-        has_alpha = alpha_image and settings["preserve_alpha"]
-        if file_ext == ".tiff" and is_high_bit_depth and has_alpha:
-            alpha_8bit_np = np.array(alpha_image.convert("L"))
-            A16 = (alpha_8bit_np.astype(np.uint16)) * 257
-            stacked = np.stack([gray_array, A16], axis=-1)
-            tifffile.imwrite(filepath, stacked, photometric="minisblack", extrasamples=["unassalpha"])
-            return
-        if file_ext == ".png" and is_high_bit_depth and has_alpha:
-            Y16 = gray_array
-            alpha_8bit_np = np.array(alpha_image.convert("L"))
-            A16 = (alpha_8bit_np.astype(np.uint16)) * 257
-            out_cv = cv2.merge([Y16, Y16, Y16, A16])
-            success, buffer = cv2.imencode(file_ext, out_cv)
-            if not success: raise IOError("Failed to encode 16-bit PNG with alpha.")
-            with open(filepath, 'wb') as f: f.write(buffer)
-            return
-        target_mode = "I;16" if is_high_bit_depth else "L"
-        final_image = Image.fromarray(gray_array, mode=target_mode)
-        if settings.get("size") != original_info['size']:
-            final_image = final_image.resize(settings["size"], Image.Resampling.LANCZOS)
-        if has_alpha:
-            final_image = Image.merge("LA", (final_image.convert("L"), alpha_image.convert("L")))
-        save_kwargs = {}
-        if not settings.get("strip_metadata", False):
-            icc_profile_path = settings.get("icc_profile_path")
-            if icc_profile_path:
-                with open(icc_profile_path, 'rb') as f: save_kwargs['icc_profile'] = f.read()
-            elif original_info.get("icc_profile"): save_kwargs['icc_profile'] = original_info.get("icc_profile")
-            dpi = settings.get("dpi")
-            if dpi: save_kwargs['dpi'] = (dpi, dpi)
-        format_map = {".jpeg": "JPEG", ".jpg": "JPEG", ".png": "PNG", ".tiff": "TIFF", ".webp": "WEBP", ".bmp": "BMP", ".heic": "HEIF"}
-        file_format = format_map.get(file_ext, "PNG")
-        if file_ext in [".jpg", ".jpeg"]:
-            final_image = final_image.convert("L")
-            save_kwargs.update({"quality": settings.get("quality", 95), "subsampling": settings.get("subsampling", 0)})
-        elif file_ext == ".heic":
-             save_kwargs.update({"quality": settings.get("quality", 95), "chroma": settings.get("subsampling", 0)})
-        final_image.save(filepath, format=file_format, **save_kwargs)
+            # All of this tick's status changes reach the widgets in one pass.
+            self.batch_list.refresh()
+            self._update_batch_stats()
+            self.after(1 if handled >= MAX_RESULTS_PER_TICK else 100, self.process_results)
 
     def on_drop(self, event):
         paths = self.master.tk.splitlist(event.data)
@@ -494,14 +755,14 @@ class MainApplication(ctk.CTkFrame):
             filepath = filedialog.askopenfilename(filetypes=filetypes)
         if filepath:
             self.start_processing_indicator(f"Loading: {os.path.basename(filepath)}...")
-            self.task_queue.put(('load', filepath))
+            self._submit_load(filepath)
             
     def load_from_clipboard(self):
         try:
             image = ImageGrab.grabclipboard()
             if isinstance(image, Image.Image):
                  self.start_processing_indicator("Loading from clipboard...")
-                 self.task_queue.put(('load', image))
+                 self._submit_load(image)
             else: messagebox.showwarning("Clipboard Error", "No valid image on clipboard.")
         except: messagebox.showerror("Clipboard Error", "Could not access clipboard.")
 
@@ -514,151 +775,264 @@ class MainApplication(ctk.CTkFrame):
         file_ext = settings['format']
         filepath = filedialog.asksaveasfilename(initialfile=default_name, defaultextension=file_ext, filetypes=[(f"{file_ext.upper()[1:]} files", f"*{file_ext}")])
         if not filepath: return
-        self.start_processing_indicator("Exporting image...")
-        gray_array, alpha_img = self.convert_to_enhanced_grayscale(self.original_image, self.conversion_mode_var.get(), settings['bit_depth'])
-        self.task_queue.put(('save', (gray_array, alpha_img, filepath, settings, self.original_info)))
-
-    def _perform_load(self, source):
-        pil_image = None
-        if isinstance(source, str): pil_image = Image.open(source)
-        elif isinstance(source, Image.Image): pil_image = source
-        pil_image.load()
-        info = self.analyze_image_properties(pil_image)
-        return pil_image, info
-        
+        mode = self.conversion_mode_var.get()
+        reader = streaming.PilBandReader(self.original_image) if settings.get('streaming') and not settings.get('all_frames') else None
+        if reader and streaming.can_stream(reader, filepath, settings):
+            task = ('stream_export', (reader, filepath, dict(settings, conversion_mode=mode)))
+        else:
+            # Resampling before conversion yields a different (smaller) result than the cached full-size one.
+            resample = settings.get('resample', engine.DEFAULT_RESAMPLE)
+            size = self.original_image.size if resample == 'after' else settings.get('size', self.original_image.size)
+            key = self._conversion_key(mode, settings['bit_depth'], size, settings.get('kernel', engine.DEFAULT_KERNEL), resample, settings.get('transfer', engine.DEFAULT_TRANSFER))
+            task = ('export', (self.original_image, key, mode, filepath, settings, self.original_info))
+        self.export_token = self.task_scheduler.submit(*task, priority=tasks.PRIORITY_BACKGROUND, coalesce_key='export')
+        self.start_processing_indicator("Exporting image...", cancellable=True)
+
+    def cancel_export(self):
+        if self.export_token: self.export_token.cancel()
+        self.status_var.set("Cancelling export...")
+
+    def _submit_load(self, source):
+        # Work queued for the previous image is obsolete once a new one is requested.
+        self.task_scheduler.cancel('convert')
+        for canvas_name in ('original', 'preview'): self.task_scheduler.cancel(('resize', canvas_name))
+        self.task_scheduler.submit('load', source, priority=tasks.PRIORITY_INTERACTIVE, coalesce_key='load')
+
     def add_batch_files(self, filepaths=None):
         if not filepaths: filepaths = filedialog.askopenfilenames(title="Select files for batch processing")
-        for path in filepaths:
-            if path not in [f['path'] for f in self.batch_files]:
-                frame = ctk.CTkFrame(self.batch_list_frame, fg_color=("gray85", "gray28"))
-                frame.pack(fill="x", pady=2, padx=2)
-                label = ctk.CTkLabel(frame, text=os.path.basename(path), anchor="w")
-                label.pack(side="left", expand=True, fill="x", padx=5)
-                status_label = ctk.CTkLabel(frame, text="⏳ Pending", width=120, anchor="e")
-                status_label.pack(side="right", padx=5)
-                self.batch_files.append({"path": path, "frame": frame, "status_label": status_label})
-        self.batch_export_button.configure(state="normal" if self.batch_files and self.output_folder_var.get() else "disabled")
+        # Headers are probed lazily, as rows scroll into view (see VirtualBatchList.on_row_shown).
+        self.batch_list.add(filepaths)
+        self.batch_list.refresh()
+        self.batch_export_button.configure(state="normal" if len(self.batch_list) and self.output_folder_var.get() else "disabled")
 
     def clear_batch_list(self):
-        for item in self.batch_files: item['frame'].destroy()
-        self.batch_files.clear()
+        self.batch_list.clear()
         self.batch_export_button.configure(state="disabled")
 
     def select_output_folder(self):
         folder = filedialog.askdirectory(title="Select Output Folder")
         if folder:
             self.output_folder_var.set(folder)
-            self.batch_export_button.configure(state="normal" if self.batch_files else "disabled")
+            # Offer to resume a batch that was interrupted before it finished in this folder.
+            if not len(self.batch_list):
+                unfinished = manifest.BatchManifest(folder).pending()
+                if unfinished and messagebox.askyesno("Resume Batch", f"{len(unfinished)} file(s) from an unfinished batch in this folder. Add them to the list?"):
+                    self.add_batch_files(unfinished)
+            self.batch_export_button.configure(state="normal" if len(self.batch_list) else "disabled")
 
     def start_batch_processing(self):
         output_folder = self.output_folder_var.get()
         if not output_folder or not os.path.isdir(output_folder): messagebox.showerror("Error", "Please select a valid output folder."); return
-        dialog = AdvancedExportDialog(self, self.original_info or {'bit_depth': 8, 'size': (0,0), 'dpi': (72,72)})
+        dialog_info = self.original_info or {'bit_depth': 8, 'size': (0,0), 'dpi': (72,72)}
+        dialog = AdvancedExportDialog(self, dialog_info)
         export_settings = dialog.result
         if not export_settings: return
+        # The size fields start at the open image's size; unless they were changed, every file keeps its own size.
+        size = export_settings.get('size')
+        if not size or 0 in size or tuple(size) == tuple(dialog_info['size']): export_settings.pop('size', None)
         export_settings['conversion_mode'] = self.conversion_mode_var.get()
-        self.batch_progress.grid(row=4, column=0, padx=10, pady=(0,10), sticky="ew")
-        self.batch_progress.set(0)
-        for item in self.batch_files:
-            self._update_batch_item_status(item['path'], "Queued", "#cccccc")
-            in_path = item['path']
-            out_name = Path(in_path).stem + "_grayscale" + export_settings['format']
-            out_path = os.path.join(output_folder, out_name)
-            self.task_queue.put(('batch_process', (in_path, out_path, export_settings)))
+        try: export_settings = icc.with_resolved_profile(export_settings)
+        except (OSError, ValueError) as e: messagebox.showerror("ICC Profile", f"Cannot read the colour profile:\n{e}"); return
+        workers = int(self.batch_workers_var.get())
+        # Workers already convert side by side; each gets its share of the cores.
+        export_settings['threads'] = min(export_settings.get('threads', 1), engine.default_conversion_threads(workers))
+        if self.batch_scheduler: self.batch_scheduler.cancel()
+        jobs = []
+        for in_path in self.batch_list.paths():
+            self._update_batch_item_status(in_path, "Queued", "#cccccc")
+            out_path = engine.output_path_for(in_path, output_folder, export_settings)
+            jobs.append((in_path, out_path, export_settings))
+        self._reset_batch_stats(len(jobs))
+        job_manifest = manifest.BatchManifest(output_folder)
+        if not self.skip_unchanged_var.get(): job_manifest.forget(self.batch_list.paths())
+        if self.pipeline_var.get(): self.batch_scheduler = batch.PipelineScheduler(self.result_queue, workers=workers, manifest=job_manifest)
+        else: self.batch_scheduler = batch.BatchScheduler(self.result_queue, workers=workers, manifest=job_manifest)
+        self.batch_scheduler.start(jobs)
     
+    def toggle_watch_folder(self):
+        if self.folder_watcher:
+            self.folder_watcher.stop()
+            self.folder_watcher = None
+            self.watch_button.configure(text="Watch Folder...")
+            self.status_var.set("Stopped watching folder.")
+            return
+        output_folder = self.output_folder_var.get()
+        if not output_folder or not os.path.isdir(output_folder): messagebox.showerror("Error", "Please select a valid output folder."); return
+        folder = filedialog.askdirectory(title="Select Folder to Watch")
+        if not folder: return
+        # Any preset saved from the dialog can be loaded here and applies to every incoming file.
+        dialog = AdvancedExportDialog(self, self.original_info or {'bit_depth': 8, 'size': (0,0), 'dpi': (72,72)})
+        settings = dialog.result
+        if not settings: return
+        settings.pop('size', None)
+        settings['conversion_mode'] = self.conversion_mode_var.get()
+        try: settings = icc.with_resolved_profile(settings)
+        except (OSError, ValueError) as e: messagebox.showerror("ICC Profile", f"Cannot read the colour profile:\n{e}"); return
+        self._reset_batch_stats(0)
+        settings['threads'] = min(settings.get('threads', 1), engine.default_conversion_threads(int(self.batch_workers_var.get())))
+        self.folder_watcher = watch.FolderWatcher([folder], output_folder, settings, self.result_queue, workers=int(self.batch_workers_var.get()))
+        self.folder_watcher.start()
+        self.watch_button.configure(text="Stop Watching")
+        self.status_var.set(f"Watching {folder} ({'polling' if self.folder_watcher.polling else 'filesystem events'})...")
+
+    def show_diagnostics(self):
+        if self.diagnostics_dialog and self.diagnostics_dialog.winfo_exists(): self.diagnostics_dialog.focus()
+        else: self.diagnostics_dialog = DiagnosticsDialog(self)
+
+    def _with_stage_timings(self, message, *task_types):
+        # With profiling on, the status bar also shows where the task's time went.
+        event = profiling.PROFILER.last(*task_types) if profiling.PROFILER.enabled else None
+        return f"{message} · {profiling.format_breakdown(event, profiling.PROFILER.children(event))}" if event else message
+
+    def _update_batch_item_details(self, path, info):
+        if info is None: return
+        (w, h), icc = info['size'], "ICC" if info['icc_profile'] else "no ICC"
+        self.batch_list.set_details(path, f"{w}×{h} · {info['bit_depth']}-bit · {icc}")
+
     def _update_batch_item_status(self, path, text, color):
-        for item in self.batch_files:
-            if item['path'] == path: item['status_label'].configure(text=text, text_color=color); return
+        self.batch_list.set_status(path, text, color)
+
+    def _reset_batch_stats(self, total):
+        self.batch_stats = {"total": total, "finished": 0, "failed": 0, "skipped": 0, "started": time.monotonic()}
+        self.batch_progress.grid(row=4, column=0, padx=10, pady=(0,10), sticky="ew")
+        self.batch_progress.set(0)
+        self.batch_stats_label.grid(row=5, column=0, padx=10, pady=(0,10), sticky="ew")
+
+    def _count_batch_result(self, outcome):
+        self.batch_stats[outcome] += 1
+
+    def _update_batch_stats(self):
+        stats = self.batch_stats
+        if stats["started"] is None: return
+        done = stats["finished"] + stats["failed"] + stats["skipped"]
+        # The clock stops while nothing is outstanding, so the rate doesn't decay after the batch ends.
+        if done < stats["total"]: stats["ended"] = None
+        elif not stats.get("ended"): stats["ended"] = time.monotonic()
+        elapsed = (stats.get("ended") or time.monotonic()) - stats["started"]
+        # Skipped items cost next to nothing, so only real conversions count towards the rate.
+        rate = stats["finished"] / elapsed if elapsed > 0 else 0.0
+        remaining = stats["total"] - done
+        eta = f"{int(remaining / rate) // 60}:{int(remaining / rate) % 60:02d}" if rate and remaining else "--:--"
+        self.batch_progress.set(done / stats["total"] if stats["total"] else 0)
+        self.batch_stats_var.set(f"{done}/{stats['total']} · {stats['finished']} converted, {stats['skipped']} up to date, {stats['failed']} failed · {rate:.1f} files/s · ETA {eta}")
+
+    def _conversion_key(self, mode, bit_depth, size, kernel=engine.DEFAULT_KERNEL, resample=None, transfer=engine.DEFAULT_TRANSFER):
+        return ('convert', self.image_token, mode, bit_depth, tuple(size), engine.resolve_kernel(kernel, mode, bit_depth), resample if tuple(size) != self.original_image.size else None, transfer)
 
-    def _perform_resize_for_display(self, canvas, image: Image.Image):
-        # CORRECTED FUNCTION
-        w, h = canvas.winfo_width(), canvas.winfo_height()
-        if w <= 1 or h <= 1: return None
-        
-        # This function should NOT do any color conversion. It just resizes.
-        # It needs to handle color images for the 'original' canvas.
-        display_image = image
-        if display_image.mode not in ['RGB', 'RGBA', 'L', 'LA']:
-            display_image = image.convert('RGBA')
-
-        img_w, img_h = display_image.size
-        if img_w == 0 or img_h == 0: return None
-        scale = min(w / img_w, h / img_h, 1.0)
-        new_size = (int(img_w * scale), int(img_h * scale))
-        
-        if new_size[0] < 1 or new_size[1] < 1: return None
-            
-        resized_image = display_image.resize(new_size, Image.Resampling.LANCZOS)
-        return ImageTk.PhotoImage(resized_image)
-        
     def update_preview(self, _=None):
         if self.original_image:
+            # The preview stays integer: float sources preview at 16 bits.
+            mode, bit_depth = self.conversion_mode_var.get(), min(self.original_info.get('bit_depth', 8), 16)
+            key = self._conversion_key(mode, bit_depth, self.preview_proxy.size)
+            cached = self.result_cache.get(key)
+            if cached is not None:
+                self.preview_key, self.preview_data = key, cached[0]
+                self._handle_convert_success("Enhanced preview ready (cached).")
+                return
             self.start_processing_indicator("Applying grayscale effect...")
-            self.task_queue.put(('convert', (self.original_image, self.conversion_mode_var.get(), self.original_info.get('bit_depth', 8))))
+            self.task_scheduler.submit('convert', (key, self.preview_proxy, mode, bit_depth), priority=tasks.PRIORITY_INTERACTIVE, coalesce_key='convert')
             
     def _handle_load_success(self):
-        self.stop_processing_indicator(f"Loaded: {os.path.basename(self.original_info.get('filepath', 'clipboard'))}")
+        self.stop_processing_indicator(self._with_stage_timings(f"Loaded: {os.path.basename(self.original_info.get('filepath', 'clipboard'))}", 'load'))
         self.info_var.set(self.original_info['display_text'])
         self.export_button.configure(state="disabled")
-        self.request_display_update('original') # THIS IS KEY - always show original first
+        self._update_views() # the original shows first; the preview follows its conversion
         self.update_preview()
 
-    def _handle_convert_success(self):
-        self.stop_processing_indicator("Enhanced preview ready.")
+    def _handle_convert_success(self, message="Enhanced preview ready."):
+        self.stop_processing_indicator(message)
         self.export_button.configure(state="normal")
         self.request_display_update('preview') # THEN update the preview
 
+    def _canvas(self, canvas_name):
+        return self.original_canvas if canvas_name == 'original' else self.preview_canvas
+
+    def _schedule_display_update(self, canvas_name):
+        if canvas_name in self.resize_jobs: self.after_cancel(self.resize_jobs[canvas_name])
+        self.resize_jobs[canvas_name] = self.after(RESIZE_DEBOUNCE_MS, lambda: (self.resize_jobs.pop(canvas_name, None), self.request_display_update(canvas_name)))
+
     def request_display_update(self, canvas_name):
-        # CORRECTED FUNCTION
-        image_to_display = None
-        if canvas_name == 'original' and self.original_image:
-            # For 'original', always use the original color image
-            image_to_display = self.original_image
-        elif canvas_name == 'preview' and self.preview_data is not None:
-            # For 'preview', use the grayscale numpy array
-            mode = 'I;16' if self.preview_data.dtype == np.uint16 else 'L'
-            image_to_display = Image.fromarray(self.preview_data, mode=mode)
-
-        canvas = self.original_canvas if canvas_name == 'original' else self.preview_canvas
-        if image_to_display:
-            self.task_queue.put(('resize_display', (canvas, image_to_display)))
-            
-    def start_processing_indicator(self, message):
+        # Canvas sizes are read here, on the UI thread; workers only get numbers and pyramids.
+        canvas = self._canvas(canvas_name)
+        canvas_size = (canvas.winfo_width(), canvas.winfo_height())
+        if self.view is None or canvas_size[0] <= 1 or canvas_size[1] <= 1: return
+        zoom, view_key = self.view.zoom_for(canvas_size), self.view.key(canvas_size)
+        if canvas_name == 'original':
+            source_key, render = (), (self.original_pyramid, None, None)
+        elif self.preview_data is None or self.preview_key[1] != self.image_token: return
+        elif zoom * self.original_image.size[0] <= self.preview_data.shape[1]:
+            # The converted proxy has enough detail for fitted and moderately zoomed views.
+            source_key = self.preview_key[2:]
+            render = (None, None, (('pyramid', self.image_token) + source_key, self.preview_data, self.preview_data.shape[1] / self.original_image.size[0]))
+        else:
+            # Zoomed in further, only the visible region is converted, straight from the source pyramid.
+            source_key = ('region', self.preview_key[2])
+            render = (self.original_pyramid, self.preview_key[2], None)
+        key = ('photo', self.image_token, canvas_name) + source_key + (view_key,)
+        self.display_keys[canvas_name] = key
+        cached = self.result_cache.get(key)
+        if cached is not None: self._update_canvas_image(canvas, *cached)
+        else: self.task_scheduler.submit('render_view', (key, canvas_name, render, zoom, self.view.center, canvas_size), priority=tasks.PRIORITY_DISPLAY, coalesce_key=('render', canvas_name))
+
+    def _show_rendered_view(self, key, canvas_name, image, position):
+        if key != self.display_keys.get(canvas_name): return # the view moved on while this was rendering
+        # PhotoImages are Tk objects, so they are only ever created on the UI thread.
+        photo_image = ImageTk.PhotoImage(image)
+        # Fitted views come back after every mode switch; zoomed ones rarely repeat exactly.
+        if key[-1][0] is None: self.result_cache.put(key, (photo_image, position))
+        self._update_canvas_image(self._canvas(canvas_name), photo_image, position)
+
+    def _update_views(self):
+        canvas_size = (self.original_canvas.winfo_width(), self.original_canvas.winfo_height())
+        zoom = self.view.zoom_for(canvas_size) if canvas_size[0] > 1 else None
+        self.zoom_var.set("" if zoom is None else f"Zoom {zoom:.0%}" + (" (fit)" if self.view.zoom is None else ""))
+        self.request_display_update('original')
+        self.request_display_update('preview')
+
+    def _on_zoom(self, event, zoom_in):
+        if self.view is None: return
+        canvas_size = (event.widget.winfo_width(), event.widget.winfo_height())
+        self.view.zoom_at(display.ZOOM_STEP if zoom_in else 1 / display.ZOOM_STEP, (event.x, event.y), canvas_size)
+        self._update_views()
+
+    def _on_zoom_toggle(self, event):
+        if self.view is None: return
+        canvas_size = (event.widget.winfo_width(), event.widget.winfo_height())
+        if self.view.zoom is None: self.view.zoom_at(1.0 / self.view.zoom_for(canvas_size), (event.x, event.y), canvas_size)
+        else: self.view.reset()
+        self._update_views()
+
+    def _on_pan(self, event):
+        if self.view is None or self.view.zoom is None or self.pan_anchor is None: return
+        canvas_size = (event.widget.winfo_width(), event.widget.winfo_height())
+        (x0, y0), before = self.pan_anchor, self.view.center
+        self.pan_anchor = (event.x, event.y)
+        self.view.pan(event.x - x0, event.y - y0, canvas_size)
+        # Slide what is drawn right away; the re-rendered viewport replaces it when ready.
+        dx, dy = ((b - a) * self.view.zoom for a, b in zip(self.view.center, before))
+        for canvas in (self.original_canvas, self.preview_canvas): canvas.move("all", dx, dy)
+        self._update_views()
+
+    def start_processing_indicator(self, message, cancellable=False):
         self.status_var.set(message)
         self.progress_bar.grid(row=0, column=1, sticky="e", pady=(5, 0))
         self.progress_bar.start()
+        if cancellable: self.cancel_button.grid(row=0, column=2, sticky="e", padx=(10, 0), pady=(5, 0))
 
     def stop_processing_indicator(self, message, color=None):
         self.status_var.set(message)
+        if self.export_token is not None: return # an export is still running in the background
         self.progress_bar.stop()
         self.progress_bar.grid_forget()
+        self.cancel_button.grid_forget()
 
-    def analyze_image_properties(self, image):
-        info = {'filepath': getattr(image, 'filename', 'clipboard'), 'size': image.size, 'mode': image.mode}
-        info['exif'] = image.info.get('exif')
-        info['icc_profile'] = image.info.get('icc_profile')
-        info['dpi'] = image.info.get('dpi')
-        try:
-            dtype_str = str(np.array(image).dtype)
-            if '16' in dtype_str: info['bit_depth'] = 16
-            elif '32' in dtype_str: info['bit_depth'] = 32
-            else: info['bit_depth'] = 8
-        except Exception:
-            if image.mode in ('I;16', 'I;16B', 'I;16L', 'I;16N', 'I;16LA') or (image.mode == 'LA' and image.getextrema()[0][1] > 255): info['bit_depth'] = 16
-            elif image.mode in ('I', 'F'): info['bit_depth'] = 32
-            else: info['bit_depth'] = 8
-        info['display_text'] = f"Size: {image.size[0]}×{image.size[1]} | Mode: {image.mode} | Bit Depth: {info['bit_depth']}-bit | {'ICC' if info['icc_profile'] else 'No ICC'}"
-        return info
-
-    def _update_canvas_image(self, canvas, photo_image):
-        if not photo_image: return
+    def _update_canvas_image(self, canvas, photo_image, position):
         canvas.delete("all")
         canvas.photo = photo_image
-        x = (canvas.winfo_width() - photo_image.width()) // 2
-        y = (canvas.winfo_height() - photo_image.height()) // 2
-        canvas.create_image(x, y, anchor='nw', image=photo_image)
+        canvas.create_image(*position, anchor='nw', image=photo_image)
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     if not HEIF_SUPPORT: print("WARNING: HEIF/HEIC support is not available. Please run 'pip install pillow-heif'.")
     root = TkinterDnD.Tk()
     root.withdraw()
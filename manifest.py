@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+MANIFEST_NAME = ".grayscale_manifest.json"
+MANIFEST_VERSION = 1
+STATUS_QUEUED, STATUS_DONE, STATUS_FAILED = "queued", "done", "failed"
+# Settings that change how a file is converted but not the output, so they don't invalidate it.
+OUTPUT_NEUTRAL_SETTINGS = ("threads",)
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''): digest.update(chunk)
+    return digest.hexdigest()
+
+def settings_hash(settings):
+    # A resolved ICC profile (bytes) counts by content, so editing the profile file invalidates outputs.
+    settings = {k: v for k, v in settings.items() if k not in OUTPUT_NEUTRAL_SETTINGS}
+    payload = json.dumps(settings, sort_keys=True, default=lambda v: hashlib.sha256(v).hexdigest() if isinstance(v, bytes) else str(v))
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+class BatchManifest:
+    """Per-output-folder record of batch items (input size, mtime, content hash, settings hash,
+    output path and status), so a re-run only converts new or changed inputs. Writes are
+    atomic and throttled to one every autosave_interval seconds, made on a timer thread so
+    that mark() never writes; call save() when done."""
+
+    def __init__(self, output_folder, autosave_interval=2.0):
+        self.path = os.path.join(output_folder, MANIFEST_NAME)
+        self.autosave_interval = autosave_interval
+        self.lock = threading.Lock()
+        self.items = {}
+        self.last_save = 0.0
+        self.dirty = False
+        self.save_timer = None
+        try:
+            with open(self.path, 'r') as f: data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION: self.items = data.get("items", {})
+        except (OSError, ValueError): pass
+
+    def is_up_to_date(self, in_path, out_path, settings):
+        with self.lock: entry = self.items.get(os.path.abspath(in_path))
+        if not entry or entry['status'] != STATUS_DONE or entry['settings_hash'] != settings_hash(settings): return False
+        if entry['output'] != os.path.abspath(out_path) or not os.path.exists(out_path): return False
+        try: st = os.stat(in_path)
+        except OSError: return False
+        if (st.st_size, st.st_mtime_ns) == (entry['size'], entry['mtime_ns']): return True
+        # Copied or touched files keep their content; only hash when the cheap check is inconclusive.
+        if st.st_size != entry['size'] or file_hash(in_path) != entry['hash']: return False
+        with self.lock:
+            entry['mtime_ns'] = st.st_mtime_ns
+            self.dirty = True
+        return True
+
+    def mark(self, in_path, out_path, settings, status, error=None, input_hash=None):
+        """Records an item. Done items need the input's file_hash: pass it as input_hash when
+        it was already taken (batch workers do), otherwise it is computed here."""
+        st = os.stat(in_path)
+        entry = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'settings_hash': settings_hash(settings),
+                 'output': os.path.abspath(out_path), 'status': status, 'updated': time.time()}
+        if status == STATUS_DONE: entry['hash'] = input_hash or file_hash(in_path)
+        if error: entry['error'] = str(error)
+        with self.lock:
+            self.items[os.path.abspath(in_path)] = entry
+            self.dirty = True
+            if self.save_timer is None:
+                delay = max(0.0, self.autosave_interval - (time.monotonic() - self.last_save))
+                self.save_timer = threading.Timer(delay, self._autosave)
+                self.save_timer.daemon = True
+                self.save_timer.start()
+
+    def _autosave(self):
+        with self.lock: self.save_timer = None
+        try: self.save()
+        except OSError: pass
+
+    def forget(self, paths):
+        with self.lock:
+            for path in paths:
+                if self.items.pop(os.path.abspath(path), None): self.dirty = True
+
+    def pending(self):
+        """Inputs that were queued or failed in an earlier run and still exist."""
+        with self.lock: return [path for path, entry in self.items.items() if entry['status'] != STATUS_DONE and os.path.isfile(path)]
+
+    def save(self):
+        with self.lock:
+            if not self.dirty: return
+            data = json.dumps({"version": MANIFEST_VERSION, "items": self.items}, indent=1)
+            self.dirty = False
+            self.last_save = time.monotonic()
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w') as f: f.write(data)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,186 @@
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+_NULL_STAGE = nullcontext()
+
+class _Stage:
+    __slots__ = ("profiler", "name", "args", "id", "parent", "start", "start_wall", "start_cpu", "start_mem", "peak", "cpu")
+
+    def __init__(self, profiler, name, args):
+        self.profiler, self.name, self.args = profiler, name, args
+
+    def __enter__(self):
+        self.profiler._open(self)
+        self.start_wall, self.start, self.start_cpu = time.time(), time.perf_counter(), time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall, cpu = time.perf_counter() - self.start, time.thread_time() - self.start_cpu
+        self.profiler._close(self, wall, cpu, exc_type)
+        return False
+
+class Profiler:
+    """Records wall time, CPU time and peak memory of named pipeline stages. While disabled,
+    stage() hands out one shared no-op context manager, so instrumented code pays for a
+    single attribute check. Stages may nest and may run on several threads at once: every
+    stage's peak is the highest traced allocation total (tracemalloc, which includes NumPy
+    buffers) seen while it was open, and its alloc figure is that peak minus the total when
+    it started."""
+
+    def __init__(self, max_events=100000):
+        self.enabled = False
+        self.max_events = max_events
+        self.lock = threading.Lock()
+        self.events = []
+        self.open_stages = set()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.started_tracing = False
+
+    def enable(self):
+        if self.enabled: return
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.started_tracing and not self.open_stages:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def stage(self, name, **args):
+        if not self.enabled: return _NULL_STAGE
+        return _Stage(self, name, args)
+
+    def _fold_peak(self):
+        # Called with the lock held whenever a stage opens or closes: the peak since the last
+        # call happened while exactly the currently open stages were open.
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (0, 0)
+        for stage in self.open_stages: stage.peak = max(stage.peak, peak)
+        if tracemalloc.is_tracing(): tracemalloc.reset_peak()
+        return current
+
+    def _open(self, stage, detached=False):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stage.parent = stack[-1].id if stack else None
+        if not detached: stack.append(stage)
+        with self.lock:
+            stage.id = next(self.ids)
+            stage.start_mem = stage.peak = self._fold_peak()
+            self.open_stages.add(stage)
+
+    def _close(self, stage, wall, cpu, exc_type, detached=False):
+        if not detached: self.local.stack.pop()
+        with self.lock:
+            self._fold_peak()
+            self.open_stages.discard(stage)
+            event = {"id": stage.id, "parent": stage.parent, "name": stage.name, "start": stage.start_wall, "wall": wall, "cpu": cpu,
+                     "peak_mb": stage.peak / 2**20, "alloc_mb": (stage.peak - stage.start_mem) / 2**20, "pid": os.getpid(), "thread": threading.get_ident()}
+            if stage.args: event["args"] = {k: str(v) for k, v in stage.args.items()}
+            if exc_type is not None: event["error"] = exc_type.__name__
+            self.events.append(event)
+            if len(self.events) > self.max_events: del self.events[:len(self.events) - self.max_events]
+
+    def begin(self, name, **args):
+        """Opens a stage that may span several threads, such as a pipelined batch job, and
+        returns it (None while disabled). Work run inside attach(stage), on any thread, nests
+        under it and adds its CPU time; end(stage) closes it."""
+        if not self.enabled: return None
+        stage = _Stage(self, name, args)
+        self._open(stage, detached=True)
+        stage.start_wall, stage.start, stage.cpu = time.time(), time.perf_counter(), 0.0
+        return stage
+
+    @contextmanager
+    def attach(self, stage):
+        if stage is None:
+            yield
+            return
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(stage)
+        start_cpu = time.thread_time()
+        try: yield
+        finally:
+            stack.pop()
+            stage.cpu += time.thread_time() - start_cpu
+
+    def end(self, stage, error=None):
+        if stage is not None: self._close(stage, time.perf_counter() - stage.start, stage.cpu, type(error) if error is not None else None, detached=True)
+
+    def extend(self, events):
+        """Adds events recorded in another process (see drain)."""
+        with self.lock: self.events.extend(events)
+
+    def drain(self):
+        with self.lock:
+            events, self.events = self.events, []
+        return events
+
+    def snapshot(self):
+        with self.lock: return list(self.events)
+
+    def clear(self):
+        with self.lock: self.events = []
+
+    def last(self, *names):
+        with self.lock: return next((e for e in reversed(self.events) if e["name"] in names), None)
+
+    def children(self, event):
+        with self.lock: return [e for e in self.events if e["parent"] == event["id"] and e["pid"] == event["pid"]]
+
+    def save(self, path):
+        """Writes the events as Chrome trace JSON when path ends in .trace or .trace.json
+        (chrome://tracing, Perfetto), and as plain JSON with a per-stage summary otherwise."""
+        events = self.snapshot()
+        if path.endswith((".trace", ".trace.json")): data = chrome_trace(events)
+        else: data = {"summary": summarize(events), "events": events}
+        with open(path, "w") as f: json.dump(data, f, indent=1)
+
+def summarize(events):
+    """Per-stage totals, slowest first: count, wall/CPU seconds and the highest peak."""
+    stages = {}
+    for e in events:
+        s = stages.setdefault(e["name"], {"name": e["name"], "count": 0, "wall": 0.0, "cpu": 0.0, "max_wall": 0.0, "peak_mb": 0.0, "errors": 0})
+        s["count"] += 1
+        s["wall"] += e["wall"]
+        s["cpu"] += e["cpu"]
+        s["max_wall"] = max(s["max_wall"], e["wall"])
+        s["peak_mb"] = max(s["peak_mb"], e["peak_mb"])
+        s["errors"] += "error" in e
+    return sorted(stages.values(), key=lambda s: -s["wall"])
+
+def format_summary(events):
+    lines = [f"{'Stage':<16}{'Count':>7}{'Wall s':>10}{'Mean ms':>10}{'CPU s':>10}{'Peak MB':>10}"]
+    for s in summarize(events):
+        lines.append(f"{s['name']:<16}{s['count']:>7}{s['wall']:>10.3f}{s['wall'] / s['count'] * 1000:>10.1f}{s['cpu']:>10.3f}{s['peak_mb']:>10.1f}")
+    return "\n".join(lines)
+
+def format_breakdown(event, children):
+    parts = ", ".join(f"{c['name']} {c['wall']:.2f}s" for c in children)
+    return f"{event['name']} {event['wall']:.2f}s" + (f" ({parts})" if parts else "") + f", peak {event['peak_mb']:.0f} MB"
+
+def chrome_trace(events):
+    trace = [{"name": e["name"], "cat": "stage", "ph": "X", "ts": e["start"] * 1e6, "dur": e["wall"] * 1e6, "pid": e["pid"], "tid": e["thread"],
+              "args": dict(e.get("args", {}), cpu_ms=round(e["cpu"] * 1000, 3), peak_mb=round(e["peak_mb"], 2), alloc_mb=round(e["alloc_mb"], 2))}
+             for e in events]
+    return {"traceEvents": trace, "displayTimeUnit": "ms"}
+
+PROFILER = Profiler()
+
+def stage(name, **args):
+    return PROFILER.stage(name, **args)
+
+def profiled_job(job_fn, parent_pid, in_path, out_path, settings):
+    """Runs a batch job under a batch_process stage. In a worker process the events are
+    returned for the parent to merge; in a worker thread they are already in place."""
+    in_worker_process = os.getpid() != parent_pid
+    if in_worker_process: PROFILER.enable()
+    with PROFILER.stage("batch_process", path=os.path.basename(in_path)): job_fn(in_path, out_path, settings)
+    return PROFILER.drain() if in_worker_process else []
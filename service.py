@@ -0,0 +1,385 @@
+import argparse
+import collections
+import ipaddress
+import json
+import os
+import socketserver
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import numpy as np
+from PIL import UnidentifiedImageError
+
+import batch
+import engine
+import icc
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Requests allowed to wait for a worker on top of the ones being converted; more get 503.
+DEFAULT_MAX_QUEUED = 32
+DEFAULT_MAX_UPLOAD = 512 * 2**20
+SETTINGS_HEADER = "X-Grayscale-Settings"
+# Latencies kept for the percentiles reported by /metrics.
+LATENCY_WINDOW = 1000
+CONTENT_TYPES = {".png": "image/png", ".tiff": "image/tiff", ".tif": "image/tiff", ".jpeg": "image/jpeg", ".jpg": "image/jpeg",
+                 ".webp": "image/webp", ".bmp": "image/bmp", ".heic": "image/heic", ".heif": "image/heif"}
+# Magic bytes of uploads whose decoder is chosen by file name (mapped TIFF, EXR, HEIF); Pillow sniffs the rest.
+_MAGIC_SUFFIXES = ((b"II*\x00", ".tif"), (b"MM\x00*", ".tif"), (b"II+\x00", ".tif"), (b"MM\x00+", ".tif"), (b"v/1\x01", ".exr"), (b"8BPS", ".psd"))
+
+class RequestError(Exception):
+    """A request the service refuses; status is the HTTP status it is answered with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def warm_worker():
+    """Pays a worker's one-time costs up front: codec imports and the cached conversion tables
+    (per-channel LUTs, the Gamma quantiser) of every mode at both output bit depths."""
+    for load in (engine.get_tifffile, engine.heif_support):
+        try: load()
+        except ImportError: pass
+    for dtype in (np.uint8, np.uint16):
+        for mode in engine.GRAYSCALE_MODES:
+            for bit_depth in (8, 16):
+                for kernel in ("auto", "lut"): engine.convert_rgb_array(np.zeros((1, 1, 3), dtype=dtype), mode, bit_depth, kernel)
+
+def _init_worker_process():
+    batch._ignore_interrupts()
+    warm_worker()
+
+def _ping():
+    return os.getpid()
+
+def _upload_suffix(data):
+    for magic, suffix in _MAGIC_SUFFIXES:
+        if data.startswith(magic): return suffix
+    if data[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1", b"ftyphevc"): return ".heic"
+    return ""
+
+def convert_path_job(in_path, out_path, settings):
+    start = time.perf_counter()
+    engine.process_file(in_path, out_path, settings)
+    return time.perf_counter() - start
+
+def convert_bytes_job(source, settings):
+    """Converts a file path or uploaded image bytes and returns the encoded output. Uploads and
+    output go through a private temporary folder, so every path of process_file (mapping,
+    streaming, frames) applies to them."""
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory(prefix="grayscale-") as folder:
+        in_path, out_path = source, os.path.join(folder, "output" + settings["format"])
+        if isinstance(source, bytes):
+            in_path = os.path.join(folder, "input" + _upload_suffix(source))
+            with open(in_path, "wb") as f: f.write(source)
+        engine.process_file(in_path, out_path, settings)
+        with open(out_path, "rb") as f: return f.read(), time.perf_counter() - start
+
+def _integer(low, high):
+    return lambda value: isinstance(value, int) and not isinstance(value, bool) and low <= value <= high, f"an integer from {low} to {high}"
+
+def _choice(values):
+    return lambda value: isinstance(value, str) and value in values, "one of " + ", ".join(map(str, values))
+
+_FLAG = (lambda value: isinstance(value, bool), "true or false")
+# What every setting a request may carry must look like, as (check, description).
+SETTING_CHECKS = {
+    "format": (lambda value: isinstance(value, str) and (value if value.startswith(".") else "." + value) in engine.FORMAT_MAP, "one of " + ", ".join(engine.FORMAT_MAP)),
+    "conversion_mode": _choice(engine.GRAYSCALE_MODES),
+    "bit_depth": (lambda value: value in (8, 16, engine.FLOAT_BIT_DEPTH) and not isinstance(value, bool), f"8, 16 or {engine.FLOAT_BIT_DEPTH}"),
+    "size": (lambda value: isinstance(value, (list, tuple)) and len(value) == 2 and all(_integer(1, 2**31 - 1)[0](v) for v in value), "[width, height] in pixels"),
+    "dpi": _integer(1, 65535),
+    "icc_profile_path": (lambda value: isinstance(value, str), "a profile name, builtin: reference or file"),
+    "preserve_alpha": _FLAG, "strip_metadata": _FLAG, "streaming": _FLAG, "all_frames": _FLAG,
+    "kernel": _choice(engine.KERNELS),
+    "transfer": _choice(engine.TRANSFERS),
+    "resample": _choice(engine.RESAMPLE_ORDERS),
+    "threads": _integer(1, 1024),
+    "band_rows": _integer(1, 2**20),
+    "quality": _integer(0, 100),
+    "subsampling": _integer(0, 2),
+    "png_compress_level": _integer(0, 9),
+    "png_strategy": _choice(list(engine.PNG_STRATEGIES)),
+    "tiff_compression": _choice(engine.TIFF_COMPRESSIONS),
+    "webp_method": _integer(0, 6),
+}
+
+def request_settings(settings, workers, allows_path=None):
+    """Export settings of a request, in the schema of AdvancedExportDialog.get_settings plus
+    conversion_mode, with the same defaults as the command line. Null means unset. Raises
+    RequestError(400) for unknown settings and values of the wrong type or range. An ICC
+    profile is a registry name or builtin: reference; a file path is only accepted where
+    allows_path(path) is true (403 otherwise, before the file is looked at)."""
+    if not isinstance(settings, dict): raise RequestError(400, "settings must be a JSON object")
+    settings = {name: value for name, value in settings.items() if value is not None}
+    for name, value in settings.items():
+        if name not in SETTING_CHECKS: raise RequestError(400, f"Unknown setting {name!r}")
+        check, expected = SETTING_CHECKS[name]
+        if not check(value): raise RequestError(400, f"Setting {name!r} must be {expected}, not {value!r}")
+    # Like batches, concurrent requests share the cores instead of each taking all of them.
+    settings = engine.headless_settings(settings, workers)
+    profile = settings.get("icc_profile_path")
+    if profile and not profile.startswith(icc.BUILTIN_PREFIX) and profile not in icc.REGISTRY.profiles():
+        if not (allows_path and allows_path(profile)): raise RequestError(403, "ICC profile files must lie under the --allow-paths folders; use a profile name or a builtin: reference")
+    if profile:
+        try: settings["icc_profile_path"] = icc.REGISTRY.resolve(profile)
+        except ValueError as e: raise RequestError(400, str(e))
+    try: return icc.with_resolved_profile(settings)
+    except (OSError, ValueError) as e: raise RequestError(400, f"ICC profile: {e}")
+
+class ServiceMetrics:
+    """Counters and latencies of the service, safe to update from every request thread."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.queued = self.running = 0
+        self.bytes_in = self.bytes_out = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self.waits = collections.deque(maxlen=LATENCY_WINDOW)
+
+    def add(self, **changes):
+        with self.lock:
+            for name, delta in changes.items():
+                if name in ("queued", "running", "bytes_in", "bytes_out"): setattr(self, name, getattr(self, name) + delta)
+                else: self.counts[name] += delta
+
+    def record(self, wait, latency):
+        with self.lock:
+            self.waits.append(wait)
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        def summary(values):
+            if not values: return None
+            ordered = sorted(values)
+            return {"mean": statistics.fmean(ordered), "p50": ordered[len(ordered) // 2], "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], "max": ordered[-1]}
+        with self.lock:
+            return {"uptime_s": time.time() - self.started, "requests": dict(self.counts), "queued": self.queued, "running": self.running,
+                    "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "queue_wait_s": summary(self.waits), "latency_s": summary(self.latencies)}
+
+class ConversionService:
+    """Runs conversion requests on a pool of pre-warmed workers. At most `workers` requests
+    convert at once and at most max_queued more wait for a slot; beyond that submit() raises
+    RequestError(503) at once, so callers can back off instead of piling up."""
+
+    def __init__(self, workers=None, use_processes=True, max_queued=DEFAULT_MAX_QUEUED):
+        self.workers = workers or batch.default_workers()
+        self.use_processes = use_processes
+        self.max_queued = max_queued
+        self.pending = threading.BoundedSemaphore(self.workers + max_queued)
+        self.slots = threading.BoundedSemaphore(self.workers)
+        self.metrics = ServiceMetrics()
+        self.pool_lock = threading.Lock()
+        self.pool = None
+        self.warm = False
+
+    def start(self):
+        """Starts the pool and waits until every worker has warmed up."""
+        with self.pool_lock: self.pool = self._new_pool()
+        if self.use_processes: [future.result() for future in [self.pool.submit(_ping) for _ in range(self.workers)]]
+        else: warm_worker()
+        self.warm = True
+
+    def _new_pool(self):
+        if self.use_processes: return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker_process)
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="convert-request")
+
+    def stop(self):
+        with self.pool_lock:
+            if self.pool: self.pool.shutdown(wait=True, cancel_futures=True)
+            self.pool = None
+
+    def submit(self, job_fn, *args):
+        """Runs job_fn(*args) on a worker and returns its result."""
+        if not self.pending.acquire(blocking=False):
+            self.metrics.add(rejected=1)
+            raise RequestError(503, "Conversion queue is full; retry later.")
+        self.metrics.add(accepted=1, queued=1)
+        received = time.perf_counter()
+        try:
+            with self.slots:
+                self.metrics.add(queued=-1, running=1)
+                wait = time.perf_counter() - received
+                try: result = self._run(job_fn, args)
+                finally: self.metrics.add(running=-1)
+        except BaseException:
+            self.metrics.add(failed=1)
+            raise
+        finally:
+            self.pending.release()
+        self.metrics.add(completed=1)
+        self.metrics.record(wait, time.perf_counter() - received)
+        return result
+
+    def _run(self, job_fn, args):
+        with self.pool_lock: pool = self.pool
+        if pool is None: raise RequestError(503, "Service is shutting down.")
+        try: return pool.submit(job_fn, *args).result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed for memory); replace the pool so later requests still run.
+            with self.pool_lock:
+                if self.pool is pool: self.pool = self._new_pool()
+            raise RequestError(500, "The worker converting this request died.")
+
+    def health(self):
+        return {"status": "ok" if self.warm and self.pool is not None else "starting", "workers": self.workers,
+                "processes": self.use_processes, "max_queued": self.max_queued}
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP front end: GET /health, GET /metrics, POST /convert. A JSON body
+    {"input": path, "output": path, "settings": {...}} converts files under the server's
+    path_roots; any other body is image bytes, converted with the settings JSON in the
+    X-Grayscale-Settings header and answered with the encoded output. JSON requests without
+    "output" are answered with bytes as well."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "GrayscaleService/1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def address_string(self):
+        # Unix socket peers have no address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        if not self.server.quiet: super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=()):
+        if not isinstance(body, bytes): body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers: self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/health": self._send(200 if self.service.warm else 503, self.service.health())
+        elif path == "/metrics": self._send(200, dict(self.service.metrics.snapshot(), **self.service.health()))
+        else: self._send(404, {"error": f"No such endpoint: {path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/convert":
+            self._send(404, {"error": f"No such endpoint: {self.path}"})
+            return
+        try: self._send(*self._convert())
+        except RequestError as e: self._send(e.status, {"error": str(e)}, headers=[("Retry-After", "1")] if e.status == 503 else ())
+        except UnidentifiedImageError as e: self._send(415, {"error": str(e)})
+        except Exception as e: self._send(500, {"error": f"{type(e).__name__}: {e}"})
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > self.server.max_upload: raise RequestError(413, f"Request body exceeds {self.server.max_upload} bytes")
+        body = self.rfile.read(length)
+        self.service.metrics.add(bytes_in=len(body))
+        return body
+
+    def _convert(self):
+        body = self._read_body()
+        workers = self.service.workers
+        if self.headers.get("Content-Type", "").startswith("application/json"):
+            if not self.server.path_roots: raise RequestError(403, "Path requests are disabled; start the service with --allow-paths ROOT.")
+            try: request = json.loads(body)
+            except ValueError as e: raise RequestError(400, f"Invalid JSON: {e}")
+            if not isinstance(request, dict): raise RequestError(400, "The JSON body must be an object")
+            settings = request_settings(request.get("settings", {}), workers, self.server.allows_path)
+            in_path, out_path = request.get("input"), request.get("output")
+            for name, path in (("input", in_path), ("output", out_path)):
+                if path is not None and not isinstance(path, str): raise RequestError(400, f"{name!r} must be a path")
+                if path and not self.server.allows_path(path): raise RequestError(403, f"{name!r} is outside the allowed folders: {path}")
+            if not in_path or not os.path.isfile(in_path): raise RequestError(404, f"No such input file: {in_path}")
+            if out_path:
+                os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+                seconds = self.service.submit(convert_path_job, in_path, out_path, settings)
+                return 200, {"output": out_path, "seconds": seconds}
+            source = in_path
+        else:
+            try: settings = request_settings(json.loads(self.headers.get(SETTINGS_HEADER) or "{}"), workers, self.server.allows_path)
+            except ValueError as e: raise RequestError(400, f"Invalid {SETTINGS_HEADER} header: {e}")
+            if not body: raise RequestError(400, "Empty request body")
+            source = body
+        data, seconds = self.service.submit(convert_bytes_job, source, settings)
+        self.service.metrics.add(bytes_out=len(data))
+        return 200, data, CONTENT_TYPES.get(settings["format"], "application/octet-stream"), [("X-Conversion-Seconds", f"{seconds:.4f}")]
+
+class _ServerOptions:
+    """What both servers hand their ServiceHandler. JSON path requests may only name files under
+    path_roots (after resolving symlinks); with no roots they are refused."""
+
+    def _set_options(self, service, max_upload, quiet, path_roots):
+        self.service, self.max_upload, self.quiet = service, max_upload, quiet
+        self.path_roots = [os.path.realpath(root) for root in path_roots or ()]
+
+    def allows_path(self, path):
+        real = os.path.realpath(path)
+        return any(os.path.commonpath([real, root]) == root for root in self.path_roots)
+
+class ServiceServer(_ServerOptions, ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service, max_upload=DEFAULT_MAX_UPLOAD, quiet=False, path_roots=None):
+        self._set_options(service, max_upload, quiet, path_roots)
+        super().__init__(address, ServiceHandler)
+
+class UnixServiceServer(_ServerOptions, socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, service, max_upload=DEFAULT_MAX_UPLOAD, quiet=False, path_roots=None):
+        self._set_options(service, max_upload, quiet, path_roots)
+        if os.path.exists(path): os.remove(path)
+        super().__init__(path, ServiceHandler)
+
+def is_loopback(host):
+    if host == "localhost": return True
+    try: return ipaddress.ip_address(host).is_loopback
+    except ValueError: return False
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="grayscale-service", description="Long-running local conversion service with a pre-warmed worker pool.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default: {DEFAULT_HOST}; only local clients).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT}).")
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of TCP.")
+    parser.add_argument("-j", "--jobs", type=int, default=batch.default_workers(), help="Worker count, i.e. conversions running at once (default: CPU count).")
+    parser.add_argument("--threads", action="store_true", help="Use worker threads instead of processes.")
+    parser.add_argument("--max-queued", type=int, default=DEFAULT_MAX_QUEUED, help=f"Requests allowed to wait for a worker; more are refused with 503 (default: {DEFAULT_MAX_QUEUED}).")
+    parser.add_argument("--max-upload", type=int, default=DEFAULT_MAX_UPLOAD // 2**20, help="Largest accepted request body, in MiB.")
+    parser.add_argument("--icc-dir", action="append", help="Extra folder searched for ICC profiles by name (repeatable).")
+    parser.add_argument("--allow-paths", action="append", metavar="ROOT", help="Accept JSON requests that read and write files under this folder (repeatable); without it only uploads are converted.")
+    parser.add_argument("--allow-remote", action="store_true", help="Allow a --host that is not a loopback address. The service has no authentication.")
+    parser.add_argument("--quiet", action="store_true", help="Don't log every request.")
+    args = parser.parse_args(argv)
+    if not args.socket and not args.allow_remote and not is_loopback(args.host): parser.error(f"--host {args.host} is reachable from other machines; pass --allow-remote to listen on it anyway")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.icc_dir: icc.REGISTRY.add_dirs(args.icc_dir)
+    service = ConversionService(workers=args.jobs, use_processes=not args.threads, max_queued=args.max_queued)
+    print(f"Warming {service.workers} worker {'processes' if service.use_processes else 'threads'}...")
+    service.start()
+    if args.socket: server = UnixServiceServer(args.socket, service, args.max_upload * 2**20, args.quiet, args.allow_paths)
+    else: server = ServiceServer((args.host, args.port), service, args.max_upload * 2**20, args.quiet, args.allow_paths)
+    print(f"Listening on {args.socket or f'http://{args.host}:{server.server_address[1]}'}; Ctrl+C to stop.")
+    try: server.serve_forever()
+    except KeyboardInterrupt: print("Stopping; waiting for running conversions...")
+    finally:
+        server.server_close()
+        service.stop()
+        if args.socket and os.path.exists(args.socket): os.remove(args.socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+import os
+import struct
+import zlib
+from pathlib import Path
+from PIL import Image
+import numpy as np
+
+import engine
+import icc
+
+# Rows converted at a time; peak memory is roughly band_rows * width * 40 bytes
+# plus one decoded strip/tile row of the source.
+DEFAULT_BAND_ROWS = 256
+STREAM_FORMATS = (".png", ".tif", ".tiff")
+TIFF_EXTENSIONS = (".tif", ".tiff")
+
+class TiffBandReader:
+    """Reads row bands from a strip- or tile-organised TIFF, decoding only the
+    segments that cover the requested rows."""
+
+    def __init__(self, path):
+        tifffile = engine.get_tifffile()
+        self.tif = tifffile.TiffFile(path)
+        page = self.tif.pages[0]
+        self.page = page
+        self.height, self.width = page.imagelength, page.imagewidth
+        self.planes, self.samples = page.shaped[0], page.shaped[4]
+        self.channels = self.planes * self.samples
+        self.dtype = page.dtype
+        if page.shaped[1] != 1: raise ValueError("Volumetric TIFFs cannot be streamed.")
+        if self.dtype not in engine.SAMPLE_DTYPES: raise ValueError(f"Unsupported TIFF sample type {self.dtype}")
+        photometric = int(page.photometric)
+        if not (photometric in (1, 2) and (self.channels in (1, 2) if photometric == 1 else self.channels in (3, 4))):
+            raise ValueError(f"Unsupported TIFF layout: photometric {page.photometric!r} with {self.channels} samples")
+        self.segment_rows = page.tilelength if page.is_tiled else min(page.rowsperstrip, self.height)
+        self.segment_cols = page.tilewidth if page.is_tiled else self.width
+        self.grid_rows = -(-self.height // self.segment_rows)
+        self.grid_cols = -(-self.width // self.segment_cols)
+        self.decodeargs = {'_fullsize': page.is_tiled}
+        if page.compression in (6, 7, 34892, 33007):
+            self.decodeargs.update(jpegtables=page.jpegtables, jpegheader=page.jpegheader)
+        tag = page.tags.get('InterColorProfile')
+        self.info = {'filepath': str(path), 'size': (self.width, self.height), 'mode': 'TIFF',
+                     'bit_depth': self.dtype.itemsize * 8, 'float': self.dtype.kind == 'f',
+                     'icc_profile': bytes(tag.value) if tag is not None else None, 'dpi': None}
+        self._cached_row, self._cached = None, None
+
+    def _segment_row(self, row):
+        if row == self._cached_row: return self._cached
+        out = np.zeros((min(self.segment_rows, self.height - row * self.segment_rows), self.width, self.channels), dtype=self.dtype)
+        fh, page = self.tif.filehandle, self.page
+        for plane in range(self.planes):
+            for col in range(self.grid_cols):
+                index = (plane * self.grid_rows + row) * self.grid_cols + col
+                if not page.databytecounts[index]: continue
+                with fh.lock:
+                    fh.seek(page.dataoffsets[index])
+                    data = fh.read(page.databytecounts[index])
+                segment, (_, _, y, x, _), _ = page.decode(data, index, **self.decodeargs)
+                segment = segment[0]
+                h, w = min(segment.shape[0], out.shape[0]), min(segment.shape[1], self.width - x)
+                out[:h, x:x + w, plane * self.samples:(plane + 1) * self.samples] = segment[:h, :w]
+        self._cached_row, self._cached = row, out
+        return out
+
+    def read_rows(self, y0, y1):
+        first, last = y0 // self.segment_rows, (y1 - 1) // self.segment_rows
+        if first == last:
+            base = first * self.segment_rows
+            return self._segment_row(first)[y0 - base:y1 - base]
+        parts = []
+        for row in range(first, last + 1):
+            base = row * self.segment_rows
+            parts.append(self._segment_row(row)[max(y0 - base, 0):min(y1 - base, self.segment_rows)])
+        return np.concatenate(parts)
+
+    def close(self):
+        self.tif.close()
+
+class PilBandReader:
+    """Fallback for sources without random row access: decodes once, then hands
+    out row bands so that conversion and encoding still run band by band."""
+
+    def __init__(self, source):
+        if isinstance(source, (str, Path)):
+            if Path(source).suffix.lower() in engine.HEIF_EXTENSIONS: engine.heif_support()
+            source = engine.load_exr(source) if Path(source).suffix.lower() in engine.EXR_EXTENSIONS else Image.open(source)
+        self.image = source
+        self.width, self.height = self.image.size
+        self._rgb = self._alpha = self._info = None
+
+    def _decode(self):
+        if self._rgb is None:
+            self.image, self._info = engine.load_image(self.image)
+            self._rgb, self._alpha = engine.image_to_array(self.image)
+
+    @property
+    def info(self):
+        self._decode()
+        return self._info
+
+    @property
+    def channels(self):
+        self._decode()
+        return 3 if self._alpha is None else 4
+
+    def read_rows(self, y0, y1):
+        self._decode()
+        band = self._rgb[y0:y1]
+        return band if self._alpha is None else np.concatenate([band, self._alpha[y0:y1, :, None]], axis=2)
+
+    def close(self):
+        pass
+
+def open_band_reader(source):
+    if isinstance(source, (str, Path)) and Path(source).suffix.lower() in TIFF_EXTENSIONS:
+        try: return TiffBandReader(source)
+        except (ValueError, NotImplementedError): pass
+    return PilBandReader(source)
+
+def can_stream(reader, out_path, settings):
+    if Path(out_path).suffix.lower() not in STREAM_FORMATS: return False
+    # PNG has no float samples; save_image reports that.
+    if Path(out_path).suffix.lower() == ".png" and settings.get("bit_depth") == engine.FLOAT_BIT_DEPTH: return False
+    if Path(out_path).suffix.lower() in TIFF_EXTENSIONS:
+        # Without imagecodecs only Pillow can write LZW/Zstandard, and only the whole frame at once.
+        try: engine.tifffile_compression(settings.get("tiff_compression"))
+        except ImportError: return False
+    size = settings.get("size")
+    return not size or tuple(size) == (reader.width, reader.height)
+
+def iter_gray_bands(reader, mode, target_bit_depth, keep_alpha, band_rows=DEFAULT_BAND_ROWS, kernel=engine.DEFAULT_KERNEL, cancel_token=None, transfer=engine.DEFAULT_TRANSFER):
+    for y0 in range(0, reader.height, band_rows):
+        if cancel_token: cancel_token.check()
+        band = reader.read_rows(y0, min(y0 + band_rows, reader.height))
+        channels = band.shape[2]
+        rgb = band[:, :, :3] if channels >= 3 else np.repeat(band[:, :, :1], 3, axis=2)
+        gray = engine.convert_rgb_array(rgb, mode, target_bit_depth, kernel, transfer=transfer)
+        alpha = engine.alpha_samples(band[:, :, channels - 1], target_bit_depth) if keep_alpha and channels in (2, 4) else None
+        yield gray, alpha
+
+def _png_chunk(f, tag, data):
+    f.write(struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+def write_png_bands(filepath, bands, width, height, bit_depth, has_alpha, icc_profile=None, dpi=None, compress_level=engine.DEFAULT_PNG_COMPRESS_LEVEL, strategy="default"):
+    color_type = 4 if has_alpha else 0
+    prev = None
+    compressor = zlib.compressobj(compress_level, zlib.DEFLATED, 15, 8, engine.PNG_STRATEGIES[strategy])
+    with open(filepath, 'wb') as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        _png_chunk(f, b"IHDR", struct.pack(">IIBBBBB", width, height, bit_depth, color_type, 0, 0, 0))
+        if icc_profile: _png_chunk(f, b"iCCP", b"ICC Profile\x00\x00" + zlib.compress(icc_profile))
+        if dpi:
+            ppm = int(round(dpi / 0.0254))
+            _png_chunk(f, b"pHYs", struct.pack(">IIB", ppm, ppm, 1))
+        for gray, alpha in bands:
+            samples = gray if not has_alpha else np.stack([gray, alpha], axis=-1)
+            raw = samples.astype(">u2" if bit_depth == 16 else np.uint8, copy=False).reshape(gray.shape[0], -1).view(np.uint8)
+            # PNG "Up" filter: each row minus the row above, computed for the whole band at once.
+            filtered = np.empty((raw.shape[0], raw.shape[1] + 1), dtype=np.uint8)
+            filtered[:, 0] = 2
+            np.subtract(raw[:1], prev if prev is not None else 0, out=filtered[:1, 1:], casting='unsafe')
+            np.subtract(raw[1:], raw[:-1], out=filtered[1:, 1:])
+            prev = raw[-1].copy()
+            data = compressor.compress(filtered.tobytes())
+            if data: _png_chunk(f, b"IDAT", data)
+        _png_chunk(f, b"IDAT", compressor.flush())
+        _png_chunk(f, b"IEND", b"")
+
+def _strip_encoder(compression):
+    # tifffile takes streamed strips as bytes that are already compressed.
+    if compression in (None, "none"): return None
+    if compression == "deflate": return zlib.compress
+    engine.tifffile_compression(compression)
+    import imagecodecs
+    return imagecodecs.lzw_encode if compression == "lzw" else imagecodecs.zstd_encode
+
+def write_tiff_bands(filepath, bands, width, height, bit_depth, has_alpha, icc_profile=None, dpi=None, band_rows=DEFAULT_BAND_ROWS, compression=None):
+    tifffile = engine.get_tifffile()
+    dtype = {16: np.uint16, engine.FLOAT_BIT_DEPTH: np.float32}.get(bit_depth, np.uint8)
+    shape = (height, width, 2) if has_alpha else (height, width)
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    encode = _strip_encoder(compression)
+    strips = (gray.tobytes() if alpha is None else np.stack([gray, alpha], axis=-1).tobytes() for gray, alpha in bands)
+    if encode: strips = map(encode, strips)
+    with tifffile.TiffWriter(filepath, bigtiff=nbytes > 2**32 - 2**25) as tif:
+        tif.write(strips, shape=shape, dtype=dtype, photometric="minisblack", rowsperstrip=band_rows, metadata=None, compression=engine.tifffile_compression(compression),
+                  extrasamples=["unassalpha"] if has_alpha else None, iccprofile=icc_profile,
+                  resolution=(dpi, dpi) if dpi else None, resolutionunit="INCH" if dpi else None)
+
+def stream_convert(reader, out_path, settings, band_rows=None, cancel_token=None):
+    band_rows = band_rows or settings.get("band_rows", DEFAULT_BAND_ROWS)
+    file_ext = Path(out_path).suffix.lower()
+    source_info = reader.info
+    bit_depth = settings.get("bit_depth") or engine.default_bit_depth(source_info, settings.get("format", file_ext))
+    has_alpha = bool(settings.get("preserve_alpha")) and reader.channels in (2, 4)
+    icc_profile = icc.output_profile(settings, source_info)
+    dpi = None if settings.get("strip_metadata", False) else settings.get("dpi")
+    bands = iter_gray_bands(reader, settings['conversion_mode'], bit_depth, has_alpha, band_rows, settings.get('kernel', engine.DEFAULT_KERNEL), cancel_token,
+                            settings.get('transfer', engine.DEFAULT_TRANSFER))
+    try:
+        if file_ext == ".png":
+            write_png_bands(out_path, bands, reader.width, reader.height, bit_depth, has_alpha, icc_profile, dpi,
+                            settings.get("png_compress_level", engine.DEFAULT_PNG_COMPRESS_LEVEL), settings.get("png_strategy", "default"))
+        else: write_tiff_bands(out_path, bands, reader.width, reader.height, bit_depth, has_alpha, icc_profile, dpi, band_rows, settings.get("tiff_compression"))
+    except BaseException:
+        # A half-written file is unreadable; don't leave it behind.
+        if os.path.exists(out_path): os.remove(out_path)
+        raise
+    return out_path
+
+def stream_convert_file(in_path, out_path, settings):
+    """Converts in_path band by band when the output format allows it. Returns None
+    when the job needs the full-frame path (resizing or a non-streamable format)."""
+    reader = open_band_reader(in_path)
+    try:
+        if not can_stream(reader, out_path, settings): return None
+        return stream_convert(reader, out_path, settings)
+    finally:
+        reader.close()
@@ -0,0 +1,63 @@
+import heapq
+import itertools
+import threading
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_DISPLAY = 1
+PRIORITY_BACKGROUND = 2
+
+class TaskCancelled(Exception):
+    pass
+
+class CancelToken:
+    """Handed to every scheduled task; long-running work calls check() between stages."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def check(self):
+        if self._event.is_set(): raise TaskCancelled()
+
+class TaskScheduler:
+    """Priority queue of (task_type, data) work items. Submitting with a coalesce_key
+    cancels the previous task with the same key, whether it is still queued or
+    already running, so only the newest request of that kind survives."""
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._latest = {}
+
+    def submit(self, task_type, data, priority=PRIORITY_BACKGROUND, coalesce_key=None):
+        token = CancelToken()
+        with self._cond:
+            if coalesce_key is not None:
+                previous = self._latest.get(coalesce_key)
+                if previous: previous.cancel()
+                self._latest[coalesce_key] = token
+            heapq.heappush(self._heap, (priority, next(self._counter), task_type, data, token))
+            self._cond.notify()
+        return token
+
+    def cancel(self, coalesce_key):
+        with self._cond:
+            token = self._latest.pop(coalesce_key, None)
+        if token: token.cancel()
+
+    def get(self):
+        with self._cond:
+            while True:
+                while not self._heap: self._cond.wait()
+                _, _, task_type, data, token = heapq.heappop(self._heap)
+                if not token.cancelled: return task_type, data, token
+
+    def pending(self):
+        with self._cond: return sum(1 for entry in self._heap if not entry[4].cancelled)
@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import engine
+
+def _frame(seed):
+    # Just above MIN_THREADED_PIXELS, so threads > 1 splits the frame into bands.
+    return np.random.default_rng(seed).integers(0, 65535, (1030, 1024, 3), dtype=np.uint16, endpoint=True)
+
+@pytest.mark.parametrize("mode", ["Rec. 709", "Gamma", "L*a*b* (L*)"])
+def test_concurrent_banded_conversions_match_single_threaded(mode):
+    frames = [_frame(seed) for seed in range(6)]
+    expected = [engine.convert_rgb_array(rgb, mode, 16, "lut") for rgb in frames]
+    # Several threaded conversions at once, each with its own thread count, as batch workers run them.
+    with ThreadPoolExecutor(max_workers=len(frames)) as pool:
+        results = list(pool.map(lambda args: engine.convert_rgb_array(args[1], mode, 16, "lut", threads=2 + args[0] % 3), enumerate(frames)))
+    for result, reference in zip(results, expected): np.testing.assert_array_equal(result, reference)
@@ -0,0 +1,25 @@
+import os
+import queue
+import time
+
+import batch
+
+def _job(in_path, out_path, settings):
+    # A worker killed mid-job (as by the OOM killer) takes its process down with it.
+    if in_path == "crash": os._exit(1)
+    time.sleep(0.05)
+
+def _collect(results, count, timeout=30):
+    return [results.get(timeout=timeout) for _ in range(count)]
+
+def test_crashed_worker_fails_its_job_and_the_batch_finishes():
+    results = queue.Queue()
+    scheduler = batch.BatchScheduler(results, workers=2, use_processes=True, job_fn=_job)
+    paths = ["a", "b", "crash", "c", "d", "e", "f", "g"]
+    scheduler.start((path, path + ".png", {}) for path in paths)
+    outcomes = dict((data if kind == 'batch_item_success' else data[0], kind) for kind, data in _collect(results, len(paths)))
+    assert scheduler.wait(30)
+    assert set(outcomes) == set(paths)
+    assert outcomes["crash"] == 'batch_item_failed'
+    # Jobs submitted after the crash run on a fresh pool.
+    assert outcomes["g"] == 'batch_item_success'
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import engine
+
+MODES = list(engine.MODE_KEYS)
+
+def _random_rgb(dtype, seed, shape=(97, 131, 3)):
+    return np.random.default_rng(seed).integers(0, np.iinfo(dtype).max, shape, dtype=dtype, endpoint=True)
+
+@pytest.mark.parametrize("mode", MODES)
+@pytest.mark.parametrize("dtype", [np.uint8, np.uint16])
+@pytest.mark.parametrize("target_bit_depth", [8, 16])
+def test_lut_matches_float64(mode, dtype, target_bit_depth):
+    rgb = _random_rgb(dtype, seed=target_bit_depth)
+    # Every level of every channel, plus the extremes, on top of the random pixels.
+    levels = np.arange(np.iinfo(dtype).max + 1, dtype=dtype)
+    ramp = np.stack([levels, levels[::-1], np.roll(levels, len(levels) // 3)], axis=-1)[None]
+    for image in (rgb, ramp):
+        reference = engine.convert_rgb_array(image, mode, target_bit_depth, "float64")
+        np.testing.assert_array_equal(engine.convert_rgb_array(image, mode, target_bit_depth, "lut"), reference)
+
+@pytest.mark.parametrize("target_bit_depth", [8, 16])
+def test_gamma_quantizer_thresholds(target_bit_depth):
+    _, thresholds, _ = engine._gamma_quantizer(target_bit_depth)
+    multiplier, _ = engine._output_scale(target_bit_depth)
+    codes = np.arange(1, multiplier + 1)
+    at = thresholds[:-1]
+    below = np.nextafter(at, -np.inf)
+    reference = lambda y: engine._quantize(engine.to_srgb(y), target_bit_depth).astype(np.int64)
+    # Each threshold is the first float64 luminance reaching its code.
+    np.testing.assert_array_equal(reference(at), codes)
+    np.testing.assert_array_equal(reference(below), codes - 1)
+    y = np.concatenate([below, at, np.nextafter(at, np.inf), [0.0, 1.0]])
+    np.testing.assert_array_equal(engine._quantize_gamma(y, target_bit_depth), reference(y))
+
+@pytest.mark.parametrize("mode", ["Rec. 601", "Rec. 709", "Rec. 2100"])
+def test_float_path_matches_integer_luma(mode):
+    # With the sRGB transfer the float pipeline weights encoded values like the integer kernels.
+    rgb = _random_rgb(np.uint16, seed=3)
+    reference = engine.convert_rgb_array(rgb, mode, 16, "float64").astype(np.int64)
+    samples = (rgb / 65535).astype(np.float32)
+    assert np.abs(engine.convert_rgb_array(samples, mode, 16, "float64", transfer="srgb") - reference).max() <= 1
+    # 32-bit output sends integer sources down the float pipeline too.
+    linear = engine.convert_rgb_array(rgb, mode, 32, "float64")
+    assert np.abs(engine.to_srgb(linear) * 65535 - reference).max() <= 1
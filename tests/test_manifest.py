@@ -0,0 +1,49 @@
+import os
+import queue
+import threading
+import time
+
+import batch
+import manifest
+
+def _copy_job(in_path, out_path, settings):
+    with open(in_path, 'rb') as src, open(out_path, 'wb') as dst: dst.write(src.read())
+
+def _inputs(folder, count=4):
+    paths = []
+    for index in range(count):
+        path = folder / f"in{index}.bin"
+        path.write_bytes(os.urandom(4096))
+        paths.append(str(path))
+    return paths
+
+def test_batch_hashes_each_input_once_on_the_worker(tmp_path, monkeypatch):
+    inputs = _inputs(tmp_path)
+    hashed = []
+    real_hash = manifest.file_hash
+    monkeypatch.setattr(manifest, "file_hash", lambda path: hashed.append(path) or real_hash(path))
+    job_manifest = manifest.BatchManifest(str(tmp_path))
+    results = queue.Queue()
+    scheduler = batch.BatchScheduler(results, workers=2, use_processes=False, job_fn=_copy_job, manifest=job_manifest)
+    scheduler.start((path, path + ".out", {}) for path in inputs)
+    assert [results.get(timeout=10)[0] for _ in inputs] == ['batch_item_success'] * len(inputs)
+    assert scheduler.wait(10)
+    # run_job hashed every input; mark() only recorded the hash.
+    assert sorted(hashed) == sorted(inputs)
+    for path in inputs:
+        entry = job_manifest.items[os.path.abspath(path)]
+        assert entry['status'] == manifest.STATUS_DONE and entry['hash'] == real_hash(path)
+        assert job_manifest.is_up_to_date(path, path + ".out", {})
+
+def test_mark_leaves_saving_to_a_timer_thread(tmp_path, monkeypatch):
+    path = _inputs(tmp_path, 1)[0]
+    job_manifest = manifest.BatchManifest(str(tmp_path), autosave_interval=0.1)
+    saved_on = []
+    real_save = job_manifest.save
+    monkeypatch.setattr(job_manifest, "save", lambda: saved_on.append(threading.current_thread()) or real_save())
+    job_manifest.mark(path, path + ".out", {}, manifest.STATUS_DONE, input_hash="0" * 40)
+    assert not saved_on and job_manifest.items[os.path.abspath(path)]['hash'] == "0" * 40
+    deadline = time.monotonic() + 5
+    while not saved_on and time.monotonic() < deadline: time.sleep(0.01)
+    assert saved_on and saved_on[0] is not threading.current_thread()
+    assert os.path.exists(job_manifest.path)
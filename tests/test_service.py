@@ -0,0 +1,24 @@
+import pytest
+
+import icc
+import service
+
+def _roots(*roots):
+    options = service._ServerOptions()
+    options._set_options(None, 0, True, [str(root) for root in roots])
+    return options.allows_path
+
+def test_profile_names_need_no_roots():
+    assert service.request_settings({"icc_profile_path": "Gray Gamma 2.2"}, 1)["icc_profile"]
+    assert service.request_settings({"icc_profile_path": icc.BUILTIN_PREFIX + "Gray Linear"}, 1, _roots())["icc_profile"]
+
+@pytest.mark.parametrize("profile", ["/etc/passwd", "/no/such/profile.icc", "relative.icc"])
+def test_profile_files_outside_the_roots_are_forbidden(tmp_path, profile):
+    for allows_path in (None, _roots(), _roots(tmp_path)):
+        with pytest.raises(service.RequestError) as error: service.request_settings({"icc_profile_path": profile}, 1, allows_path)
+        assert error.value.status == 403
+
+def test_profile_files_under_the_roots_are_read(tmp_path):
+    with pytest.raises(service.RequestError) as error:
+        service.request_settings({"icc_profile_path": str(tmp_path / "missing.icc")}, 1, _roots(tmp_path))
+    assert error.value.status == 400
@@ -0,0 +1,142 @@
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import batch
+import engine
+import manifest as batch_manifest
+
+WATCH_EXTENSIONS = (".png", ".jpg", ".jpeg", ".tif", ".tiff", ".bmp", ".gif", ".webp", ".psd") + engine.HEIF_EXTENSIONS + engine.EXR_EXTENSIONS
+# Names that scanners and copy tools use while a file is still being written.
+PARTIAL_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".download")
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_MAX_QUEUED = 64
+# With filesystem events, a full directory scan still runs this often in case an event was missed.
+EVENT_RESCAN_INTERVAL = 30.0
+
+def _start_event_observer(dirs, recursive, on_path):
+    """Starts a watchdog observer feeding changed paths to on_path, or returns None without watchdog."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        return None
+    class Handler(FileSystemEventHandler):
+        def on_any_event(self, event):
+            if not event.is_directory: on_path(os.fsdecode(getattr(event, 'dest_path', '') or event.src_path))
+    observer = Observer()
+    for d in dirs: observer.schedule(Handler(), d, recursive=recursive)
+    observer.start()
+    return observer
+
+class FolderWatcher:
+    """Watches input folders and feeds files that have stopped changing into a long-running
+    BatchScheduler. A file is submitted once its size and mtime have held still for
+    settle_time seconds, and again only if it changes afterwards. At most max_queued jobs
+    wait for a worker; further files stay pending until the converter catches up.
+
+    Uses watchdog filesystem events when installed and plain polling otherwise. Posts
+    ('watch_item_queued', path) to result_queue, then the usual batch_item_* results."""
+
+    def __init__(self, input_dirs, output_dir, settings, result_queue, workers=None, use_processes=True, suffix="_grayscale",
+                 recursive=False, poll_interval=DEFAULT_POLL_INTERVAL, settle_time=DEFAULT_SETTLE_TIME, max_queued=DEFAULT_MAX_QUEUED,
+                 use_manifest=True, use_events=True):
+        self.input_dirs = [os.path.abspath(d) for d in input_dirs]
+        self.output_dir = os.path.abspath(output_dir)
+        self.settings = settings
+        self.result_queue = result_queue
+        self.suffix = suffix
+        self.recursive = recursive
+        self.poll_interval = poll_interval
+        self.settle_time = settle_time
+        self.use_events = use_events
+        self.jobs = queue.Queue(maxsize=max_queued)
+        self.candidates = {}
+        self.submitted = {}
+        self.event_paths = set()
+        self.event_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.observer = None
+        os.makedirs(self.output_dir, exist_ok=True)
+        job_manifest = batch_manifest.BatchManifest(self.output_dir) if use_manifest else None
+        self.scheduler = batch.BatchScheduler(result_queue, workers=workers, use_processes=use_processes, manifest=job_manifest)
+
+    def start(self):
+        self.scheduler.start(iter(self.jobs.get, None))
+        if self.use_events: self.observer = _start_event_observer(self.input_dirs, self.recursive, self._on_event)
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def stop(self):
+        """Stops watching; conversions already running finish, queued ones are dropped."""
+        self.stop_event.set()
+        if self.observer: self.observer.stop()
+        self.scheduler.cancel()
+        while True:
+            try: self.jobs.get_nowait()
+            except queue.Empty: break
+        self.jobs.put(None)
+
+    def wait(self, timeout=None):
+        return self.scheduler.wait(timeout)
+
+    @property
+    def polling(self):
+        return self.observer is None
+
+    def _on_event(self, path):
+        with self.event_lock: self.event_paths.add(path)
+
+    def _wanted(self, path):
+        name = os.path.basename(path)
+        if name.startswith(('.', '~')) or name.lower().endswith(PARTIAL_SUFFIXES): return False
+        if Path(path).suffix.lower() not in WATCH_EXTENSIONS: return False
+        # Never pick up our own output when the output folder sits inside a watched folder.
+        return os.path.dirname(os.path.abspath(path)) != self.output_dir
+
+    def _scan(self):
+        for root in self.input_dirs:
+            pending = [root]
+            while pending:
+                try: entries = list(os.scandir(pending.pop()))
+                except OSError: continue
+                for entry in entries:
+                    if entry.is_file(): yield entry.path
+                    elif self.recursive and entry.is_dir() and os.path.abspath(entry.path) != self.output_dir: pending.append(entry.path)
+
+    def _run(self):
+        last_scan = None
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            with self.event_lock: paths, self.event_paths = self.event_paths, set()
+            if self.polling or last_scan is None or now - last_scan >= EVENT_RESCAN_INTERVAL:
+                paths.update(self._scan())
+                last_scan = now
+            # Candidates are re-checked every tick; not every write produces an event.
+            paths.update(self.candidates)
+            for path in paths: self._observe(path, now)
+            self._submit_settled(now)
+            self.stop_event.wait(self.poll_interval)
+
+    def _observe(self, path, now):
+        if not self._wanted(path): return
+        try: st = os.stat(path)
+        except OSError:
+            self.candidates.pop(path, None)
+            return
+        signature = (st.st_size, st.st_mtime_ns)
+        if self.submitted.get(path) == signature: return
+        previous = self.candidates.get(path)
+        if previous is None or previous[0] != signature: self.candidates[path] = (signature, now)
+
+    def _submit_settled(self, now):
+        for path, (signature, since) in sorted(self.candidates.items(), key=lambda item: item[1][1]):
+            if not signature[0] or now - since < self.settle_time: continue
+            job = (path, engine.output_path_for(path, self.output_dir, self.settings, self.suffix), self.settings)
+            try: self.jobs.put_nowait(job)
+            except queue.Full: return
+            del self.candidates[path]
+            self.submitted[path] = signature
+            self.result_queue.put(('watch_item_queued', path))